@@ -0,0 +1,180 @@
+# antrian.py
+"""Antrian checkout offline-first untuk terminal kasir.
+
+Penjualan ditulis dulu ke file SQLite kecil milik terminal ini (WAL,
+synchronous NORMAL): commit-nya hanya butuh puluhan mikrodetik dan tidak pernah
+menunggu writer database utama yang sedang sibuk (laporan, import, terminal
+lain). Thread latar belakang lalu memutar ulang antrian ke tabel penjualan/
+detail_penjualan per batch lewat Database.checkout_antrian.
+
+Kasir tetap checkout langsung ke database utama; antrian hanya dipakai jika
+database itu terkunci/sibuk atau server toko tidak terjangkau (database_sibuk).
+
+Setiap penjualan punya kunci idempoten (disimpan di penjualan.kunci), jadi
+batch yang diputar ulang setelah crash, timeout, atau database terkunci tidak
+pernah menghitung penjualan dua kali. Stok yang ternyata kurang tidak menolak
+penjualan (struk sudah dicetak): penjualan tetap masuk dan ditandai perlu_cek
+di database utama. Hanya data yang tidak valid yang ditolak; penjualan itu
+ditandai gagal dan bisa dilihat lewat daftar_gagal()/jumlah_gagal().
+"""
+import http.client
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+UKURAN_BATCH_ANTRIAN = 50
+INTERVAL_ANTRIAN = 2.0  # detik antar percobaan jika database utama gagal/sibuk
+
+
+def database_sibuk(error):
+    """True jika checkout gagal karena database utama terkunci/sibuk atau server toko
+    tidak terjangkau (bukan karena datanya), jadi penjualannya layak diantrekan"""
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        return True
+    pesan = str(error).lower()
+    return "is locked" in pesan or "is busy" in pesan
+
+
+class AntrianCheckout:
+    def __init__(self, db, path, ukuran_batch=UKURAN_BATCH_ANTRIAN, interval=INTERVAL_ANTRIAN):
+        self.db = db
+        self.path = path
+        self.ukuran_batch = ukuran_batch
+        self.interval = interval
+
+        # Satu koneksi dipakai thread Tk (simpan) dan thread sinkron, diserialisasi dengan lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # NORMAL di mode WAL: commit tidak fsync, tetapi tetap aman jika aplikasi crash
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS antrian_penjualan (
+                kunci TEXT PRIMARY KEY,
+                dibuat REAL NOT NULL,
+                data TEXT NOT NULL,
+                id_penjualan INTEGER,
+                gagal TEXT
+            )
+        """)
+        self.conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_antrian_menunggu
+            ON antrian_penjualan (dibuat) WHERE id_penjualan IS NULL AND gagal IS NULL
+        """)
+        self.conn.commit()
+
+        self._ada = threading.Event()
+        self._berhenti = False
+        self._thread = threading.Thread(target=self._jalan, name="antrian-checkout", daemon=True)
+        self._thread.start()
+
+    def simpan(self, id_pelanggan, id_karyawan, items, token=None):
+        """Mencatat satu penjualan ke antrian lokal, mengembalikan kunci idempotennya.
+
+        items berisi dict {'id_produk', 'qty', 'harga'} seperti Database.checkout();
+        token adalah token reservasi keranjang (dilepas saat penjualan masuk).
+        """
+        kunci = uuid.uuid4().hex
+        sekarang = datetime.now()
+        data = {
+            "id_pelanggan": id_pelanggan,
+            "id_karyawan": id_karyawan,
+            "tanggal": sekarang.strftime("%Y-%m-%d"),
+            "waktu": sekarang.strftime("%H:%M:%S"),
+            "items": [{"id_produk": item['id_produk'], "qty": item['qty'], "harga": item['harga']}
+                      for item in items],
+            "token": token,
+        }
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO antrian_penjualan (kunci, dibuat, data) VALUES (?, ?, ?)",
+                (kunci, time.time(), json.dumps(data))
+            )
+            self.conn.commit()
+        self._ada.set()
+        return kunci
+
+    def sinkron(self):
+        """Memutar satu batch antrian ke database utama, mengembalikan jumlah yang diproses.
+
+        0 berarti antrian kosong atau database utama gagal (dicoba lagi nanti).
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                """SELECT kunci, data FROM antrian_penjualan
+                   WHERE id_penjualan IS NULL AND gagal IS NULL
+                   ORDER BY dibuat LIMIT ?""",
+                (self.ukuran_batch,)
+            ).fetchall()
+        if not rows:
+            return 0
+
+        transaksi = [dict(json.loads(data), kunci=kunci) for kunci, data in rows]
+        try:
+            hasil = self.db.checkout_antrian(transaksi)
+        except Exception as e:  # mis. server toko tidak terjangkau
+            print(f"Error sinkron antrian: {e}")
+            return 0
+        if hasil is None:
+            return 0
+
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE antrian_penjualan SET id_penjualan = ?, gagal = ? WHERE kunci = ?",
+                [(id_penjualan, None if id_penjualan else (alasan or "ditolak"), kunci)
+                 for kunci, id_penjualan, alasan in hasil]
+            )
+            self.conn.commit()
+        return len(hasil)
+
+    def _jalan(self):
+        while not self._berhenti:
+            self._ada.wait(self.interval)
+            self._ada.clear()
+            # Habiskan antrian selama batch penuh berhasil diproses
+            while self.sinkron() == self.ukuran_batch and not self._berhenti:
+                pass
+
+    def jumlah_menunggu(self):
+        """Jumlah penjualan yang belum masuk ke database utama"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM antrian_penjualan WHERE id_penjualan IS NULL AND gagal IS NULL"
+            ).fetchone()[0]
+
+    def jumlah_gagal(self):
+        """Jumlah penjualan yang ditolak database utama"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM antrian_penjualan WHERE gagal IS NOT NULL"
+            ).fetchone()[0]
+
+    def daftar_gagal(self):
+        """Penjualan yang ditolak database utama: list (kunci, waktu dibuat, data dict, alasan)"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT kunci, dibuat, data, gagal FROM antrian_penjualan WHERE gagal IS NOT NULL ORDER BY dibuat"
+            ).fetchall()
+        return [(kunci, dibuat, json.loads(data), gagal) for kunci, dibuat, data, gagal in rows]
+
+    def bersihkan(self, hari=7):
+        """Menghapus catatan penjualan yang sudah masuk database utama lebih dari `hari` hari"""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM antrian_penjualan WHERE id_penjualan IS NOT NULL AND dibuat < ?",
+                (time.time() - hari * 86400,)
+            )
+            self.conn.commit()
+
+    def close(self, timeout=5):
+        """Menghentikan thread sinkron (mencoba mengirim sisa antrian dulu) lalu menutup file antrian"""
+        self._berhenti = True
+        self._ada.set()
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.sinkron()
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,203 @@
+# benchmark.py
+"""Benchmark sederhana untuk lapisan database toko.
+
+Contoh:
+    python benchmark.py commit --jumlah 500
+    python benchmark.py stok --proses 8 --transaksi 500
+    python benchmark.py server --terminal 6 --transaksi 500 --batch 10
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from database import Database, PROFIL_KONEKSI
+from klien import DatabaseKlien
+from server import ServerToko
+
+
+def bench_commit(profil, jumlah):
+    """Mengukur jumlah commit per detik (satu INSERT + commit per iterasi)"""
+    with tempfile.TemporaryDirectory(prefix="bench_toko_") as folder:
+        db = Database(os.path.join(folder, "bench.db"), profil=profil)
+        try:
+            mulai = time.perf_counter()
+            for i in range(jumlah):
+                db.add_pelanggan(f"Pelanggan {i}", "-", "-")
+            durasi = time.perf_counter() - mulai
+        finally:
+            db.close()
+    return jumlah / durasi
+
+
+def _kasir_stok(path, profil, ids, transaksi, reservasi, seed):
+    """Satu proses kasir: menjual produk acak sebanyak `transaksi` kali ke database yang sama"""
+    acak = random.Random(seed)
+    db = Database(path, profil=profil, jumlah_worker=1)
+    berhasil = ditolak = terjual = 0
+    try:
+        mulai = time.perf_counter()
+        # Pesan "stok tidak mencukupi" dari Database memang diharapkan di sini
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(transaksi):
+                id_produk = acak.choice(ids)
+                qty = acak.randint(1, 3)
+                token = None
+                if reservasi:
+                    token = f"bench-{os.getpid()}-{i}"
+                    try:
+                        dipesan = db.reservasi_stok(token, id_produk, qty)
+                    except sqlite3.Error:
+                        dipesan = False  # database sibuk lebih lama dari busy_timeout
+                    if not dipesan:
+                        ditolak += 1
+                        continue
+                items = [{'id_produk': id_produk, 'qty': qty, 'harga': 1000}]
+                if db.checkout(1, 1, items, token=token):
+                    berhasil += 1
+                    terjual += qty
+                else:
+                    ditolak += 1
+        durasi = time.perf_counter() - mulai
+    finally:
+        db.close()
+    return berhasil, ditolak, terjual, durasi
+
+
+def bench_stok(path, profil, proses, transaksi, jumlah_produk, stok_awal, reservasi):
+    """Beberapa proses kasir menjual produk yang sama bersamaan ke satu file database.
+
+    Mengembalikan dict hasil; 'oversell' harus 0 (stok tidak pernah negatif dan
+    jumlah terjual sama dengan stok yang berkurang).
+    """
+    db = Database(path, profil=profil, jumlah_worker=1)
+    try:
+        awalan = f"BENCH-{os.getpid()}-{time.time_ns()}"
+        ids = []
+        for i in range(jumlah_produk):
+            row = db.add_produk(f"{awalan}-{i}", f"Produk Benchmark {i}", harga_jual=1000, stok=stok_awal)
+            ids.append(row[0])
+    finally:
+        db.close()
+
+    tugas = [(path, profil, ids, transaksi, reservasi, i) for i in range(proses)]
+    mulai = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(proses) as pool:
+        hasil = pool.starmap(_kasir_stok, tugas)
+    durasi = time.perf_counter() - mulai
+
+    db = Database(path, profil=profil, jumlah_worker=1)
+    try:
+        stok_akhir = [db.get_produk_stok(i) for i in ids]
+    finally:
+        db.close()
+    berhasil = sum(h[0] for h in hasil)
+    terjual = sum(h[2] for h in hasil)
+    berkurang = jumlah_produk * stok_awal - sum(stok_akhir)
+    return {
+        "berhasil": berhasil,
+        "ditolak": sum(h[1] for h in hasil),
+        "tps": berhasil / durasi,
+        "stok_negatif": sum(1 for s in stok_akhir if s < 0),
+        "oversell": terjual - berkurang,
+    }
+
+
+def _terminal_server(url, ids, transaksi, batch, seed):
+    """Satu proses terminal: checkout lewat DatabaseKlien, `batch` checkout per request"""
+    acak = random.Random(seed)
+    klien = DatabaseKlien(url)
+    berhasil = 0
+    try:
+        for mulai in range(0, transaksi, batch):
+            panggilan = [("checkout", (1, 1, [{'id_produk': acak.choice(ids), 'qty': 1, 'harga': 1000}]), {})
+                         for _ in range(min(batch, transaksi - mulai))]
+            berhasil += sum(1 for id_penjualan in klien.batch(panggilan) if id_penjualan)
+    finally:
+        klien.close()
+    return berhasil
+
+
+def bench_server(terminal, transaksi, batch, jumlah_produk, profil):
+    """Load generator: beberapa proses terminal checkout ke satu server toko di loopback.
+
+    Mengembalikan (jumlah checkout berhasil, transaksi per detik).
+    """
+    with tempfile.TemporaryDirectory(prefix="bench_toko_") as folder:
+        db = Database(os.path.join(folder, "bench.db"), profil=profil, jumlah_worker=4)
+        server = ServerToko(db, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            ids = [db.add_produk(f"BENCH-{i}", f"Produk Benchmark {i}", harga_jual=1000, stok=10 ** 9)[0]
+                   for i in range(jumlah_produk)]
+            tugas = [(server.alamat, ids, transaksi, batch, i) for i in range(terminal)]
+            mulai = time.perf_counter()
+            with multiprocessing.get_context("spawn").Pool(terminal) as pool:
+                berhasil = sum(pool.starmap(_terminal_server, tugas))
+            durasi = time.perf_counter() - mulai
+        finally:
+            server.shutdown()
+            server.close()
+            db.close()
+    return berhasil, berhasil / durasi
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark database toko")
+    sub = parser.add_subparsers(dest="perintah", required=True)
+
+    p_commit = sub.add_parser("commit", help="Commit per detik untuk setiap profil koneksi")
+    p_commit.add_argument("--jumlah", type=int, default=500)
+    p_commit.add_argument("--profil", nargs="*", default=list(PROFIL_KONEKSI))
+
+    p_stok = sub.add_parser("stok", help="Stress test penjualan stok dari beberapa proses kasir")
+    p_stok.add_argument("--db", help="File database (default: database sementara)")
+    p_stok.add_argument("--profil", default="pos-terminal", choices=list(PROFIL_KONEKSI))
+    p_stok.add_argument("--proses", type=int, default=4)
+    p_stok.add_argument("--transaksi", type=int, default=500, help="Transaksi per proses")
+    p_stok.add_argument("--produk", type=int, default=5, help="Jumlah produk yang diperebutkan")
+    p_stok.add_argument("--stok", type=int, default=500, help="Stok awal per produk")
+    p_stok.add_argument("--tanpa-reservasi", action="store_true",
+                        help="Langsung checkout tanpa reservasi keranjang")
+
+    p_server = sub.add_parser("server", help="Transaksi per detik lewat server toko di loopback")
+    p_server.add_argument("--terminal", type=int, default=6, help="Jumlah proses terminal")
+    p_server.add_argument("--transaksi", type=int, default=500, help="Checkout per terminal")
+    p_server.add_argument("--batch", type=int, nargs="*", default=[1, 10], help="Checkout per request")
+    p_server.add_argument("--produk", type=int, default=50)
+    p_server.add_argument("--profil", default="pos-terminal", choices=list(PROFIL_KONEKSI))
+
+    args = parser.parse_args()
+
+    if args.perintah == "commit":
+        print(f"{'PROFIL':15} {'COMMIT/DETIK':>15}")
+        for profil in args.profil:
+            print(f"{profil:15} {bench_commit(profil, args.jumlah):>15,.0f}")
+
+    elif args.perintah == "stok":
+        with tempfile.TemporaryDirectory(prefix="bench_toko_") as folder:
+            path = args.db or os.path.join(folder, "bench.db")
+            hasil = bench_stok(path, args.profil, args.proses, args.transaksi,
+                               args.produk, args.stok, not args.tanpa_reservasi)
+        print(f"{args.proses} proses x {args.transaksi} transaksi, {args.produk} produk @ stok {args.stok}")
+        print(f"Berhasil     : {hasil['berhasil']:,} ({hasil['tps']:,.0f} transaksi/detik)")
+        print(f"Ditolak      : {hasil['ditolak']:,} (stok habis/dipesan kasir lain)")
+        print(f"Stok negatif : {hasil['stok_negatif']}")
+        print(f"Oversell     : {hasil['oversell']}")
+
+    elif args.perintah == "server":
+        print(f"{args.terminal} terminal x {args.transaksi} checkout")
+        print(f"{'BATCH':>6} {'BERHASIL':>10} {'TRANSAKSI/DETIK':>16}")
+        for batch in args.batch:
+            berhasil, tps = bench_server(args.terminal, args.transaksi, batch, args.produk, args.profil)
+            print(f"{batch:>6} {berhasil:>10,} {tps:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
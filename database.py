@@ -1,17 +1,557 @@
 # database.py
+import gzip
+import heapq
+import json
+import os
+import shutil
 import sqlite3
-from datetime import datetime
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from query import (QUERY, QueryError, Produk, UKURAN_CACHE_STATEMENT, TANGGAL_MIN, TANGGAL_MAKS,
+                   KUNCI_PENJUALAN_MAKS, KUNCI_STOK_MIN)
+
+# Profil koneksi SQLite, dipilih sesuai jenis deployment.
+# "default" = pengaturan bawaan SQLite (rollback journal, synchronous=FULL).
+PROFIL_KONEKSI = {
+    "default": {},
+    # Kasir: commit cepat (WAL + synchronous NORMAL), laporan tidak memblokir penulisan
+    "pos-terminal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,             # ~16 MB
+        "mmap_size": 64 * 1024 * 1024,    # 64 MB
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+        "busy_timeout": 5000,
+    },
+    # Back office: banyak query laporan, cache dan mmap lebih besar
+    "back-office": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,             # ~64 MB
+        "mmap_size": 256 * 1024 * 1024,   # 256 MB
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+        "busy_timeout": 10000,
+    },
+    # Import data massal: durabilitas dikorbankan demi kecepatan
+    "bulk-import": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -200000,            # ~200 MB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+        "busy_timeout": 30000,
+    },
+}
+
+PROFIL_DEFAULT = "pos-terminal"
+
+# Isi ulang tabel ringkasan penjualan_harian dari data transaksi.
+# Dipakai oleh migrasi versi 5 dan Database.rebuild_penjualan_harian.
+ISI_PENJUALAN_HARIAN = [
+    "DELETE FROM penjualan_harian",
+    """INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                   jumlah_transaksi, total_penjualan)
+       SELECT tanggal_penjualan, COALESCE(id_karyawan, 0), COALESCE(id_pelanggan, 0),
+              COUNT(*), COALESCE(SUM(total_harga), 0)
+       FROM penjualan
+       GROUP BY 1, 2, 3""",
+    """INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                   jumlah_retur, total_retur)
+       SELECT tanggal_retur, COALESCE(id_karyawan, 0), COALESCE(id_pelanggan, 0),
+              COUNT(*), COALESCE(SUM(total_retur), 0)
+       FROM retur_penjualan
+       WHERE true
+       GROUP BY 1, 2, 3
+       ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+           jumlah_retur = excluded.jumlah_retur,
+           total_retur = excluded.total_retur""",
+]
+
+# Isi ulang penghitung penjualan per produk (total dan per hari) dari detail_penjualan.
+# Dipakai oleh migrasi versi 6 dan Database.rebuild_penjualan_produk.
+ISI_PENJUALAN_PRODUK = [
+    "DELETE FROM penjualan_produk",
+    "DELETE FROM penjualan_produk_harian",
+    """INSERT INTO penjualan_produk (id_produk, total_terjual, total_pendapatan)
+       SELECT id_produk, SUM(jumlah), COALESCE(SUM(subtotal), 0)
+       FROM detail_penjualan
+       GROUP BY id_produk""",
+    """INSERT INTO penjualan_produk_harian (tanggal, id_produk, terjual, pendapatan)
+       SELECT pj.tanggal_penjualan, dp.id_produk, SUM(dp.jumlah), COALESCE(SUM(dp.subtotal), 0)
+       FROM detail_penjualan dp
+       JOIN penjualan pj ON dp.id_penjualan = pj.id
+       GROUP BY 1, 2""",
+]
+
+# Periode laporan produk terlaris: jumlah hari ke belakang dari hari ini (None = semua)
+PERIODE_TERLARIS = {
+    "semua": None,
+    "hari_ini": 0,
+    "7_hari": 6,
+    "30_hari": 29,
+}
+
+# Titik pemesanan ulang bawaan untuk produk baru (kolom produk.stok_minimum)
+STOK_MINIMUM_DEFAULT = 10
+
+# Umur maksimum cache statistik dashboard (detik), selain invalidasi saat ada penulisan
+DASHBOARD_TTL = 30
+
+# Lama (detik) reservasi stok keranjang berlaku sejak terakhir diperbarui;
+# keranjang yang ditinggal tidak menahan stok terminal lain selamanya
+RESERVASI_TTL = 300
+
+# Tabel yang harus ada di file backup agar boleh di-restore (file SQLite valid
+# tetapi kosong/asing ditolak sebelum menggantikan database aktif)
+TABEL_WAJIB = ("kategori", "supplier", "karyawan", "pelanggan", "produk", "penjualan",
+               "detail_penjualan", "pembelian", "detail_pembelian", "retur_penjualan",
+               "detail_retur_penjualan", "pengguna")
+
+# Migrasi skema berversi (disimpan di PRAGMA user_version).
+# Tambahkan versi baru di akhir daftar, jangan mengubah versi yang sudah ada.
+MIGRASI = [
+    # Versi 1: index untuk laporan, ringkasan harian, produk terlaris, dan stok rendah
+    (1, [
+        """CREATE INDEX IF NOT EXISTS idx_penjualan_tanggal
+           ON penjualan (tanggal_penjualan, waktu_penjualan, total_harga, id_pelanggan, id_karyawan)""",
+        """CREATE INDEX IF NOT EXISTS idx_detail_penjualan_penjualan
+           ON detail_penjualan (id_penjualan)""",
+        """CREATE INDEX IF NOT EXISTS idx_detail_penjualan_produk
+           ON detail_penjualan (id_produk, jumlah, subtotal)""",
+        """CREATE INDEX IF NOT EXISTS idx_produk_stok
+           ON produk (stok)""",
+        """CREATE INDEX IF NOT EXISTS idx_pembelian_tanggal
+           ON pembelian (tanggal_pembelian, waktu_pembelian)""",
+        """CREATE INDEX IF NOT EXISTS idx_detail_pembelian_pembelian
+           ON detail_pembelian (id_pembelian)""",
+        """CREATE INDEX IF NOT EXISTS idx_detail_retur_retur
+           ON detail_retur_penjualan (id_retur)""",
+        "ANALYZE",
+    ]),
+    # Versi 2: id ikut dalam index tanggal untuk keyset pagination laporan penjualan
+    (2, [
+        "DROP INDEX IF EXISTS idx_penjualan_tanggal",
+        """CREATE INDEX IF NOT EXISTS idx_penjualan_tanggal
+           ON penjualan (tanggal_penjualan, waktu_penjualan, id, total_harga, id_pelanggan, id_karyawan)""",
+    ]),
+    # Versi 3: penanda versi data katalog produk untuk cache inkremental (ProductCatalog)
+    (3, [
+        """CREATE TABLE IF NOT EXISTS versi_data (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               versi INTEGER NOT NULL
+           )""",
+        "INSERT OR IGNORE INTO versi_data (id, versi) VALUES (1, 0)",
+        """CREATE TABLE IF NOT EXISTS perubahan_produk (
+               id_produk INTEGER PRIMARY KEY,
+               versi INTEGER NOT NULL
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_perubahan_produk_versi ON perubahan_produk (versi)",
+        "CREATE INDEX IF NOT EXISTS idx_produk_kategori ON produk (id_kategori)",
+        "CREATE INDEX IF NOT EXISTS idx_produk_supplier ON produk (id_supplier)",
+        """CREATE TRIGGER IF NOT EXISTS trg_produk_insert AFTER INSERT ON produk BEGIN
+               UPDATE versi_data SET versi = versi + 1 WHERE id = 1;
+               INSERT INTO perubahan_produk (id_produk, versi)
+                   SELECT NEW.id, versi FROM versi_data WHERE id = 1
+                   ON CONFLICT (id_produk) DO UPDATE SET versi = excluded.versi;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_produk_update AFTER UPDATE ON produk BEGIN
+               UPDATE versi_data SET versi = versi + 1 WHERE id = 1;
+               INSERT INTO perubahan_produk (id_produk, versi)
+                   SELECT NEW.id, versi FROM versi_data WHERE id = 1
+                   ON CONFLICT (id_produk) DO UPDATE SET versi = excluded.versi;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_produk_delete AFTER DELETE ON produk BEGIN
+               UPDATE versi_data SET versi = versi + 1 WHERE id = 1;
+               INSERT INTO perubahan_produk (id_produk, versi)
+                   SELECT OLD.id, versi FROM versi_data WHERE id = 1
+                   ON CONFLICT (id_produk) DO UPDATE SET versi = excluded.versi;
+           END""",
+        # Nama kategori/supplier ikut tampil di katalog, jadi produk terkait ditandai berubah
+        """CREATE TRIGGER IF NOT EXISTS trg_kategori_update AFTER UPDATE ON kategori BEGIN
+               UPDATE versi_data SET versi = versi + 1 WHERE id = 1;
+               INSERT INTO perubahan_produk (id_produk, versi)
+                   SELECT p.id, v.versi FROM produk p, versi_data v
+                   WHERE v.id = 1 AND p.id_kategori = NEW.id
+                   ON CONFLICT (id_produk) DO UPDATE SET versi = excluded.versi;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_kategori_delete AFTER DELETE ON kategori BEGIN
+               UPDATE versi_data SET versi = versi + 1 WHERE id = 1;
+               INSERT INTO perubahan_produk (id_produk, versi)
+                   SELECT p.id, v.versi FROM produk p, versi_data v
+                   WHERE v.id = 1 AND p.id_kategori = OLD.id
+                   ON CONFLICT (id_produk) DO UPDATE SET versi = excluded.versi;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_supplier_update AFTER UPDATE ON supplier BEGIN
+               UPDATE versi_data SET versi = versi + 1 WHERE id = 1;
+               INSERT INTO perubahan_produk (id_produk, versi)
+                   SELECT p.id, v.versi FROM produk p, versi_data v
+                   WHERE v.id = 1 AND p.id_supplier = NEW.id
+                   ON CONFLICT (id_produk) DO UPDATE SET versi = excluded.versi;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_supplier_delete AFTER DELETE ON supplier BEGIN
+               UPDATE versi_data SET versi = versi + 1 WHERE id = 1;
+               INSERT INTO perubahan_produk (id_produk, versi)
+                   SELECT p.id, v.versi FROM produk p, versi_data v
+                   WHERE v.id = 1 AND p.id_supplier = OLD.id
+                   ON CONFLICT (id_produk) DO UPDATE SET versi = excluded.versi;
+           END""",
+    ]),
+    # Versi 4: urutan nama produk untuk laporan stok per halaman dan get_all_produk
+    (4, [
+        "CREATE INDEX IF NOT EXISTS idx_produk_nama ON produk (nama_produk, id)",
+    ]),
+    # Versi 5: ringkasan penjualan per hari/karyawan/pelanggan, dijaga oleh trigger.
+    # id NULL disimpan sebagai 0 agar bisa menjadi bagian primary key.
+    (5, [
+        """CREATE TABLE IF NOT EXISTS penjualan_harian (
+               tanggal TEXT NOT NULL,
+               id_karyawan INTEGER NOT NULL,
+               id_pelanggan INTEGER NOT NULL,
+               jumlah_transaksi INTEGER NOT NULL DEFAULT 0,
+               total_penjualan REAL NOT NULL DEFAULT 0,
+               jumlah_retur INTEGER NOT NULL DEFAULT 0,
+               total_retur REAL NOT NULL DEFAULT 0,
+               PRIMARY KEY (tanggal, id_karyawan, id_pelanggan)
+           ) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS trg_penjualan_harian_insert AFTER INSERT ON penjualan BEGIN
+               INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                             jumlah_transaksi, total_penjualan)
+                   VALUES (NEW.tanggal_penjualan, COALESCE(NEW.id_karyawan, 0),
+                           COALESCE(NEW.id_pelanggan, 0), 1, COALESCE(NEW.total_harga, 0))
+                   ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+                       jumlah_transaksi = jumlah_transaksi + excluded.jumlah_transaksi,
+                       total_penjualan = total_penjualan + excluded.total_penjualan;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_penjualan_harian_delete AFTER DELETE ON penjualan BEGIN
+               INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                             jumlah_transaksi, total_penjualan)
+                   VALUES (OLD.tanggal_penjualan, COALESCE(OLD.id_karyawan, 0),
+                           COALESCE(OLD.id_pelanggan, 0), -1, -COALESCE(OLD.total_harga, 0))
+                   ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+                       jumlah_transaksi = jumlah_transaksi + excluded.jumlah_transaksi,
+                       total_penjualan = total_penjualan + excluded.total_penjualan;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_penjualan_harian_update
+           AFTER UPDATE OF tanggal_penjualan, id_karyawan, id_pelanggan, total_harga ON penjualan BEGIN
+               INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                             jumlah_transaksi, total_penjualan)
+                   VALUES (OLD.tanggal_penjualan, COALESCE(OLD.id_karyawan, 0),
+                           COALESCE(OLD.id_pelanggan, 0), -1, -COALESCE(OLD.total_harga, 0))
+                   ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+                       jumlah_transaksi = jumlah_transaksi + excluded.jumlah_transaksi,
+                       total_penjualan = total_penjualan + excluded.total_penjualan;
+               INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                             jumlah_transaksi, total_penjualan)
+                   VALUES (NEW.tanggal_penjualan, COALESCE(NEW.id_karyawan, 0),
+                           COALESCE(NEW.id_pelanggan, 0), 1, COALESCE(NEW.total_harga, 0))
+                   ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+                       jumlah_transaksi = jumlah_transaksi + excluded.jumlah_transaksi,
+                       total_penjualan = total_penjualan + excluded.total_penjualan;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_retur_harian_insert AFTER INSERT ON retur_penjualan BEGIN
+               INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                             jumlah_retur, total_retur)
+                   VALUES (NEW.tanggal_retur, COALESCE(NEW.id_karyawan, 0),
+                           COALESCE(NEW.id_pelanggan, 0), 1, COALESCE(NEW.total_retur, 0))
+                   ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+                       jumlah_retur = jumlah_retur + excluded.jumlah_retur,
+                       total_retur = total_retur + excluded.total_retur;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_retur_harian_delete AFTER DELETE ON retur_penjualan BEGIN
+               INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                             jumlah_retur, total_retur)
+                   VALUES (OLD.tanggal_retur, COALESCE(OLD.id_karyawan, 0),
+                           COALESCE(OLD.id_pelanggan, 0), -1, -COALESCE(OLD.total_retur, 0))
+                   ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+                       jumlah_retur = jumlah_retur + excluded.jumlah_retur,
+                       total_retur = total_retur + excluded.total_retur;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_retur_harian_update
+           AFTER UPDATE OF tanggal_retur, id_karyawan, id_pelanggan, total_retur ON retur_penjualan BEGIN
+               INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                             jumlah_retur, total_retur)
+                   VALUES (OLD.tanggal_retur, COALESCE(OLD.id_karyawan, 0),
+                           COALESCE(OLD.id_pelanggan, 0), -1, -COALESCE(OLD.total_retur, 0))
+                   ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+                       jumlah_retur = jumlah_retur + excluded.jumlah_retur,
+                       total_retur = total_retur + excluded.total_retur;
+               INSERT INTO penjualan_harian (tanggal, id_karyawan, id_pelanggan,
+                                             jumlah_retur, total_retur)
+                   VALUES (NEW.tanggal_retur, COALESCE(NEW.id_karyawan, 0),
+                           COALESCE(NEW.id_pelanggan, 0), 1, COALESCE(NEW.total_retur, 0))
+                   ON CONFLICT (tanggal, id_karyawan, id_pelanggan) DO UPDATE SET
+                       jumlah_retur = jumlah_retur + excluded.jumlah_retur,
+                       total_retur = total_retur + excluded.total_retur;
+           END""",
+    ] + ISI_PENJUALAN_HARIAN),
+    # Versi 6: penghitung penjualan per produk (total dan per hari) untuk produk terlaris
+    (6, [
+        """CREATE TABLE IF NOT EXISTS penjualan_produk (
+               id_produk INTEGER PRIMARY KEY,
+               total_terjual INTEGER NOT NULL DEFAULT 0,
+               total_pendapatan REAL NOT NULL DEFAULT 0
+           )""",
+        """CREATE INDEX IF NOT EXISTS idx_penjualan_produk_terjual
+           ON penjualan_produk (total_terjual)""",
+        """CREATE TABLE IF NOT EXISTS penjualan_produk_harian (
+               tanggal TEXT NOT NULL,
+               id_produk INTEGER NOT NULL,
+               terjual INTEGER NOT NULL DEFAULT 0,
+               pendapatan REAL NOT NULL DEFAULT 0,
+               PRIMARY KEY (tanggal, id_produk)
+           ) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS trg_penjualan_produk_insert AFTER INSERT ON detail_penjualan BEGIN
+               INSERT INTO penjualan_produk (id_produk, total_terjual, total_pendapatan)
+                   VALUES (NEW.id_produk, NEW.jumlah, COALESCE(NEW.subtotal, 0))
+                   ON CONFLICT (id_produk) DO UPDATE SET
+                       total_terjual = total_terjual + excluded.total_terjual,
+                       total_pendapatan = total_pendapatan + excluded.total_pendapatan;
+               INSERT INTO penjualan_produk_harian (tanggal, id_produk, terjual, pendapatan)
+                   SELECT tanggal_penjualan, NEW.id_produk, NEW.jumlah, COALESCE(NEW.subtotal, 0)
+                   FROM penjualan WHERE id = NEW.id_penjualan
+                   ON CONFLICT (tanggal, id_produk) DO UPDATE SET
+                       terjual = terjual + excluded.terjual,
+                       pendapatan = pendapatan + excluded.pendapatan;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_penjualan_produk_delete AFTER DELETE ON detail_penjualan BEGIN
+               INSERT INTO penjualan_produk (id_produk, total_terjual, total_pendapatan)
+                   VALUES (OLD.id_produk, -OLD.jumlah, -COALESCE(OLD.subtotal, 0))
+                   ON CONFLICT (id_produk) DO UPDATE SET
+                       total_terjual = total_terjual + excluded.total_terjual,
+                       total_pendapatan = total_pendapatan + excluded.total_pendapatan;
+               INSERT INTO penjualan_produk_harian (tanggal, id_produk, terjual, pendapatan)
+                   SELECT tanggal_penjualan, OLD.id_produk, -OLD.jumlah, -COALESCE(OLD.subtotal, 0)
+                   FROM penjualan WHERE id = OLD.id_penjualan
+                   ON CONFLICT (tanggal, id_produk) DO UPDATE SET
+                       terjual = terjual + excluded.terjual,
+                       pendapatan = pendapatan + excluded.pendapatan;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_penjualan_produk_update
+           AFTER UPDATE OF id_penjualan, id_produk, jumlah, subtotal ON detail_penjualan BEGIN
+               INSERT INTO penjualan_produk (id_produk, total_terjual, total_pendapatan)
+                   VALUES (OLD.id_produk, -OLD.jumlah, -COALESCE(OLD.subtotal, 0))
+                   ON CONFLICT (id_produk) DO UPDATE SET
+                       total_terjual = total_terjual + excluded.total_terjual,
+                       total_pendapatan = total_pendapatan + excluded.total_pendapatan;
+               INSERT INTO penjualan_produk (id_produk, total_terjual, total_pendapatan)
+                   VALUES (NEW.id_produk, NEW.jumlah, COALESCE(NEW.subtotal, 0))
+                   ON CONFLICT (id_produk) DO UPDATE SET
+                       total_terjual = total_terjual + excluded.total_terjual,
+                       total_pendapatan = total_pendapatan + excluded.total_pendapatan;
+               INSERT INTO penjualan_produk_harian (tanggal, id_produk, terjual, pendapatan)
+                   SELECT tanggal_penjualan, OLD.id_produk, -OLD.jumlah, -COALESCE(OLD.subtotal, 0)
+                   FROM penjualan WHERE id = OLD.id_penjualan
+                   ON CONFLICT (tanggal, id_produk) DO UPDATE SET
+                       terjual = terjual + excluded.terjual,
+                       pendapatan = pendapatan + excluded.pendapatan;
+               INSERT INTO penjualan_produk_harian (tanggal, id_produk, terjual, pendapatan)
+                   SELECT tanggal_penjualan, NEW.id_produk, NEW.jumlah, COALESCE(NEW.subtotal, 0)
+                   FROM penjualan WHERE id = NEW.id_penjualan
+                   ON CONFLICT (tanggal, id_produk) DO UPDATE SET
+                       terjual = terjual + excluded.terjual,
+                       pendapatan = pendapatan + excluded.pendapatan;
+           END""",
+        # Tanggal penjualan diubah: penghitung harian semua detailnya ikut dipindah
+        """CREATE TRIGGER IF NOT EXISTS trg_penjualan_produk_tanggal
+           AFTER UPDATE OF tanggal_penjualan ON penjualan
+           WHEN OLD.tanggal_penjualan IS NOT NEW.tanggal_penjualan BEGIN
+               INSERT INTO penjualan_produk_harian (tanggal, id_produk, terjual, pendapatan)
+                   SELECT OLD.tanggal_penjualan, id_produk, -SUM(jumlah), -COALESCE(SUM(subtotal), 0)
+                   FROM detail_penjualan WHERE id_penjualan = OLD.id
+                   GROUP BY id_produk
+                   ON CONFLICT (tanggal, id_produk) DO UPDATE SET
+                       terjual = terjual + excluded.terjual,
+                       pendapatan = pendapatan + excluded.pendapatan;
+               INSERT INTO penjualan_produk_harian (tanggal, id_produk, terjual, pendapatan)
+                   SELECT NEW.tanggal_penjualan, id_produk, SUM(jumlah), COALESCE(SUM(subtotal), 0)
+                   FROM detail_penjualan WHERE id_penjualan = NEW.id
+                   GROUP BY id_produk
+                   ON CONFLICT (tanggal, id_produk) DO UPDATE SET
+                       terjual = terjual + excluded.terjual,
+                       pendapatan = pendapatan + excluded.pendapatan;
+           END""",
+    ] + ISI_PENJUALAN_PRODUK),
+    # Versi 7: titik pemesanan ulang per produk; partial index hanya berisi produk
+    # yang stoknya sudah di bawah titik tersebut, jadi daftar stok rendah tidak scan produk
+    (7, [
+        f"ALTER TABLE produk ADD COLUMN stok_minimum INTEGER NOT NULL DEFAULT {STOK_MINIMUM_DEFAULT}",
+        """CREATE INDEX IF NOT EXISTS idx_produk_stok_rendah
+           ON produk (stok) WHERE stok <= stok_minimum""",
+    ]),
+    # Versi 8: reservasi stok keranjang per terminal (Database.reservasi_stok);
+    # stok yang dipesan keranjang lain tidak bisa dijual sampai dilepas/kedaluwarsa
+    (8, [
+        """CREATE TABLE IF NOT EXISTS reservasi_stok (
+               token TEXT NOT NULL,
+               id_produk INTEGER NOT NULL,
+               qty INTEGER NOT NULL,
+               kedaluwarsa REAL NOT NULL,
+               PRIMARY KEY (token, id_produk)
+           ) WITHOUT ROWID""",
+        """CREATE INDEX IF NOT EXISTS idx_reservasi_stok_produk
+           ON reservasi_stok (id_produk, kedaluwarsa, qty)""",
+        """CREATE INDEX IF NOT EXISTS idx_reservasi_stok_kedaluwarsa
+           ON reservasi_stok (kedaluwarsa)""",
+    ]),
+    # Versi 9: kunci idempoten penjualan dari antrian checkout offline (antrian.py);
+    # penjualan dengan kunci yang sama hanya bisa masuk sekali
+    (9, [
+        "ALTER TABLE penjualan ADD COLUMN kunci TEXT",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_penjualan_kunci
+           ON penjualan (kunci) WHERE kunci IS NOT NULL""",
+    ]),
+    # Versi 10: penjualan antrian yang tetap dicatat walau stoknya kurang (struk sudah
+    # dicetak) ditandai perlu_cek untuk diperiksa
+    (10, [
+        "ALTER TABLE penjualan ADD COLUMN perlu_cek INTEGER NOT NULL DEFAULT 0",
+        """CREATE INDEX IF NOT EXISTS idx_penjualan_perlu_cek
+           ON penjualan (id) WHERE perlu_cek = 1""",
+    ]),
+]
 
 class Database:
-    def __init__(self, db_name):
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
+    def __init__(self, db_name, profil=PROFIL_DEFAULT, jumlah_worker=2):
+        if profil not in PROFIL_KONEKSI:
+            raise ValueError(f"Profil koneksi tidak dikenal: {profil}")
+        self.db_name = db_name
+        self.profil = profil
+        self.jumlah_worker = jumlah_worker
+
+        # Satu koneksi writer bersama, semua pemakaiannya diserialisasi dengan lock
+        self._lock = threading.RLock()
+        # Cache dashboard dibaca/ditulis dari thread Tk dan worker; lock ini hanya
+        # dipegang saat membaca/mengganti cache, tidak selama query
+        self._lock_dashboard = threading.Lock()
+        self._pendengar_stok = []
+        self._buka_koneksi()
+
         self.create_tables()
+        # Versi yang baru diterapkan; dilaporkan oleh perawatan.py, tidak dicetak di sini
+        self.migrasi_diterapkan = self.migrate()
         self.insert_default_data()
 
-    def create_tables(self):
+        # Cache katalog produk bersama untuk semua form transaksi
+        self.katalog = ProductCatalog(self)
+
+    def _buka_koneksi(self):
+        """Membuka koneksi writer dan pool thread reader"""
+        self.conn = sqlite3.connect(self.db_name, check_same_thread=False,
+                                    cached_statements=UKURAN_CACHE_STATEMENT)
+        self.terapkan_profil(self.conn)
+        self.cursor = self.conn.cursor()
+
+        # Satu koneksi reader per thread worker (untuk laporan di luar mainloop Tk)
+        self._lokal = threading.local()
+        self._koneksi_reader = []
+        with self._lock_dashboard:
+            self._cache_dashboard = None
+        self.executor = ThreadPoolExecutor(max_workers=self.jumlah_worker,
+                                           thread_name_prefix="db-reader",
+                                           initializer=self._buka_reader)
+
+    def _tutup_koneksi(self):
+        """Menutup pool reader dan semua koneksi"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for conn in self._koneksi_reader:
+                conn.close()
+            self._koneksi_reader = []
+            self.conn.close()
+
+    def terapkan_profil(self, conn):
+        """Menerapkan PRAGMA dari profil koneksi yang dipilih"""
+        for nama, nilai in PROFIL_KONEKSI[self.profil].items():
+            conn.execute(f"PRAGMA {nama} = {nilai}")
+
+    def _buka_reader(self):
+        """Membuka koneksi reader untuk thread worker yang sedang berjalan"""
+        if self.db_name == ":memory:":
+            return  # database memori tidak bisa dibagi, baca lewat writer
+        conn = sqlite3.connect(self.db_name, check_same_thread=False,
+                               cached_statements=UKURAN_CACHE_STATEMENT)
+        self.terapkan_profil(conn)
+        self._lokal.conn = conn
+        with self._lock:
+            self._koneksi_reader.append(conn)
+
+    def _reader(self):
+        """Koneksi reader milik thread ini, atau None jika bukan thread worker"""
+        return getattr(self._lokal, "conn", None)
+
+    def submit(self, fungsi, *args, widget=None, callback=None, errback=None, **kwargs):
+        """Menjalankan fungsi (misalnya method query) di thread worker dan mengembalikan Future.
+
+        Jika widget dan callback diberikan, hasilnya dikirim kembali ke thread Tk
+        lewat widget.after(), sehingga callback aman mengubah widget.
+        """
+        future = self.executor.submit(fungsi, *args, **kwargs)
+        if widget is not None and (callback or errback):
+            self._pantau_future(widget, future, callback, errback)
+        return future
+
+    def _pantau_future(self, widget, future, callback, errback, interval=30):
+        """Memeriksa Future secara berkala dari thread Tk sampai selesai"""
+        def cek():
+            try:
+                if not widget.winfo_exists():
+                    return
+            except Exception:
+                return  # widget sudah dihancurkan
+            if not future.done():
+                widget.after(interval, cek)
+                return
+            if future.cancelled():
+                # Dibatalkan saat pool dikosongkan (restore); errback tetap dipanggil
+                # supaya pemanggil bisa menjadwalkan ulang
+                error = CancelledError("Query dibatalkan karena database sedang di-restore")
+            else:
+                error = future.exception()
+            if error is not None:
+                if errback:
+                    errback(error)
+                else:
+                    print(f"Worker Error: {error}")
+            elif callback:
+                callback(future.result())
+        widget.after(interval, cek)
+
+    def migrate(self, conn=None):
+        """Menjalankan migrasi skema yang belum diterapkan (berdasarkan PRAGMA user_version).
+
+        conn: koneksi lain (mis. file restore sementara); default koneksi writer.
+        Mengembalikan daftar versi yang diterapkan.
+        """
+        conn = conn or self.conn
+        cursor = conn.cursor()
+        diterapkan = []
+        versi_sekarang = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for versi, perintah in MIGRASI:
+            if versi <= versi_sekarang:
+                continue
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for sql in perintah:
+                    cursor.execute(sql)
+                cursor.execute(f"PRAGMA user_version = {versi}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            diterapkan.append(versi)
+        return diterapkan
+
+    def create_tables(self, conn=None):
+        conn = conn or self.conn
+        cursor = conn.cursor()
         # Tabel Kategori
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS kategori (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 nama_kategori TEXT NOT NULL UNIQUE
@@ -19,7 +559,7 @@ class Database:
         """)
 
         # Tabel Supplier
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS supplier (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 nama_supplier TEXT NOT NULL,
@@ -29,7 +569,7 @@ class Database:
         """)
 
         # Tabel Karyawan
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS karyawan (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 nama_karyawan TEXT NOT NULL,
@@ -39,7 +579,7 @@ class Database:
         """)
         
         # Tabel Pelanggan
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS pelanggan (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 nama_pelanggan TEXT NOT NULL,
@@ -49,7 +589,7 @@ class Database:
         """)
         
         # Tabel Produk
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS produk (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 kode_produk TEXT NOT NULL UNIQUE,
@@ -65,7 +605,7 @@ class Database:
         """)
 
         # Tabel Penjualan
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS penjualan (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 id_pelanggan INTEGER,
@@ -79,7 +619,7 @@ class Database:
         """)
 
         # Tabel Detail Penjualan
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS detail_penjualan (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 id_penjualan INTEGER,
@@ -93,7 +633,7 @@ class Database:
         """)
         
         # Tabel Pembelian
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS pembelian (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 id_supplier INTEGER,
@@ -107,7 +647,7 @@ class Database:
         """)
 
         # Tabel Detail Pembelian
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS detail_pembelian (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 id_pembelian INTEGER,
@@ -121,7 +661,7 @@ class Database:
         """)
 
         # Tabel Retur Penjualan
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS retur_penjualan (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 id_penjualan INTEGER,
@@ -137,7 +677,7 @@ class Database:
             )
         """)
 
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS detail_retur_penjualan (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 id_retur INTEGER,
@@ -151,7 +691,7 @@ class Database:
         """)
 
         # Tabel Pengguna (untuk login)
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS pengguna (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 username TEXT NOT NULL UNIQUE,
@@ -162,7 +702,7 @@ class Database:
             )
         """)
 
-        self.conn.commit()
+        conn.commit()
 
     def insert_default_data(self):
         """Insert data default untuk aplikasi"""
@@ -195,151 +735,238 @@ class Database:
     # --- Metode CRUD Umum ---
     def execute_query(self, query, params=()):
         try:
-            self.cursor.execute(query, params)
-            self.conn.commit()
+            with self._lock:
+                self.cursor.execute(query, params)
+                self.conn.commit()
             return True
         except Exception as e:
+            with self._lock:
+                self.conn.rollback()
             print(f"Query Error: {e}")
             return False
 
-    def execute_fetch_query(self, query, params=()):
+    def execute_returning(self, query, params=()):
+        """Menjalankan INSERT/UPDATE/DELETE ... RETURNING, mengembalikan baris yang terkena atau None"""
         try:
-            self.cursor.execute(query, params)
-            return self.cursor.fetchall()
+            with self._lock:
+                self.cursor.execute(query, params)
+                rows = self.cursor.fetchall()
+                self.conn.commit()
+            return rows[0] if rows else None
         except Exception as e:
-            print(f"Fetch Query Error: {e}")
-            return []
+            with self._lock:
+                self.conn.rollback()
+            print(f"Query Error: {e}")
+            return None
+
+    def execute_batch(self, query, rows):
+        """Menjalankan query untuk banyak baris dalam satu transaksi (untuk import massal).
+
+        Jika executemany gagal karena satu baris, batch diulang per baris dengan
+        SAVEPOINT supaya baris yang valid tetap tersimpan. Mengembalikan daftar
+        (indeks_baris, pesan_error) untuk baris yang ditolak.
+        """
+        ditolak = []
+        with self._lock:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                self.conn.executemany(query, rows)
+                self.conn.commit()
+                return ditolak
+            except sqlite3.Error:
+                self.conn.rollback()
+
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                for i, row in enumerate(rows):
+                    self.conn.execute("SAVEPOINT baris")
+                    try:
+                        self.conn.execute(query, row)
+                    except sqlite3.Error as e:
+                        self.conn.execute("ROLLBACK TO baris")
+                        ditolak.append((i, str(e)))
+                    self.conn.execute("RELEASE baris")
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                print(f"Batch Error: {e}")
+                return [(i, str(e)) for i in range(len(rows))]
+        return ditolak
+
+    def ambil(self, nama, params=()):
+        """Menjalankan query baca bernama dari registry QUERY (query.py).
+
+        Mengembalikan list baris bertipe (namedtuple) atau tuple biasa jika query
+        tidak punya tipe. Kegagalan dilempar sebagai QueryError.
+        """
+        query = QUERY[nama]
+        try:
+            reader = self._reader()
+            if reader is not None:
+                cursor = reader.cursor()
+                cursor.row_factory = query.pabrik
+                return cursor.execute(query.sql, params).fetchall()
+            with self._lock:
+                cursor = self.conn.cursor()
+                cursor.row_factory = query.pabrik
+                return cursor.execute(query.sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise QueryError(nama, e) from e
+
+    def ambil_satu(self, nama, params=()):
+        """Seperti ambil(), tetapi hanya baris pertama (None jika kosong)"""
+        rows = self.ambil(nama, params)
+        return rows[0] if rows else None
 
     # --- Metode untuk Pelanggan ---
     def add_pelanggan(self, nama, alamat="", telepon=""):
-        return self.execute_query(
-            "INSERT INTO pelanggan (nama_pelanggan, alamat, telepon) VALUES (?, ?, ?)", 
+        return self.execute_returning(
+            "INSERT INTO pelanggan (nama_pelanggan, alamat, telepon) VALUES (?, ?, ?) "
+            "RETURNING id, nama_pelanggan, alamat, telepon",
             (nama, alamat, telepon)
         )
 
     def get_all_pelanggan(self):
-        return self.execute_fetch_query("SELECT id, nama_pelanggan, alamat, telepon FROM pelanggan ORDER BY nama_pelanggan")
+        return self.ambil("pelanggan.semua")
 
     def get_pelanggan_by_id(self, id):
-        result = self.execute_fetch_query("SELECT id, nama_pelanggan, alamat, telepon FROM pelanggan WHERE id = ?", (id,))
-        return result[0] if result else None
+        return self.ambil_satu("pelanggan.by_id", (id,))
 
     def update_pelanggan(self, id, nama, alamat, telepon):
-        return self.execute_query(
-            "UPDATE pelanggan SET nama_pelanggan=?, alamat=?, telepon=? WHERE id=?", 
+        return self.execute_returning(
+            "UPDATE pelanggan SET nama_pelanggan=?, alamat=?, telepon=? WHERE id=? "
+            "RETURNING id, nama_pelanggan, alamat, telepon",
             (nama, alamat, telepon, id)
         )
 
     def delete_pelanggan(self, id):
-        return self.execute_query("DELETE FROM pelanggan WHERE id=?", (id,))
+        return self.execute_returning("DELETE FROM pelanggan WHERE id=? RETURNING id, nama_pelanggan, alamat, telepon", (id,))
 
     # --- Metode untuk Produk ---
-    def add_produk(self, kode, nama, id_kategori=None, id_supplier=None, harga_beli=0, harga_jual=0, stok=0):
-        return self.execute_query(
-            """INSERT INTO produk (kode_produk, nama_produk, id_kategori, id_supplier, 
-               harga_beli, harga_jual, stok) VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (kode, nama, id_kategori, id_supplier, harga_beli, harga_jual, stok)
-        )
+    def add_produk(self, kode, nama, id_kategori=None, id_supplier=None, harga_beli=0, harga_jual=0, stok=0,
+                   stok_minimum=STOK_MINIMUM_DEFAULT):
+        # Baris dikembalikan dalam format get_all_produk (nama kategori/supplier ikut)
+        with self._lock:
+            row = self.execute_returning(
+                """INSERT INTO produk (kode_produk, nama_produk, id_kategori, id_supplier, 
+                   harga_beli, harga_jual, stok, stok_minimum) VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING id""",
+                (kode, nama, id_kategori, id_supplier, harga_beli, harga_jual, stok, stok_minimum)
+            )
+            if not row:
+                return None
+            self.kabarkan_stok([row[0]])
+            return self.get_produk_by_id(row[0])
 
     def get_all_produk(self):
-        return self.execute_fetch_query("""
-            SELECT p.id, p.kode_produk, p.nama_produk, 
-                   k.nama_kategori, s.nama_supplier,
-                   p.harga_beli, p.harga_jual, p.stok 
-            FROM produk p
-            LEFT JOIN kategori k ON p.id_kategori = k.id
-            LEFT JOIN supplier s ON p.id_supplier = s.id
-            ORDER BY p.nama_produk
-        """)
+        return self.ambil("produk.semua")
 
     def get_produk_by_id(self, id):
-        result = self.execute_fetch_query("""
-            SELECT p.id, p.kode_produk, p.nama_produk, 
-                   k.nama_kategori, s.nama_supplier,
-                   p.harga_beli, p.harga_jual, p.stok 
-            FROM produk p
-            LEFT JOIN kategori k ON p.id_kategori = k.id
-            LEFT JOIN supplier s ON p.id_supplier = s.id
-            WHERE p.id = ?
-        """, (id,))
-        return result[0] if result else None
+        return self.ambil_satu("produk.by_id", (id,))
 
-    def get_produk_by_kode(self, kode):
-        result = self.execute_fetch_query("SELECT * FROM produk WHERE kode_produk = ?", (kode,))
-        return result[0] if result else None
+    def get_produk_by_ids(self, ids):
+        """Mendapatkan beberapa produk sekaligus (format sama dengan get_all_produk)"""
+        return self.ambil("produk.by_ids", (json.dumps(list(ids)),))
 
-    def update_produk(self, id, kode, nama, id_kategori, id_supplier, harga_beli, harga_jual, stok):
-        return self.execute_query(
-            """UPDATE produk SET kode_produk=?, nama_produk=?, id_kategori=?, id_supplier=?, 
-               harga_beli=?, harga_jual=?, stok=? WHERE id=?""",
-            (kode, nama, id_kategori, id_supplier, harga_beli, harga_jual, stok, id)
-        )
+    def get_versi_data(self):
+        """Versi data katalog produk, naik setiap ada perubahan produk/kategori/supplier"""
+        row = self.ambil_satu("katalog.versi")
+        return row[0] if row else 0
+
+    def get_produk_berubah(self, versi):
+        """Daftar id produk yang berubah (termasuk dihapus) setelah versi tertentu"""
+        return [row[0] for row in self.ambil("katalog.berubah", (versi,))]
+
+    def get_produk_by_kode(self, kode):
+        # Memakai indeks UNIQUE kode_produk; format kolom sama dengan get_all_produk
+        return self.ambil_satu("produk.by_kode", (kode,))
+
+    def update_produk(self, id, kode, nama, id_kategori, id_supplier, harga_beli, harga_jual, stok,
+                      stok_minimum=None):
+        # stok_minimum=None: titik pemesanan ulang tidak diubah
+        with self._lock:
+            row = self.execute_returning(
+                """UPDATE produk SET kode_produk=?, nama_produk=?, id_kategori=?, id_supplier=?, 
+                   harga_beli=?, harga_jual=?, stok=?, stok_minimum=COALESCE(?, stok_minimum)
+                   WHERE id=? RETURNING id""",
+                (kode, nama, id_kategori, id_supplier, harga_beli, harga_jual, stok, stok_minimum, id)
+            )
+            if not row:
+                return None
+            self.kabarkan_stok([row[0]])
+            return self.get_produk_by_id(row[0])
 
     def delete_produk(self, id):
-        return self.execute_query("DELETE FROM produk WHERE id=?", (id,))
+        # Mengembalikan baris yang dihapus (format get_all_produk), None jika gagal
+        with self._lock:
+            row = self.get_produk_by_id(id)
+            if row is None or not self.execute_returning("DELETE FROM produk WHERE id=? RETURNING id", (id,)):
+                return None
+            self.kabarkan_stok([id])
+            return row
 
     # --- Metode untuk Kategori ---
     def add_kategori(self, nama):
-        return self.execute_query("INSERT INTO kategori (nama_kategori) VALUES (?)", (nama,))
+        return self.execute_returning("INSERT INTO kategori (nama_kategori) VALUES (?) RETURNING id, nama_kategori", (nama,))
 
     def get_all_kategori(self):
-        return self.execute_fetch_query("SELECT id, nama_kategori FROM kategori ORDER BY nama_kategori")
+        return self.ambil("kategori.semua")
 
     def get_kategori_by_id(self, id):
-        result = self.execute_fetch_query("SELECT id, nama_kategori FROM kategori WHERE id = ?", (id,))
-        return result[0] if result else None
+        return self.ambil_satu("kategori.by_id", (id,))
 
     def update_kategori(self, id, nama):
-        return self.execute_query("UPDATE kategori SET nama_kategori=? WHERE id=?", (nama, id))
+        return self.execute_returning("UPDATE kategori SET nama_kategori=? WHERE id=? RETURNING id, nama_kategori", (nama, id))
 
     def delete_kategori(self, id):
-        return self.execute_query("DELETE FROM kategori WHERE id=?", (id,))
+        return self.execute_returning("DELETE FROM kategori WHERE id=? RETURNING id, nama_kategori", (id,))
 
     # --- Metode untuk Supplier ---
     def add_supplier(self, nama, alamat="", telepon=""):
-        return self.execute_query(
-            "INSERT INTO supplier (nama_supplier, alamat, telepon) VALUES (?, ?, ?)", 
+        return self.execute_returning(
+            "INSERT INTO supplier (nama_supplier, alamat, telepon) VALUES (?, ?, ?) "
+            "RETURNING id, nama_supplier, alamat, telepon",
             (nama, alamat, telepon)
         )
 
     def get_all_supplier(self):
-        return self.execute_fetch_query("SELECT id, nama_supplier, alamat, telepon FROM supplier ORDER BY nama_supplier")
+        return self.ambil("supplier.semua")
 
     def get_supplier_by_id(self, id):
-        result = self.execute_fetch_query("SELECT id, nama_supplier, alamat, telepon FROM supplier WHERE id = ?", (id,))
-        return result[0] if result else None
+        return self.ambil_satu("supplier.by_id", (id,))
 
     def update_supplier(self, id, nama, alamat, telepon):
-        return self.execute_query(
-            "UPDATE supplier SET nama_supplier=?, alamat=?, telepon=? WHERE id=?", 
+        return self.execute_returning(
+            "UPDATE supplier SET nama_supplier=?, alamat=?, telepon=? WHERE id=? "
+            "RETURNING id, nama_supplier, alamat, telepon",
             (nama, alamat, telepon, id)
         )
 
     def delete_supplier(self, id):
-        return self.execute_query("DELETE FROM supplier WHERE id=?", (id,))
+        return self.execute_returning("DELETE FROM supplier WHERE id=? RETURNING id, nama_supplier, alamat, telepon", (id,))
 
     # --- Metode untuk Karyawan ---
     def add_karyawan(self, nama, alamat="", telepon=""):
-        return self.execute_query(
-            "INSERT INTO karyawan (nama_karyawan, alamat, telepon) VALUES (?, ?, ?)", 
+        return self.execute_returning(
+            "INSERT INTO karyawan (nama_karyawan, alamat, telepon) VALUES (?, ?, ?) "
+            "RETURNING id, nama_karyawan, alamat, telepon",
             (nama, alamat, telepon)
         )
 
     def get_all_karyawan(self):
-        return self.execute_fetch_query("SELECT id, nama_karyawan, alamat, telepon FROM karyawan ORDER BY nama_karyawan")
+        return self.ambil("karyawan.semua")
 
     def get_karyawan_by_id(self, id):
-        result = self.execute_fetch_query("SELECT id, nama_karyawan, alamat, telepon FROM karyawan WHERE id = ?", (id,))
-        return result[0] if result else None
+        return self.ambil_satu("karyawan.by_id", (id,))
 
     def update_karyawan(self, id, nama, alamat, telepon):
-        return self.execute_query(
-            "UPDATE karyawan SET nama_karyawan=?, alamat=?, telepon=? WHERE id=?", 
+        return self.execute_returning(
+            "UPDATE karyawan SET nama_karyawan=?, alamat=?, telepon=? WHERE id=? "
+            "RETURNING id, nama_karyawan, alamat, telepon",
             (nama, alamat, telepon, id)
         )
 
     def delete_karyawan(self, id):
-        return self.execute_query("DELETE FROM karyawan WHERE id=?", (id,))
+        return self.execute_returning("DELETE FROM karyawan WHERE id=? RETURNING id, nama_karyawan, alamat, telepon", (id,))
 
     # --- Metode untuk Pengguna (Login) ---
     def add_pengguna(self, username, password, id_karyawan, level="kasir"):
@@ -349,203 +976,267 @@ class Database:
         )
 
     def get_pengguna_by_username(self, username):
-        result = self.execute_fetch_query(
-            "SELECT p.*, k.nama_karyawan FROM pengguna p JOIN karyawan k ON p.id_karyawan = k.id WHERE username = ?",
-            (username,)
-        )
-        return result[0] if result else None
-
-   # database.py - Perbaiki method verify_login
+        return self.ambil_satu("pengguna.by_username", (username,))
 
     def verify_login(self, username, password):
-        """Memverifikasi login user"""
-        try:
-            # Query yang lebih sederhana dan jelas
-            result = self.execute_fetch_query(
-                """SELECT p.id, p.username, p.password, p.id_karyawan, p.level, 
-                    k.nama_karyawan 
-                FROM pengguna p 
-                LEFT JOIN karyawan k ON p.id_karyawan = k.id 
-                WHERE p.username = ? AND p.password = ?""",
-                (username, password)
-            )
-            
-            if result:
-                # Pastikan result memiliki 6 kolom
-                row = result[0]
-                if len(row) >= 6:
-                    return row
-                else:
-                    # Jika tidak ada nama karyawan, gunakan username
-                    return (row[0], row[1], row[2], row[3], row[4], row[1])  # username sebagai nama
-            return None
-        except Exception as e:
-            print(f"Login error: {e}")
-            return None
-        
-    # database.py - tambahkan method ini
+        """Memverifikasi login user, mengembalikan baris pengguna atau None jika salah"""
+        return self.ambil_satu("pengguna.login", (username, password))
+
     def verify_login_dict(self, username, password):
-        """Memverifikasi login dan return dictionary"""
-        try:
-            # Query yang lebih aman
-            result = self.execute_fetch_query(
-                """SELECT 
-                    p.id, 
-                    p.username, 
-                    p.id_karyawan, 
-                    p.level,
-                    COALESCE(k.nama_karyawan, p.username) as nama
-                FROM pengguna p 
-                LEFT JOIN karyawan k ON p.id_karyawan = k.id 
-                WHERE p.username = ? AND p.password = ?""",
-                (username, password)
-            )
-            
-            if result:
-                row = result[0]
-                return {
-                    "id": row[0],
-                    "username": row[1],
-                    "id_karyawan": row[2],
-                    "level": row[3],
-                    "nama": row[4]
-                }
-            return None
-        except Exception as e:
-            print(f"Login error: {e}")
-            return None
+        """Memverifikasi login dan return dictionary (None jika username/password salah)"""
+        row = self.ambil_satu("pengguna.login_info", (username, password))
+        return row._asdict() if row else None
 
     # --- Metode untuk Transaksi Penjualan ---
-    def add_transaksi_penjualan(self, id_pelanggan, id_karyawan, total):
-        """Menambah transaksi penjualan baru"""
+    def get_detail_penjualan_by_id(self, id_penjualan):
+        return self.ambil("penjualan.detail", (id_penjualan,))
+
+    # --- Metode Checkout (satu transaksi atomik) ---
+    @staticmethod
+    def _cek_items(items):
+        """Menolak keranjang dengan qty <= 0 (qty negatif akan membalik arah perubahan stok)"""
+        for item in items:
+            if item['qty'] <= 0:
+                raise ValueError(f"Qty produk {item['id_produk']} harus lebih dari 0")
+
+    def checkout(self, id_pelanggan, id_karyawan, items, token=None, tunggu=None):
+        """Menyimpan penjualan (header, detail, dan pengurangan stok) dalam satu transaksi.
+
+        items berisi dict {'id_produk', 'qty', 'harga'}. Stok yang dipesan keranjang
+        lain (reservasi aktif selain milik token) tidak ikut terjual. Jika ada satu
+        baris yang stoknya tidak cukup, seluruh keranjang dibatalkan dan mengembalikan
+        None. Reservasi milik token dilepas dalam transaksi yang sama.
+
+        tunggu: batas detik menunggu writer lain (lock koneksi dan busy_timeout
+        SQLite). Jika diisi, database yang masih terkunci setelah itu dilempar sebagai
+        sqlite3.OperationalError supaya pemanggil bisa mengantrekan penjualannya
+        (lihat antrian.py); tanpa tunggu semua kegagalan mengembalikan None.
+        """
+        if not items:
+            return None
+        if not self._lock.acquire(timeout=-1 if tunggu is None else tunggu):
+            raise sqlite3.OperationalError("database is locked")
+        busy_lama = None
         try:
+            if tunggu is not None:
+                busy_lama = self.conn.execute("PRAGMA busy_timeout").fetchone()[0]
+                self.conn.execute(f"PRAGMA busy_timeout = {int(tunggu * 1000)}")
+            self._cek_items(items)
             today = datetime.now().strftime("%Y-%m-%d")
             waktu = datetime.now().strftime("%H:%M:%S")
-            
+            total = sum(item['qty'] * item['harga'] for item in items)
+
+            self.cursor.execute("BEGIN IMMEDIATE")
             self.cursor.execute(
-                """INSERT INTO penjualan (id_pelanggan, id_karyawan, tanggal_penjualan, 
-                   waktu_penjualan, total_harga) VALUES (?, ?, ?, ?, ?)""",
+                QUERY["penjualan.tambah"].sql,
                 (id_pelanggan, id_karyawan, today, waktu, total)
             )
-            self.conn.commit()
-            return self.cursor.lastrowid
-        except Exception as e:
-            print(f"Error adding penjualan: {e}")
-            return None
+            id_penjualan = self.cursor.lastrowid
 
-    def add_detail_penjualan(self, id_penjualan, id_produk, jumlah, harga_satuan):
-        """Menambah detail penjualan dan mengurangi stok"""
-        try:
-            subtotal = jumlah * harga_satuan
-            
-            # Kurangi stok produk
-            if not self.update_stok_produk(id_produk, -jumlah):
-                return False
-            
-            # Tambah detail penjualan
-            self.cursor.execute(
-                """INSERT INTO detail_penjualan (id_penjualan, id_produk, jumlah, 
-                   harga_satuan, subtotal) VALUES (?, ?, ?, ?, ?)""",
-                (id_penjualan, id_produk, jumlah, harga_satuan, subtotal)
+            # Kurangi stok hanya jika stok di luar reservasi keranjang lain mencukupi
+            sekarang = time.time()
+            self.cursor.executemany(
+                QUERY["stok.kurangi_tersedia"].sql,
+                [(item['qty'], item['id_produk'], token or "", sekarang, item['qty']) for item in items]
             )
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error adding detail penjualan: {e}")
-            return False
+            if self.cursor.rowcount != len(items):
+                raise ValueError("Stok tidak mencukupi untuk salah satu produk")
 
-    def get_detail_penjualan_by_id(self, id_penjualan):
-        return self.execute_fetch_query("""
-            SELECT dp.id, p.id, p.nama_produk, dp.jumlah, dp.harga_satuan, dp.subtotal
-            FROM detail_penjualan dp
-            JOIN produk p ON dp.id_produk = p.id
-            WHERE dp.id_penjualan = ?
-        """, (id_penjualan,))
-        
-    # --- Metode untuk Transaksi Pembelian ---
-    def add_transaksi_pembelian(self, id_supplier, id_karyawan, total):
-        """Menambah transaksi pembelian baru"""
-        try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            waktu = datetime.now().strftime("%H:%M:%S")
-            
-            self.cursor.execute(
-                """INSERT INTO pembelian (id_supplier, id_karyawan, tanggal_pembelian, 
-                   waktu_pembelian, total_harga) VALUES (?, ?, ?, ?, ?)""",
-                (id_supplier, id_karyawan, today, waktu, total)
+            self.cursor.executemany(
+                QUERY["penjualan.detail_tambah"].sql,
+                [(id_penjualan, item['id_produk'], item['qty'], item['harga'],
+                  item['qty'] * item['harga']) for item in items]
             )
+            if token:
+                self.cursor.execute(QUERY["reservasi.lepas"].sql, (token,))
             self.conn.commit()
-            return self.cursor.lastrowid
+            self.kabarkan_stok({item['id_produk'] for item in items})
+            return id_penjualan
+        except sqlite3.OperationalError as e:
+            self.conn.rollback()
+            if tunggu is not None:
+                raise
+            print(f"Error checkout penjualan: {e}")
+            return None
         except Exception as e:
-            print(f"Error adding pembelian: {e}")
+            self.conn.rollback()
+            print(f"Error checkout penjualan: {e}")
             return None
+        finally:
+            if busy_lama is not None:
+                self.conn.execute(f"PRAGMA busy_timeout = {busy_lama}")
+            self._lock.release()
+
+    def checkout_antrian(self, transaksi):
+        """Memutar ulang penjualan dari antrian checkout offline (antrian.py) dalam satu transaksi.
+
+        transaksi berisi dict {'kunci', 'id_pelanggan', 'id_karyawan', 'tanggal', 'waktu',
+        'items', 'token'}. Penjualan yang kuncinya sudah ada di database tidak dihitung
+        lagi, jadi batch yang sama aman diputar berulang kali.
+
+        Penjualan ini sudah selesai di kasir (struk sudah dicetak), jadi stok yang
+        kurang tidak membuatnya ditolak: stok tetap dikurangi (bisa minus) dan
+        penjualannya ditandai perlu_cek. Selama reservasi keranjangnya (token) masih
+        aktif stoknya tidak bisa dijual kasir lain, jadi ini hanya terjadi jika database
+        tidak bisa dicapai lebih lama dari RESERVASI_TTL atau reservasinya gagal. Hanya data yang tidak valid (produk tidak
+        ada, qty <= 0) yang ditolak, sendiri-sendiri (savepoint) tanpa membatalkan
+        yang lain.
+
+        Mengembalikan list (kunci, id_penjualan, alasan) sesuai urutan transaksi;
+        id_penjualan None jika ditolak, alasan diisi juga untuk penjualan perlu_cek.
+        None jika seluruh batch gagal (mis. database sibuk) dan harus dicoba lagi nanti.
+        """
+        with self._lock:
+            hasil = []
+            berubah = set()
+            try:
+                sekarang = time.time()
+                self.cursor.execute("BEGIN IMMEDIATE")
+                for t in transaksi:
+                    row = self.cursor.execute(QUERY["penjualan.by_kunci"].sql, (t['kunci'],)).fetchone()
+                    if row is not None:
+                        hasil.append((t['kunci'], row[0], None))  # sudah pernah masuk
+                        continue
+                    items = t['items']
+                    self.cursor.execute("SAVEPOINT antrian")
+                    try:
+                        self._cek_items(items)
+                        self.cursor.execute(
+                            QUERY["penjualan.tambah_kunci"].sql,
+                            (t['id_pelanggan'], t['id_karyawan'], t['tanggal'], t['waktu'],
+                             sum(item['qty'] * item['harga'] for item in items), t['kunci'])
+                        )
+                        id_penjualan = self.cursor.lastrowid
+                        kurang = []
+                        for item in items:
+                            self.cursor.execute(
+                                QUERY["stok.kurangi_tersedia"].sql,
+                                (item['qty'], item['id_produk'], t.get('token') or "", sekarang, item['qty'])
+                            )
+                            if self.cursor.rowcount == 1:
+                                continue
+                            # Stok (di luar reservasi keranjang lain) kurang: tetap dicatat
+                            self.cursor.execute(QUERY["stok.kurangi_paksa"].sql, (item['qty'], item['id_produk']))
+                            if self.cursor.rowcount != 1:
+                                raise ValueError(f"Produk {item['id_produk']} tidak ditemukan")
+                            kurang.append(item['id_produk'])
+                        if kurang:
+                            self.cursor.execute(QUERY["penjualan.tandai_cek"].sql, (id_penjualan,))
+                        self.cursor.executemany(
+                            QUERY["penjualan.detail_tambah"].sql,
+                            [(id_penjualan, item['id_produk'], item['qty'], item['harga'],
+                              item['qty'] * item['harga']) for item in items]
+                        )
+                        if t.get('token'):
+                            self.cursor.execute(QUERY["reservasi.lepas"].sql, (t['token'],))
+                        self.cursor.execute("RELEASE antrian")
+                        alasan = None
+                        if kurang:
+                            alasan = f"Stok kurang, dicatat minus: produk {', '.join(map(str, kurang))}"
+                        hasil.append((t['kunci'], id_penjualan, alasan))
+                        berubah.update(item['id_produk'] for item in items)
+                    except (ValueError, sqlite3.IntegrityError) as e:
+                        self.cursor.execute("ROLLBACK TO antrian")
+                        self.cursor.execute("RELEASE antrian")
+                        hasil.append((t['kunci'], None, str(e)))
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error sinkron antrian penjualan: {e}")
+                return None
+        if berubah:
+            self.kabarkan_stok(berubah)
+        return hasil
+
+    def get_penjualan_perlu_cek(self):
+        """Penjualan antrian yang dicatat walau stoknya kurang, terbaru dulu"""
+        return self.ambil("penjualan.perlu_cek")
+
+    def selesai_cek_penjualan(self, id_penjualan):
+        """Menandai penjualan perlu_cek sudah diperiksa"""
+        return self.execute_query(QUERY["penjualan.selesai_cek"].sql, (id_penjualan,))
+
+    def checkout_pembelian(self, id_supplier, id_karyawan, items):
+        """Menyimpan pembelian (header, detail, dan penambahan stok) dalam satu transaksi"""
+        with self._lock:
+            if not items:
+                return None
+            try:
+                self._cek_items(items)
+                today = datetime.now().strftime("%Y-%m-%d")
+                waktu = datetime.now().strftime("%H:%M:%S")
+                total = sum(item['qty'] * item['harga'] for item in items)
+
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(
+                    QUERY["pembelian.tambah"].sql,
+                    (id_supplier, id_karyawan, today, waktu, total)
+                )
+                id_pembelian = self.cursor.lastrowid
 
-    def add_detail_pembelian(self, id_pembelian, id_produk, jumlah, harga_satuan):
-        """Menambah detail pembelian dan menambah stok"""
-        try:
-            subtotal = jumlah * harga_satuan
-            
-            # Tambah stok produk
-            if not self.update_stok_produk(id_produk, jumlah):
-                return False
-            
-            # Tambah detail pembelian
-            self.cursor.execute(
-                """INSERT INTO detail_pembelian (id_pembelian, id_produk, jumlah, 
-                   harga_satuan, subtotal) VALUES (?, ?, ?, ?, ?)""",
-                (id_pembelian, id_produk, jumlah, harga_satuan, subtotal)
-            )
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error adding detail pembelian: {e}")
-            return False
+                self.cursor.executemany(
+                    QUERY["stok.tambah"].sql,
+                    [(item['qty'], item['id_produk']) for item in items]
+                )
+                if self.cursor.rowcount != len(items):
+                    raise ValueError("Produk tidak ditemukan")
 
-    # --- Metode untuk Retur Penjualan ---
-    def add_transaksi_retur_penjualan(self, id_penjualan, id_pelanggan, id_karyawan, total, alasan=""):
-        """Menambah transaksi retur penjualan"""
-        try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            waktu = datetime.now().strftime("%H:%M:%S")
-            
-            self.cursor.execute(
-                """INSERT INTO retur_penjualan (id_penjualan, id_pelanggan, id_karyawan, 
-                   tanggal_retur, waktu_retur, total_retur, alasan_retur) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (id_penjualan, id_pelanggan, id_karyawan, today, waktu, total, alasan)
-            )
-            self.conn.commit()
-            return self.cursor.lastrowid
-        except Exception as e:
-            print(f"Error adding retur penjualan: {e}")
-            return None
-    
-    def add_detail_retur_penjualan(self, id_retur, id_produk, qty, harga):
-        """Menambah detail retur penjualan dan menambah stok kembali"""
-        try:
-            subtotal = qty * harga
-            
-            # Tambah stok produk kembali
-            if not self.update_stok_produk(id_produk, qty):
-                return False
-            
-            # Tambah detail retur
-            self.cursor.execute(
-                """INSERT INTO detail_retur_penjualan (id_retur, id_produk, qty, 
-                   harga, subtotal) VALUES (?, ?, ?, ?, ?)""",
-                (id_retur, id_produk, qty, harga, subtotal)
-            )
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error adding detail retur: {e}")
-            return False
+                self.cursor.executemany(
+                    QUERY["pembelian.detail_tambah"].sql,
+                    [(id_pembelian, item['id_produk'], item['qty'], item['harga'],
+                      item['qty'] * item['harga']) for item in items]
+                )
+                self.conn.commit()
+                self.kabarkan_stok({item['id_produk'] for item in items})
+                return id_pembelian
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error checkout pembelian: {e}")
+                return None
+
+    def checkout_retur(self, id_penjualan, id_pelanggan, id_karyawan, items, alasan=""):
+        """Menyimpan retur penjualan (header, detail, dan pengembalian stok) dalam satu transaksi"""
+        with self._lock:
+            if not items:
+                return None
+            try:
+                self._cek_items(items)
+                today = datetime.now().strftime("%Y-%m-%d")
+                waktu = datetime.now().strftime("%H:%M:%S")
+                total = sum(item['qty'] * item['harga'] for item in items)
+
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(
+                    QUERY["retur.tambah"].sql,
+                    (id_penjualan, id_pelanggan, id_karyawan, today, waktu, total, alasan)
+                )
+                id_retur = self.cursor.lastrowid
+
+                self.cursor.executemany(
+                    QUERY["stok.tambah"].sql,
+                    [(item['qty'], item['id_produk']) for item in items]
+                )
+                if self.cursor.rowcount != len(items):
+                    raise ValueError("Produk tidak ditemukan")
+
+                self.cursor.executemany(
+                    QUERY["retur.detail_tambah"].sql,
+                    [(id_retur, item['id_produk'], item['qty'], item['harga'],
+                      item['qty'] * item['harga']) for item in items]
+                )
+                self.conn.commit()
+                self.kabarkan_stok({item['id_produk'] for item in items})
+                return id_retur
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error checkout retur: {e}")
+                return None
 
     # --- Metode untuk Stok ---
     def get_produk_stok(self, produk_id):
         """Mendapatkan stok produk berdasarkan ID"""
-        result = self.execute_fetch_query("SELECT stok FROM produk WHERE id = ?", (produk_id,))
-        return result[0][0] if result else 0
+        row = self.ambil_satu("produk.stok", (produk_id,))
+        return row[0] if row else 0
 
     def check_stok_cukup(self, produk_id, qty_dibutuhkan):
         """Memeriksa apakah stok mencukupi"""
@@ -553,156 +1244,811 @@ class Database:
         return stok_tersedia >= qty_dibutuhkan, stok_tersedia
 
     def update_stok_produk(self, produk_id, perubahan):
-        """Update stok produk (bisa positif untuk tambah, negatif untuk kurang)"""
-        try:
-            self.cursor.execute(
-                "UPDATE produk SET stok = stok + ? WHERE id = ?",
-                (perubahan, produk_id)
-            )
-            self.conn.commit()
-            
-            # Verifikasi stok tidak negatif
-            self.cursor.execute("SELECT stok FROM produk WHERE id = ?", (produk_id,))
-            stok_sekarang = self.cursor.fetchone()[0]
-            
-            if stok_sekarang < 0:
-                # Rollback jika stok negatif
-                self.cursor.execute(
-                    "UPDATE produk SET stok = stok - ? WHERE id = ?",
-                    (perubahan, produk_id)
-                )
+        """Update stok produk (bisa positif untuk tambah, negatif untuk kurang).
+
+        Pengurangan memakai satu UPDATE bersyarat (stok >= jumlah); rowcount 0
+        berarti stok tidak cukup dan tidak ada yang diubah, jadi stok tidak pernah
+        negatif walau beberapa terminal menjual produk yang sama bersamaan.
+        """
+        with self._lock:
+            try:
+                if perubahan < 0:
+                    self.cursor.execute(QUERY["stok.kurangi"].sql, (-perubahan, produk_id, -perubahan))
+                else:
+                    self.cursor.execute(QUERY["stok.tambah"].sql, (perubahan, produk_id))
+                berhasil = self.cursor.rowcount == 1
                 self.conn.commit()
+                if berhasil:
+                    self.kabarkan_stok([produk_id])
+                return berhasil
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error updating stock: {e}")
                 return False
-                
-            return True
-        except Exception as e:
-            print(f"Error updating stock: {e}")
-            return False
 
-    def get_produk_dengan_stok_rendah(self, batas=5):
-        """Mendapatkan produk dengan stok di bawah batas tertentu"""
-        return self.execute_fetch_query("""
-            SELECT p.id, p.kode_produk, p.nama_produk, p.stok, 
-                   k.nama_kategori, p.harga_jual
-            FROM produk p
-            LEFT JOIN kategori k ON p.id_kategori = k.id
-            WHERE p.stok <= ?
-            ORDER BY p.stok ASC
-        """, (batas,))
+    def get_stok_tersedia(self, produk_id, token=""):
+        """Stok yang masih bisa dijual untuk keranjang token: stok dikurangi reservasi keranjang lain"""
+        row = self.ambil_satu("stok.tersedia", (token, time.time(), produk_id))
+        return row[0] if row else 0
+
+    def reservasi_stok(self, token, produk_id, qty, ttl=RESERVASI_TTL):
+        """Memesan stok produk untuk keranjang token; qty = jumlah total produk itu di keranjang.
+
+        Satu INSERT bersyarat: hanya berhasil jika stok dikurangi reservasi aktif
+        keranjang lain masih cukup, jadi dua terminal tidak bisa memesan stok yang
+        sama. Semua reservasi keranjang ikut diperpanjang ttl detik. Mengembalikan
+        True jika berhasil, False jika stok sudah dipesan/terjual. Error database
+        (mis. database terkunci) dilempar, bukan dijadikan False.
+        """
+        if qty <= 0:
+            return self.lepas_reservasi(token, produk_id)
+        with self._lock:
+            try:
+                sekarang = time.time()
+                self.cursor.execute("BEGIN IMMEDIATE")
+                self.cursor.execute(QUERY["reservasi.bersihkan"].sql, (sekarang,))
+                self.cursor.execute(QUERY["reservasi.simpan"].sql,
+                                    (token, qty, sekarang + ttl, produk_id, token, sekarang, qty))
+                berhasil = self.cursor.rowcount == 1
+                if berhasil:
+                    self.cursor.execute(QUERY["reservasi.perpanjang"].sql, (sekarang + ttl, token))
+                self.conn.commit()
+                return berhasil
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def lepas_reservasi(self, token, produk_id=None):
+        """Melepas reservasi satu produk, atau seluruh keranjang token jika produk_id None"""
+        if produk_id is None:
+            return self.execute_query(QUERY["reservasi.lepas"].sql, (token,))
+        return self.execute_query(QUERY["reservasi.lepas_produk"].sql, (token, produk_id))
+
+    def get_produk_dengan_stok_rendah(self, batas=None, ids=None):
+        """Mendapatkan produk dengan stok di bawah batas tertentu.
+
+        Tanpa batas dipakai titik pemesanan ulang masing-masing produk (stok_minimum),
+        dibaca dari partial index idx_produk_stok_rendah. ids membatasi pemeriksaan
+        ke produk tertentu saja (mis. produk yang baru berubah stoknya).
+        """
+        if ids is not None:
+            rows = self.ambil("stok.rendah_ids", (json.dumps(list(ids)),))
+            return rows if batas is None else [row for row in rows if row.stok <= batas]
+        if batas is None:
+            return self.ambil("stok.rendah")
+        return self.ambil("stok.rendah_batas", (batas,))
+
+    # --- Kabar perubahan stok ---
+    def pantau_stok(self, fungsi):
+        """Mendaftarkan fungsi(ids) yang dipanggil setiap stok produk berubah.
+
+        ids berisi id produk yang berubah, atau None jika banyak produk berubah
+        sekaligus (import, restore). Fungsi dipanggil dari thread yang menulis,
+        jadi pendengar di Tk harus meneruskannya sendiri ke thread Tk.
+        """
+        self._pendengar_stok.append(fungsi)
+        return fungsi
+
+    def lepas_pantau_stok(self, fungsi):
+        if fungsi in self._pendengar_stok:
+            self._pendengar_stok.remove(fungsi)
+
+    def kabarkan_stok(self, ids):
+        """Memberi tahu semua pendengar bahwa stok produk ids (None = semua) berubah"""
+        for fungsi in list(self._pendengar_stok):
+            try:
+                fungsi(None if ids is None else set(ids))
+            except Exception as e:
+                print(f"Error pendengar stok: {e}")
 
     # --- Metode untuk Laporan ---
     def get_laporan_penjualan(self, tanggal_awal=None, tanggal_akhir=None):
         """Mendapatkan laporan penjualan dengan filter tanggal"""
-        query = """
-            SELECT p.id, p.tanggal_penjualan, p.waktu_penjualan, 
-                   pel.nama_pelanggan, kar.nama_karyawan, p.total_harga
-            FROM penjualan p
-            JOIN pelanggan pel ON p.id_pelanggan = pel.id
-            JOIN karyawan kar ON p.id_karyawan = kar.id
+        if not (tanggal_awal and tanggal_akhir):
+            tanggal_awal, tanggal_akhir = TANGGAL_MIN, TANGGAL_MAKS
+        return self.ambil("laporan.penjualan", (tanggal_awal, tanggal_akhir))
+
+    def get_laporan_penjualan_page(self, tanggal_awal=None, tanggal_akhir=None, after=None, page=500):
+        """Mendapatkan satu halaman laporan penjualan (keyset pagination).
+
+        after = (tanggal, waktu, id) dari baris terakhir halaman sebelumnya.
         """
-        
-        params = []
+        batas_awal, batas_akhir = TANGGAL_MIN, TANGGAL_MAKS
         if tanggal_awal and tanggal_akhir:
-            query += " WHERE p.tanggal_penjualan BETWEEN ? AND ?"
-            params.extend([tanggal_awal, tanggal_akhir])
-        
-        query += " ORDER BY p.tanggal_penjualan DESC, p.waktu_penjualan DESC"
-        
-        return self.execute_fetch_query(query, tuple(params))
+            batas_awal, batas_akhir = tanggal_awal, tanggal_akhir
+        if after:
+            # Range index dimulai langsung dari tanggal kunci, bukan dari tanggal akhir
+            batas_akhir = min(batas_akhir, after[0])
+        else:
+            after = KUNCI_PENJUALAN_MAKS
+
+        return self.ambil("laporan.penjualan_halaman", (batas_awal, batas_akhir, *after, page))
+
+    def iter_laporan_penjualan(self, tanggal_awal=None, tanggal_akhir=None, after=None, page=500):
+        """Generator baris laporan penjualan, diambil per halaman tanpa fetchall() seluruh data"""
+        while True:
+            rows = self.get_laporan_penjualan_page(tanggal_awal, tanggal_akhir, after, page)
+            yield from rows
+            if len(rows) < page:
+                return
+            terakhir = rows[-1]
+            after = (terakhir[1], terakhir[2], terakhir[0])
+
+    def get_laporan_penjualan_summary(self, tanggal_awal=None, tanggal_akhir=None):
+        """Mendapatkan (jumlah transaksi, total, rata-rata) penjualan dari tabel ringkasan harian"""
+        if not (tanggal_awal and tanggal_akhir):
+            tanggal_awal, tanggal_akhir = TANGGAL_MIN, TANGGAL_MAKS
+        return self.ambil_satu("laporan.penjualan_ringkasan", (tanggal_awal, tanggal_akhir))
 
     def get_laporan_pembelian(self, tanggal_awal=None, tanggal_akhir=None):
         """Mendapatkan laporan pembelian dengan filter tanggal"""
-        query = """
-            SELECT pb.id, pb.tanggal_pembelian, pb.waktu_pembelian,
-                   s.nama_supplier, k.nama_karyawan, pb.total_harga
-            FROM pembelian pb
-            JOIN supplier s ON pb.id_supplier = s.id
-            JOIN karyawan k ON pb.id_karyawan = k.id
-        """
-        
-        params = []
-        if tanggal_awal and tanggal_akhir:
-            query += " WHERE pb.tanggal_pembelian BETWEEN ? AND ?"
-            params.extend([tanggal_awal, tanggal_akhir])
-        
-        query += " ORDER BY pb.tanggal_pembelian DESC, pb.waktu_pembelian DESC"
-        
-        return self.execute_fetch_query(query, tuple(params))
+        if not (tanggal_awal and tanggal_akhir):
+            tanggal_awal, tanggal_akhir = TANGGAL_MIN, TANGGAL_MAKS
+        return self.ambil("laporan.pembelian", (tanggal_awal, tanggal_akhir))
 
     def get_laporan_stok(self):
-        """Mendapatkan laporan stok semua produk"""
-        return self.execute_fetch_query("""
-            SELECT p.kode_produk, p.nama_produk, k.nama_kategori,
-                   s.nama_supplier, p.harga_beli, p.harga_jual, p.stok,
-                   (p.stok * p.harga_jual) as nilai_stok
-            FROM produk p
-            LEFT JOIN kategori k ON p.id_kategori = k.id
-            LEFT JOIN supplier s ON p.id_supplier = s.id
-            ORDER BY p.nama_produk
-        """)
+        """Mendapatkan laporan stok semua produk (kode s.d. nilai_stok, tanpa kolom id)"""
+        return [row[:8] for row in self.ambil("laporan.stok")]
+
+    def get_laporan_stok_page(self, after=None, page=1000):
+        """Satu halaman laporan stok urut nama (keyset), after = (nama_produk, id) baris terakhir"""
+        return self.ambil("laporan.stok_halaman", (*(after or KUNCI_STOK_MIN), page))
+
+    def iter_laporan_stok(self, page=1000):
+        """Generator baris laporan stok (format get_laporan_stok), diambil per halaman"""
+        after = None
+        while True:
+            rows = self.get_laporan_stok_page(after, page)
+            for row in rows:
+                yield row[:8]
+            if len(rows) < page:
+                return
+            after = (rows[-1][1], rows[-1][8])
 
     def get_ringkasan_penjualan_harian(self, tanggal=None):
         """Mendapatkan ringkasan penjualan harian"""
         if not tanggal:
             tanggal = datetime.now().strftime("%Y-%m-%d")
         
-        return self.execute_fetch_query("""
-            SELECT 
-                COUNT(*) as jumlah_transaksi,
-                SUM(total_harga) as total_penjualan,
-                AVG(total_harga) as rata_rata_transaksi
-            FROM penjualan
-            WHERE tanggal_penjualan = ?
-        """, (tanggal,))
-
-    def get_produk_terlaris(self, limit=10):
-        """Mendapatkan produk terlaris berdasarkan jumlah penjualan"""
-        return self.execute_fetch_query("""
-            SELECT 
-                p.nama_produk,
-                SUM(dp.jumlah) as total_terjual,
-                SUM(dp.subtotal) as total_pendapatan
-            FROM detail_penjualan dp
-            JOIN produk p ON dp.id_produk = p.id
-            GROUP BY dp.id_produk
-            ORDER BY total_terjual DESC
-            LIMIT ?
-        """, (limit,))
+        return self.ambil("ringkasan.harian", (tanggal,))
+
+    def get_penjualan_harian(self, tanggal_awal, tanggal_akhir, per=None):
+        """Ringkasan penjualan dan retur per hari dari tabel penjualan_harian.
+
+        per=None mengelompokkan per tanggal saja; per="karyawan" atau "pelanggan"
+        menambahkan id_karyawan/id_pelanggan (0 = tanpa karyawan/pelanggan) sebagai
+        kolom kedua. Baris: (tanggal, [id,] jumlah_transaksi, total_penjualan,
+        jumlah_retur, total_retur).
+        """
+        nama = {None: "harian.per_tanggal", "karyawan": "harian.per_karyawan",
+                "pelanggan": "harian.per_pelanggan"}
+        if per not in nama:
+            raise ValueError(f"Pengelompokan tidak dikenal: {per}")
+        return self.ambil(nama[per], (tanggal_awal, tanggal_akhir))
+
+    def rebuild_penjualan_harian(self):
+        """Menghitung ulang seluruh isi penjualan_harian dari penjualan dan retur_penjualan"""
+        return self._isi_ulang_ringkasan(ISI_PENJUALAN_HARIAN, "penjualan_harian")
+
+    def rebuild_penjualan_produk(self):
+        """Menghitung ulang penghitung penjualan per produk dari detail_penjualan"""
+        return self._isi_ulang_ringkasan(ISI_PENJUALAN_PRODUK, "penjualan_produk")
+
+    def _isi_ulang_ringkasan(self, perintah, tabel):
+        """Menjalankan perintah isi ulang dalam satu transaksi, mengembalikan jumlah baris tabel"""
+        with self._lock:
+            try:
+                self.cursor.execute("BEGIN IMMEDIATE")
+                for sql in perintah:
+                    self.cursor.execute(sql)
+                self.conn.commit()
+                return self.cursor.execute(f"SELECT COUNT(*) FROM {tabel}").fetchone()[0]
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                print(f"Error rebuild {tabel}: {e}")
+                return None
+
+    def get_produk_terlaris(self, limit=10, periode="semua", tanggal_awal=None, tanggal_akhir=None):
+        """Mendapatkan produk terlaris berdasarkan jumlah penjualan.
+
+        periode salah satu kunci PERIODE_TERLARIS; tanggal_awal dan tanggal_akhir
+        (keduanya diisi) memakai rentang tanggal sendiri. Tanpa periode dibaca dari
+        penghitung total per produk, dengan periode dari penghitung per hari.
+        """
+        if not (tanggal_awal and tanggal_akhir):
+            if periode not in PERIODE_TERLARIS:
+                raise ValueError(f"Periode tidak dikenal: {periode}")
+            hari = PERIODE_TERLARIS[periode]
+            if hari is None:
+                return self.ambil("terlaris.semua", (limit,))
+            hari_ini = datetime.now()
+            tanggal_awal = (hari_ini - timedelta(days=hari)).strftime("%Y-%m-%d")
+            tanggal_akhir = hari_ini.strftime("%Y-%m-%d")
+
+        return self.ambil("terlaris.periode", (tanggal_awal, tanggal_akhir, limit))
 
     # --- Metode Utility ---
     def get_total_pelanggan(self):
-        result = self.execute_fetch_query("SELECT COUNT(*) FROM pelanggan")
-        return result[0][0] if result else 0
+        return self.ambil_satu("total.pelanggan")[0]
 
     def get_total_produk(self):
-        result = self.execute_fetch_query("SELECT COUNT(*) FROM produk")
-        return result[0][0] if result else 0
+        return self.ambil_satu("total.produk")[0]
 
     def get_total_stok(self):
-        result = self.execute_fetch_query("SELECT SUM(stok) FROM produk")
-        return result[0][0] if result else 0
+        return self.ambil_satu("total.stok")[0] or 0
+
+    def get_dashboard_snapshot(self, ttl=DASHBOARD_TTL):
+        """Semua angka kartu dashboard dalam satu query, di-cache paling lama `ttl` detik.
+
+        Cache langsung tidak berlaku jika ada penulisan lewat koneksi ini
+        (total_changes) atau dari proses lain (PRAGMA data_version).
+        Mengembalikan dict total_pelanggan, total_produk, total_stok,
+        penjualan_hari_ini, dan jumlah_stok_rendah (stok <= stok_minimum).
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            kunci = (today, self.conn.total_changes,
+                     self.conn.execute("PRAGMA data_version").fetchone()[0])
+        with self._lock_dashboard:
+            cache = self._cache_dashboard
+        if cache and cache[0] == kunci and time.monotonic() - cache[1] < ttl:
+            return dict(cache[2])
+
+        snapshot = self.ambil_satu("dashboard.snapshot", (today,))._asdict()
+        with self._lock_dashboard:
+            self._cache_dashboard = (kunci, time.monotonic(), snapshot)
+        return dict(snapshot)
 
     def get_total_penjualan_hari_ini(self):
         today = datetime.now().strftime("%Y-%m-%d")
-        result = self.execute_fetch_query(
-            "SELECT SUM(total_harga) FROM penjualan WHERE tanggal_penjualan = ?", 
-            (today,)
-        )
-        return result[0][0] if result and result[0][0] else 0
+        return self.ambil_satu("total.penjualan_hari", (today,))[0] or 0
+
+    def backup_database(self, backup_path, progress=None, halaman=1024, kompres=False, simpan=None):
+        """Backup online dengan SQLite backup API, disalin bertahap per `halaman` page.
 
-    def backup_database(self, backup_path):
-        """Membuat backup database"""
+        progress(sisa, total) dipanggil setiap langkah (dari thread pemanggil).
+        kompres=True menyimpan hasil sebagai gzip (akhiran .gz). simpan=N hanya
+        menyisakan N backup terbaru database ini di folder tujuan.
+        Mengembalikan path file backup, atau None jika gagal.
+        """
+        if kompres and not backup_path.endswith(".gz"):
+            backup_path += ".gz"
+        salinan = (backup_path[:-3] if kompres else backup_path) + ".tmp"
+        langkah = (lambda status, sisa, total: progress(sisa, total)) if progress else None
         try:
-            import shutil
-            shutil.copy2("toko.db", backup_path)
-            return True
+            if os.path.exists(salinan):
+                os.remove(salinan)
+            dst = sqlite3.connect(salinan)
+            try:
+                if self.db_name == ":memory:":
+                    with self._lock:
+                        self.conn.backup(dst, pages=halaman, progress=langkah)
+                else:
+                    # Koneksi sumber sendiri: hanya data yang sudah di-commit yang ikut tersalin
+                    src = sqlite3.connect(self.db_name)
+                    try:
+                        if src.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                            # Tahan satu snapshot baca selama backup supaya penjualan yang masuk
+                            # tidak membuat backup mulai ulang; di WAL ini tidak memblokir penulis
+                            src.execute("BEGIN")
+                            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                        src.backup(dst, pages=halaman, progress=langkah, sleep=0.005)
+                    finally:
+                        src.close()
+            finally:
+                dst.close()
+
+            if kompres:
+                with open(salinan, "rb") as f_in, gzip.open(backup_path, "wb", compresslevel=6) as f_out:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+                os.remove(salinan)
+            else:
+                os.replace(salinan, backup_path)
+
+            if simpan:
+                self.rotasi_backup(os.path.dirname(backup_path) or ".", simpan)
+            return backup_path
         except Exception as e:
             print(f"Backup error: {e}")
-            return False
+            if os.path.exists(salinan):
+                os.remove(salinan)
+            return None
+
+    def rotasi_backup(self, folder, simpan):
+        """Menghapus backup lama ({nama_db}_backup_*.db[.gz]), menyisakan `simpan` file terbaru"""
+        awalan = os.path.splitext(os.path.basename(self.db_name))[0] + "_backup_"
+        backup = sorted(
+            (os.path.join(folder, nama) for nama in os.listdir(folder)
+             if nama.startswith(awalan) and nama.endswith((".db", ".db.gz"))),
+            key=os.path.getmtime, reverse=True
+        )
+        for path in backup[simpan:]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Gagal menghapus backup lama {path}: {e}")
+
+    def restore_database(self, backup_path, progress=None, halaman=4096):
+        """Restore dari file backup (.db atau .db.gz) tanpa menutup aplikasi.
+
+        Gabungan siapkan_restore() dan tukar_restore(); harus dipanggil dari luar
+        pool reader (lihat tukar_restore). Mengembalikan dict durasi tiap tahap
+        (detik), atau None jika gagal.
+        """
+        hasil = self.siapkan_restore(backup_path, progress, halaman)
+        if hasil is None:
+            return None
+        return self.tukar_restore(*hasil)
+
+    def siapkan_restore(self, backup_path, progress=None, halaman=4096):
+        """Tahap restore yang boleh berjalan di thread worker: menyiapkan database pengganti.
+
+        Backup disalin ke database sementara dengan backup API, dicek (PRAGMA
+        quick_check, tabel wajib, versi skema) lalu dimigrasi; database aktif belum
+        disentuh. progress(sisa, total) dipanggil saat penyalinan.
+        Mengembalikan (path sementara, dict durasi) untuk tukar_restore(), atau None jika gagal.
+        """
+        waktu = {}
+        mulai = time.perf_counter()
+        sementara = self.db_name + ".restore"
+        sumber = backup_path
+        langkah = (lambda status, sisa, total: progress(sisa, total)) if progress else None
+        berhasil = False
+        try:
+            if not os.path.isfile(backup_path):
+                raise FileNotFoundError(f"File backup tidak ditemukan: {backup_path}")
+            for path in (sementara, sementara + ".src"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+            # 1. Ekstrak backup terkompresi
+            if backup_path.endswith(".gz"):
+                sumber = sementara + ".src"
+                with gzip.open(backup_path, "rb") as f_in, open(sumber, "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+                waktu['ekstrak'] = time.perf_counter() - mulai
+
+            # 2. Salin ke database sementara lewat backup API
+            tahap = time.perf_counter()
+            src = sqlite3.connect(sumber)
+            dst = sqlite3.connect(sementara)
+            try:
+                src.backup(dst, pages=halaman, progress=langkah)
+            finally:
+                src.close()
+                dst.close()
+            waktu['salin'] = time.perf_counter() - tahap
+
+            # 3. Verifikasi lalu siapkan skema di file sementara, sebelum menyentuh database aktif
+            tahap = time.perf_counter()
+            conn = sqlite3.connect(sementara)
+            try:
+                hasil = conn.execute("PRAGMA quick_check").fetchall()
+                if hasil != [("ok",)]:
+                    raise ValueError(f"File backup rusak: {hasil[0][0] if hasil else 'tidak ada hasil'}")
+                ada = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                kurang = [tabel for tabel in TABEL_WAJIB if tabel not in ada]
+                if kurang:
+                    raise ValueError(f"Bukan backup database toko, tabel tidak ada: {', '.join(kurang)}")
+                versi = conn.execute("PRAGMA user_version").fetchone()[0]
+                if versi > MIGRASI[-1][0]:
+                    raise ValueError(f"Backup dari versi aplikasi lebih baru (skema versi {versi})")
+                self.create_tables(conn)
+                self.migrate(conn)
+            finally:
+                conn.close()
+            waktu['cek'] = time.perf_counter() - tahap
+            berhasil = True
+            return sementara, waktu
+        except Exception as e:
+            print(f"Restore error: {e}")
+            return None
+        finally:
+            hapus = (sementara + ".src",) if berhasil else (sementara, sementara + ".src")
+            for path in hapus:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def tukar_restore(self, sementara, waktu):
+        """Tahap akhir restore: menukar database aktif dengan hasil siapkan_restore().
+
+        Harus dipanggil dari luar pool reader (di aplikasi: thread Tk). Pool
+        dikosongkan dulu (antrean dibatalkan, query yang sedang berjalan ditunggu)
+        sebelum koneksi ditutup, jadi tidak ada worker yang memakai koneksi lama.
+        Database lama disimpan sebagai <db>.bak dan dikembalikan jika pertukaran gagal.
+        Mengembalikan dict durasi tiap tahap (detik), atau None jika gagal.
+        """
+        tahap = time.perf_counter()
+        try:
+            if threading.current_thread().name.startswith("db-reader"):
+                raise RuntimeError("tukar_restore tidak boleh dipanggil dari thread worker database")
+            if self.db_name == ":memory:":
+                with self._lock:
+                    conn = sqlite3.connect(sementara)
+                    try:
+                        conn.backup(self.conn)
+                    finally:
+                        conn.close()
+            else:
+                self.executor.shutdown(wait=True, cancel_futures=True)
+                with self._lock:
+                    self._tukar_database(sementara)
+            self.katalog.reset()
+            self.kabarkan_stok(None)
+            waktu['tukar'] = time.perf_counter() - tahap
+            waktu['total'] = sum(waktu.values())
+            return waktu
+        except Exception as e:
+            print(f"Restore error: {e}")
+            return None
+        finally:
+            if os.path.exists(sementara):
+                os.remove(sementara)
+
+    def _tukar_database(self, path_baru):
+        """Mengganti file database aktif dengan path_baru, database lama disimpan sebagai .bak.
+
+        WAL/SHM lama ikut dipindah bersama file lamanya supaya tidak terbaca oleh
+        database baru. Jika membuka database baru gagal, database lama dikembalikan.
+        """
+        cadangan = self.db_name + ".bak"
+        for akhiran in ("", "-wal", "-shm"):
+            if os.path.exists(cadangan + akhiran):
+                os.remove(cadangan + akhiran)
+
+        self._tutup_koneksi()
+        dipindah = []
+        try:
+            for akhiran in ("", "-wal", "-shm"):
+                if os.path.exists(self.db_name + akhiran):
+                    os.replace(self.db_name + akhiran, cadangan + akhiran)
+                    dipindah.append(akhiran)
+            os.replace(path_baru, self.db_name)
+            self._buka_koneksi()
+            self.migrate()
+        except Exception:
+            try:
+                self._tutup_koneksi()
+            except Exception:
+                pass
+            for akhiran in ("-wal", "-shm"):
+                if os.path.exists(self.db_name + akhiran):
+                    os.remove(self.db_name + akhiran)
+            for akhiran in dipindah:
+                os.replace(cadangan + akhiran, self.db_name + akhiran)
+            self._buka_koneksi()
+            raise
 
     def close(self):
         """Menutup koneksi database"""
         try:
-            self.conn.close()
+            self._tutup_koneksi()
         except:
             pass
+
+
+class IndeksProduk:
+    """Indeks pencarian produk di memori berdasarkan nama dan kode_produk.
+
+    Kata kunci >= 3 huruf dicari lewat indeks trigram, kata kunci pendek lewat
+    indeks prefix (awal nama, awal kata, awal kode). Hasil diurutkan: kode sama
+    persis, awalan nama/kode, awalan kata, lalu potongan di tengah nama.
+    """
+    def __init__(self):
+        self._teks = {}       # id -> (nama lowercase, kode lowercase)
+        self._trigram = {}    # trigram -> set id
+        self._prefix = {}     # prefix 1-2 huruf -> set id
+        self._cache = {}      # hasil kata kunci pendek, dikosongkan saat ada perubahan
+
+    @staticmethod
+    def _trigram_dari(teks):
+        return {teks[i:i + 3] for i in range(len(teks) - 2)}
+
+    @staticmethod
+    def _prefix_dari(nama, kode):
+        hasil = set()
+        for kata in nama.split() + [nama, kode]:
+            hasil.update(kata[:n] for n in (1, 2) if len(kata) >= n)
+        return hasil
+
+    def _kunci(self, nama, kode):
+        return (self._trigram_dari(nama) | self._trigram_dari(kode),
+                self._prefix_dari(nama, kode))
+
+    def tambah(self, id_produk, nama, kode):
+        """Menambah atau memperbarui satu produk di indeks"""
+        teks = ((nama or "").lower(), (kode or "").lower())
+        if self._teks.get(id_produk) == teks:
+            return
+        self.hapus(id_produk)
+        self._teks[id_produk] = teks
+        trigram, prefix = self._kunci(*teks)
+        for t in trigram:
+            self._trigram.setdefault(t, set()).add(id_produk)
+        for t in prefix:
+            self._prefix.setdefault(t, set()).add(id_produk)
+        self._cache.clear()
+
+    def hapus(self, id_produk):
+        """Menghapus satu produk dari indeks"""
+        teks = self._teks.pop(id_produk, None)
+        if teks is None:
+            return
+        trigram, prefix = self._kunci(*teks)
+        for indeks, kunci in ((self._trigram, trigram), (self._prefix, prefix)):
+            for t in kunci:
+                ids = indeks.get(t)
+                if ids is not None:
+                    ids.discard(id_produk)
+                    if not ids:
+                        del indeks[t]
+        self._cache.clear()
+
+    def _peringkat(self, id_produk, kata):
+        nama, kode = self._teks[id_produk]
+        if kode == kata:
+            return (0, nama)
+        if nama.startswith(kata) or kode.startswith(kata):
+            return (1, nama)
+        if " " + kata in nama:
+            return (2, nama)
+        return (3, nama)
+
+    def cari(self, kata, batas=20):
+        """Mengembalikan daftar id produk paling cocok (maksimal batas)"""
+        kata = kata.strip().lower()
+        if not kata:
+            return []
+        if len(kata) < 3:
+            if kata not in self._cache:
+                kandidat = self._prefix.get(kata, ())
+                self._cache[kata] = heapq.nsmallest(
+                    batas, kandidat, key=lambda i: self._peringkat(i, kata))
+            return self._cache[kata][:batas]
+
+        daftar = [self._trigram.get(t) for t in self._trigram_dari(kata)]
+        if not all(daftar):
+            return []
+        daftar.sort(key=len)
+        kandidat = set(daftar[0]).intersection(*daftar[1:])
+        cocok = [i for i in kandidat if kata in self._teks[i][0] or kata in self._teks[i][1]]
+        return heapq.nsmallest(batas, cocok, key=lambda i: self._peringkat(i, kata))
+
+
+class TabelProduk:
+    """Penyimpanan katalog produk yang ringkas: kolom paralel, bukan satu objek per produk.
+
+    Angka disimpan di array (8 byte per nilai), teks di list; nama kategori dan
+    supplier di-intern sehingga teks yang sama hanya disimpan sekali. Baris
+    Produk (namedtuple) baru dibuat saat diminta lewat baris()/get(). Slot
+    produk yang dihapus dipakai ulang oleh produk baru berikutnya.
+    """
+    __slots__ = ("id", "harga_beli", "harga_jual", "stok", "stok_minimum",
+                 "kode", "nama", "kategori", "supplier",
+                 "slot", "slot_nama", "slot_kode", "_kosong")
+
+    def __init__(self):
+        self.id = array("q")
+        self.harga_beli = array("d")
+        self.harga_jual = array("d")
+        self.stok = array("q")
+        self.stok_minimum = array("q")
+        self.kode = []
+        self.nama = []
+        self.kategori = []
+        self.supplier = []
+        self.slot = {}          # id -> indeks kolom
+        self.slot_nama = {}     # nama_produk -> indeks kolom
+        self.slot_kode = {}     # kode_produk -> indeks kolom, untuk scan barcode
+        self._kosong = []       # indeks bekas produk yang dihapus
+
+    def __len__(self):
+        return len(self.slot)
+
+    def __iter__(self):
+        """Iterasi id produk"""
+        return iter(self.slot)
+
+    def baris(self, i):
+        """Baris Produk dari indeks kolom"""
+        return Produk(self.id[i], self.kode[i], self.nama[i], self.kategori[i], self.supplier[i],
+                      self.harga_beli[i], self.harga_jual[i], self.stok[i], self.stok_minimum[i])
+
+    def get(self, id_produk):
+        """Baris Produk berdasarkan id, atau None jika tidak ada"""
+        i = self.slot.get(id_produk)
+        return None if i is None else self.baris(i)
+
+    def _slot_baru(self):
+        for kolom in (self.id, self.harga_beli, self.harga_jual, self.stok, self.stok_minimum):
+            kolom.append(0)
+        for kolom in (self.kode, self.nama, self.kategori, self.supplier):
+            kolom.append(None)
+        return len(self.id) - 1
+
+    def _lepas_kunci(self, i):
+        for peta, kunci in ((self.slot_nama, self.nama[i]), (self.slot_kode, self.kode[i])):
+            if peta.get(kunci) == i:
+                del peta[kunci]
+
+    def simpan(self, row):
+        """Menambah atau memperbarui satu produk (baris seperti get_all_produk())"""
+        i = self.slot.get(row[0])
+        if i is None:
+            i = self._kosong.pop() if self._kosong else self._slot_baru()
+            self.slot[row[0]] = i
+            self.id[i] = row[0]
+        else:
+            self._lepas_kunci(i)
+        self.kode[i] = row[1]
+        self.nama[i] = row[2]
+        self.kategori[i] = None if row[3] is None else sys.intern(row[3])
+        self.supplier[i] = None if row[4] is None else sys.intern(row[4])
+        self.harga_beli[i] = row[5] or 0
+        self.harga_jual[i] = row[6] or 0
+        self.stok[i] = row[7] or 0
+        self.stok_minimum[i] = row[8] or 0
+        self.slot_nama[row[2]] = i
+        self.slot_kode[row[1]] = i
+
+    def hapus(self, id_produk):
+        """Menghapus satu produk, slotnya dipakai ulang"""
+        i = self.slot.pop(id_produk, None)
+        if i is None:
+            return
+        self._lepas_kunci(i)
+        self.kode[i] = self.nama[i] = self.kategori[i] = self.supplier[i] = None
+        self._kosong.append(i)
+
+
+class DaftarProduk:
+    """Daftar produk urut nama di atas TabelProduk, tanpa menyalin barisnya.
+
+    Baris dibuat saat diakses, jadi stok/harga yang dibaca selalu nilai terbaru
+    di katalog. Produk yang sudah dihapus dilewati.
+    """
+    __slots__ = ("_tabel", "_ids")
+
+    def __init__(self, tabel, ids):
+        self._tabel = tabel
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [row for row in map(self._tabel.get, self._ids[i]) if row is not None]
+        return self._tabel.get(self._ids[i])
+
+    def __iter__(self):
+        for id_produk in self._ids:
+            row = self._tabel.get(id_produk)
+            if row is not None:
+                yield row
+
+    def nama(self):
+        """Nama produk saja (untuk isi combobox)"""
+        slot, nama = self._tabel.slot, self._tabel.nama
+        return [nama[slot[i]] for i in self._ids if i in slot]
+
+
+class ProductCatalog:
+    """Cache katalog produk di memori, dibagi oleh semua form transaksi.
+
+    Cache diperbarui secara inkremental: hanya produk yang versinya berubah
+    (dicatat trigger di tabel perubahan_produk) yang diambil ulang. Data
+    disimpan sekali di TabelProduk; form membaca dari sini, bukan menyalinnya.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.tabel = TabelProduk()
+        self.versi = None       # versi data terakhir yang sudah disinkronkan
+        self.muat_ke = 0        # naik setiap cache dimuat penuh (mis. setelah restore)
+        self._versi_id = {}     # id -> versi saat produk terakhir berubah
+        self._daftar = None     # cache DaftarProduk urut nama (dibuang jika nama/produk berubah)
+        self.indeks = IndeksProduk()
+        self._lock = threading.RLock()
+
+    def sinkron(self):
+        """Mengambil perubahan dari database, mengembalikan set id produk yang berubah"""
+        with self._lock:
+            versi_db = self.db.get_versi_data()
+            if self.versi is None:
+                tabel = TabelProduk()
+                self.indeks = IndeksProduk()
+                for row in self.db.get_all_produk():
+                    tabel.simpan(row)
+                    self.indeks.tambah(row[0], row[2], row[1])
+                self.tabel = tabel
+                self.versi = versi_db
+                self.muat_ke += 1
+                self._versi_id = {}
+                self._daftar = None
+                return set(tabel)
+            if versi_db == self.versi:
+                return set()
+
+            tabel = self.tabel
+            ids = self.db.get_produk_berubah(self.versi)
+            rows = {row[0]: row for row in self.db.get_produk_by_ids(ids)}
+            for id_produk in ids:
+                i = tabel.slot.get(id_produk)
+                nama_lama = None if i is None else tabel.nama[i]
+                row = rows.get(id_produk)
+                if row is not None:
+                    tabel.simpan(row)
+                    self.indeks.tambah(id_produk, row[2], row[1])
+                else:
+                    tabel.hapus(id_produk)  # produk dihapus
+                    self.indeks.hapus(id_produk)
+                # Urutan nama hanya perlu dihitung ulang jika nama berubah/produk baru/dihapus
+                if i is None or row is None or nama_lama != row[2]:
+                    self._daftar = None
+                self._versi_id[id_produk] = versi_db
+            self.versi = versi_db
+            return set(ids)
+
+    def perubahan_sejak(self, versi):
+        """Mengembalikan (versi_baru, set id berubah, penuh) sejak versi milik pemanggil.
+
+        versi adalah nilai versi_baru dari panggilan sebelumnya (None jika belum punya
+        data). penuh=True berarti cache dimuat ulang: semua id dikembalikan dan
+        pemanggil harus membuang data lamanya.
+        """
+        with self._lock:
+            self.sinkron()
+            token = (self.muat_ke, self.versi)
+            if versi is None or versi[0] != self.muat_ke:
+                return token, set(self.tabel), True
+            return token, {i for i, v in self._versi_id.items() if v > versi[1]}, False
+
+    def reset(self):
+        """Membuang cache; dimuat penuh lagi pada sinkron() berikutnya (mis. setelah restore)"""
+        with self._lock:
+            self.versi = None
+
+    def get(self, id_produk):
+        """Baris produk berdasarkan id, atau None jika tidak ada"""
+        with self._lock:
+            return self.tabel.get(id_produk)
+
+    def cari_nama(self, nama):
+        """Baris produk berdasarkan nama_produk (pilihan combobox), atau None"""
+        with self._lock:
+            i = self.tabel.slot_nama.get(nama)
+            return None if i is None else self.tabel.baris(i)
+
+    def cari_kode(self, kode):
+        """Baris produk berdasarkan kode_produk (hasil scan barcode), atau None.
+
+        Dicari di memori dulu; kode yang belum ada di cache (mis. produk baru
+        dari terminal lain) dicari langsung ke database.
+        """
+        with self._lock:
+            i = self.tabel.slot_kode.get(kode)
+            if i is not None:
+                return self.tabel.baris(i)
+        return self.db.get_produk_by_kode(kode)
+
+    def daftar_terbaru(self):
+        """Sinkron lalu mengembalikan daftar produk urut nama"""
+        with self._lock:
+            self.sinkron()
+            return self.daftar()
+
+    def daftar(self):
+        """Semua produk urut nama sebagai DaftarProduk (urutan disimpan sampai ada perubahan)"""
+        with self._lock:
+            if self._daftar is None:
+                tabel = self.tabel
+                ids = sorted(tabel.slot, key=lambda i: tabel.nama[tabel.slot[i]])
+                self._daftar = DaftarProduk(tabel, array("q", ids))
+            return self._daftar
+
+    def cari(self, kata, batas=20):
+        """Mencari produk berdasarkan nama/kode, mengembalikan baris paling cocok"""
+        with self._lock:
+            if not kata.strip():
+                return self.daftar()[:batas]
+            return [self.tabel.get(i) for i in self.indeks.cari(kata, batas)]
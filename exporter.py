@@ -0,0 +1,62 @@
+# exporter.py
+"""Export laporan ke CSV atau XLSX secara streaming.
+
+Baris diambil dari generator (mis. Database.iter_laporan_penjualan) dan langsung
+ditulis ke file, jadi pemakaian memori tetap kecil berapa pun jumlah barisnya.
+XLSX membutuhkan paket openpyxl (opsional); tanpa openpyxl hanya CSV yang tersedia.
+"""
+import csv
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # openpyxl opsional
+    Workbook = None
+
+KOLOM_LAPORAN_PENJUALAN = ["ID", "Tanggal", "Waktu", "Pelanggan", "Kasir", "Total"]
+KOLOM_LAPORAN_STOK = ["Kode", "Nama", "Kategori", "Supplier", "Harga Beli", "Harga Jual", "Stok", "Nilai Stok"]
+
+
+def xlsx_tersedia():
+    return Workbook is not None
+
+
+def tulis_csv(path, header, rows, progress=None, interval=1000):
+    """Menulis rows ke file CSV, mengembalikan jumlah baris"""
+    jumlah = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            jumlah += 1
+            if progress and jumlah % interval == 0:
+                progress(jumlah)
+    return jumlah
+
+
+def tulis_xlsx(path, header, rows, progress=None, interval=1000, judul="Laporan"):
+    """Menulis rows ke file XLSX (mode write-only openpyxl), mengembalikan jumlah baris"""
+    if Workbook is None:
+        raise RuntimeError("Export XLSX membutuhkan paket openpyxl (pip install openpyxl)")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=judul[:31])
+    ws.append(header)
+    jumlah = 0
+    for row in rows:
+        ws.append(list(row))
+        jumlah += 1
+        if progress and jumlah % interval == 0:
+            progress(jumlah)
+    wb.save(path)
+    return jumlah
+
+
+def export_laporan(path, header, rows, progress=None, judul="Laporan"):
+    """Export ke CSV atau XLSX sesuai ekstensi file, mengembalikan jumlah baris"""
+    if path.lower().endswith(".xlsx"):
+        jumlah = tulis_xlsx(path, header, rows, progress, judul=judul)
+    else:
+        jumlah = tulis_csv(path, header, rows, progress)
+    if progress:
+        progress(jumlah)
+    return jumlah
@@ -1,7 +1,25 @@
 # forms.py
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import threading
+import uuid
+from collections import OrderedDict
 from datetime import date, datetime 
+from antrian import database_sibuk
+from database import STOK_MINIMUM_DEFAULT
+from importer import Importer, JENIS_IMPORT
+from exporter import export_laporan, xlsx_tersedia, KOLOM_LAPORAN_PENJUALAN
+from klien import ServerError
+from query import QueryError
+
+# Gagal membaca data: QueryError dari database lokal, ServerError dari server toko
+ERROR_DATA = (QueryError, ServerError)
+
+
+def gagal_muat(window, error):
+    """Menampilkan sebab gagal memuat data awal form lalu menutup form tersebut"""
+    messagebox.showerror("Error", f"Gagal memuat data: {error}", parent=window.master)
+    window.destroy()
 
 # --- Konsep Inheritansi dan Polimorfisme ---
 # Kelas induk untuk semua form Data Master
@@ -11,8 +29,13 @@ class BaseMasterForm(tk.Toplevel):
         self.db = db
         self.title(title)
         self.geometry("800x500")
+        # iid (primary key) -> nilai baris yang sedang tampil; urutan dict = urutan di treeview
+        self._baris = {}
         self.create_widgets()
-        self.populate_treeview()
+        try:
+            self.populate_treeview()
+        except ERROR_DATA as e:
+            gagal_muat(self, e)
 
     def create_widgets(self):
         # Frame untuk input
@@ -54,17 +77,71 @@ class BaseMasterForm(tk.Toplevel):
     def clear_form(self):
         raise NotImplementedError
 
-    def populate_treeview(self):
+    def fetch_rows(self):
+        """Mengambil semua baris dari database (kolom pertama = primary key)"""
         raise NotImplementedError
 
+    def populate_treeview(self):
+        self.sync_treeview(self.fetch_rows())
+
+    def sync_treeview(self, rows):
+        """Menyamakan treeview dengan rows; hanya baris yang ditambah/diubah/dihapus yang disentuh.
+
+        iid setiap baris = primary key, jadi seleksi dan posisi scroll tetap terjaga.
+        """
+        baru = {str(row[0]): tuple(row) for row in rows}
+
+        hapus = [iid for iid in self._baris if iid not in baru]
+        if hapus:
+            self.tree.delete(*hapus)
+
+        # Baris lama yang masih ada harus tetap berurutan sama, kalau tidak dipindahkan
+        lama = [iid for iid in self._baris if iid in baru]
+        tetap = [iid for iid in baru if iid in self._baris]
+        pindah = lama != tetap
+
+        for posisi, iid in enumerate(baru):
+            values = baru[iid]
+            if iid not in self._baris:
+                self.tree.insert('', posisi, iid=iid, values=values)
+                continue
+            if self._baris[iid] != values:
+                self.tree.item(iid, values=values)
+            if pindah:
+                self.tree.move(iid, '', posisi)
+
+        self._baris = baru
+
+    def simpan_baris(self, row):
+        """Menambah/memperbarui satu baris treeview dari baris hasil CRUD database"""
+        iid = str(row[0])
+        values = tuple(row)
+        if iid in self._baris:
+            self.tree.item(iid, values=values)
+        else:
+            self.tree.insert('', 'end', iid=iid, values=values)
+        self._baris[iid] = values
+        self.tree.see(iid)
+
+    def hapus_baris(self, iid):
+        """Menghapus satu baris treeview"""
+        iid = str(iid)
+        if self._baris.pop(iid, None) is not None:
+            self.tree.delete(iid)
+
     # Logika umum untuk CRUD
+    # insert_data/update_data_in_db/delete_data_from_db mengembalikan baris yang terkena
+    # (None jika gagal), jadi cukup baris itu yang diperbarui di treeview
     def add_data(self):
         data = self.get_form_data()
         if not data:
             return
         try:
-            self.insert_data(data)
-            self.populate_treeview()
+            row = self.insert_data(data)
+            if not row:
+                messagebox.showerror("Error", "Gagal menambahkan data!")
+                return
+            self.simpan_baris(row)
             self.clear_form()
             messagebox.showinfo("Sukses", "Data berhasil ditambahkan!")
         except Exception as e:
@@ -80,8 +157,11 @@ class BaseMasterForm(tk.Toplevel):
         if not data:
             return
         try:
-            self.update_data_in_db(item_id, data)
-            self.populate_treeview()
+            row = self.update_data_in_db(item_id, data)
+            if not row:
+                messagebox.showerror("Error", "Gagal mengubah data!")
+                return
+            self.simpan_baris(row)
             self.clear_form()
             messagebox.showinfo("Sukses", "Data berhasil diubah!")
         except Exception as e:
@@ -95,8 +175,10 @@ class BaseMasterForm(tk.Toplevel):
         if messagebox.askyesno("Konfirmasi", "Apakah Anda yakin ingin menghapus data ini?"):
             item_id = self.tree.item(selected_item[0])['values'][0]
             try:
-                self.delete_data_from_db(item_id)
-                self.populate_treeview()
+                if not self.delete_data_from_db(item_id):
+                    messagebox.showerror("Error", "Gagal menghapus data! Data mungkin masih dipakai di transaksi.")
+                    return
+                self.hapus_baris(item_id)
                 self.clear_form()
                 messagebox.showinfo("Sukses", "Data berhasil dihapus!")
             except Exception as e:
@@ -164,20 +246,17 @@ class PelangganForm(BaseMasterForm):
         for entry in self.entries.values():
             entry.delete(0, tk.END)
 
-    def populate_treeview(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for row in self.db.get_all_pelanggan():
-            self.tree.insert('', 'end', values=row)
+    def fetch_rows(self):
+        return self.db.get_all_pelanggan()
 
     def insert_data(self, data):
-        self.db.add_pelanggan(data['nama'], data['alamat'], data['telepon'])
+        return self.db.add_pelanggan(data['nama'], data['alamat'], data['telepon'])
     
     def update_data_in_db(self, item_id, data):
-        self.db.update_pelanggan(item_id, data['nama'], data['alamat'], data['telepon'])
+        return self.db.update_pelanggan(item_id, data['nama'], data['alamat'], data['telepon'])
 
     def delete_data_from_db(self, item_id):
-        self.db.delete_pelanggan(item_id)
+        return self.db.delete_pelanggan(item_id)
 
     def fill_form_from_selection(self, values):
         self.clear_form()
@@ -213,20 +292,17 @@ class KategoriForm(BaseMasterForm):
     def clear_form(self):
         self.entries['nama_kategori'].delete(0, tk.END)
 
-    def populate_treeview(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for row in self.db.get_all_kategori():
-            self.tree.insert('', 'end', values=row)
+    def fetch_rows(self):
+        return self.db.get_all_kategori()
 
     def insert_data(self, data):
-        self.db.add_kategori(data['nama_kategori'])
+        return self.db.add_kategori(data['nama_kategori'])
     
     def update_data_in_db(self, item_id, data):
-        self.db.update_kategori(item_id, data['nama_kategori'])
+        return self.db.update_kategori(item_id, data['nama_kategori'])
 
     def delete_data_from_db(self, item_id):
-        self.db.delete_kategori(item_id)
+        return self.db.delete_kategori(item_id)
 
     def fill_form_from_selection(self, values):
         self.clear_form()
@@ -275,20 +351,17 @@ class SupplierForm(BaseMasterForm):
         for entry in self.entries.values():
             entry.delete(0, tk.END)
 
-    def populate_treeview(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for row in self.db.get_all_supplier():
-            self.tree.insert('', 'end', values=row)
+    def fetch_rows(self):
+        return self.db.get_all_supplier()
 
     def insert_data(self, data):
-        self.db.add_supplier(data['nama'], data['alamat'], data['telepon'])
+        return self.db.add_supplier(data['nama'], data['alamat'], data['telepon'])
     
     def update_data_in_db(self, item_id, data):
-        self.db.update_supplier(item_id, data['nama'], data['alamat'], data['telepon'])
+        return self.db.update_supplier(item_id, data['nama'], data['alamat'], data['telepon'])
 
     def delete_data_from_db(self, item_id):
-        self.db.delete_supplier(item_id)
+        return self.db.delete_supplier(item_id)
 
     def fill_form_from_selection(self, values):
         self.clear_form()
@@ -339,20 +412,17 @@ class KaryawanForm(BaseMasterForm):
         for entry in self.entries.values():
             entry.delete(0, tk.END)
 
-    def populate_treeview(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for row in self.db.get_all_karyawan():
-            self.tree.insert('', 'end', values=row)
+    def fetch_rows(self):
+        return self.db.get_all_karyawan()
 
     def insert_data(self, data):
-        self.db.add_karyawan(data['nama'], data['alamat'], data['telepon'])
+        return self.db.add_karyawan(data['nama'], data['alamat'], data['telepon'])
     
     def update_data_in_db(self, item_id, data):
-        self.db.update_karyawan(item_id, data['nama'], data['alamat'], data['telepon'])
+        return self.db.update_karyawan(item_id, data['nama'], data['alamat'], data['telepon'])
 
     def delete_data_from_db(self, item_id):
-        self.db.delete_karyawan(item_id)
+        return self.db.delete_karyawan(item_id)
 
     def fill_form_from_selection(self, values):
         self.clear_form()
@@ -367,22 +437,9 @@ class KaryawanForm(BaseMasterForm):
 
 class ProdukForm(BaseMasterForm):
     def __init__(self, parent, db):
-        # --- PERBAIKAN: Inisialisasi peta (map) dengan penanganan jika data kosong ---
-        # Ambil data dari database
-        all_kategori = db.get_all_kategori()
-        all_supplier = db.get_all_supplier()
-
-        # Buat peta (map) hanya jika data ada, jika tidak, gunakan dictionary kosong
-        if all_kategori:
-            self.kategori_map = {str(k[1]): k[0] for k in all_kategori}
-        else:
-            self.kategori_map = {}
-            
-        if all_supplier:
-            self.supplier_map = {str(s[1]): s[0] for s in all_supplier}
-        else:
-            self.supplier_map = {}
-        
+        # Peta kategori/supplier diisi populate_treeview() (bersama daftar produk)
+        self.kategori_map = {}
+        self.supplier_map = {}
         super().__init__(parent, db, "Master Produk")
 
     def create_input_fields(self):
@@ -407,9 +464,12 @@ class ProdukForm(BaseMasterForm):
         ttk.Label(self.input_frame, text="Stok:").grid(row=6, column=0, padx=5, pady=5, sticky="w")
         self.entries['stok'] = ttk.Entry(self.input_frame, width=40)
         self.entries['stok'].grid(row=6, column=1, padx=5, pady=5)
+        ttk.Label(self.input_frame, text="Stok Minimum:").grid(row=7, column=0, padx=5, pady=5, sticky="w")
+        self.entries['stok_minimum'] = ttk.Entry(self.input_frame, width=40)
+        self.entries['stok_minimum'].grid(row=7, column=1, padx=5, pady=5)
 
     def create_treeview(self):
-        columns = ('id', 'kode', 'nama', 'kategori', 'supplier','harga_beli', 'harga_jual', 'stok')
+        columns = ('id', 'kode', 'nama', 'kategori', 'supplier','harga_beli', 'harga_jual', 'stok', 'stok_minimum')
         tree = ttk.Treeview(self.tree_frame, columns=columns, show='headings')
         for col in columns:
             tree.heading(col, text=col.replace('_', ' ').title())
@@ -428,7 +488,8 @@ class ProdukForm(BaseMasterForm):
                 'id_supplier': self.supplier_map.get(self.entries['supplier'].get()),
                 'harga_beli': float(self.entries['harga_beli'].get() or 0),
                 'harga_jual': float(self.entries['harga_jual'].get() or 0),
-                'stok': int(self.entries['stok'].get() or 0)
+                'stok': int(self.entries['stok'].get() or 0),
+                'stok_minimum': int(self.entries['stok_minimum'].get() or STOK_MINIMUM_DEFAULT)
             }
         except ValueError:
             messagebox.showerror("Error", "Harga dan stok harus berupa angka!")
@@ -454,21 +515,19 @@ class ProdukForm(BaseMasterForm):
         self.entries['supplier']['values'] = list(self.supplier_map.keys())
 
         # --- REFRESH TREEVIEW ---
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-
-        for row in self.db.get_all_produk():
-            self.tree.insert('', 'end', values=row)
+        super().populate_treeview()
 
+    def fetch_rows(self):
+        return self.db.get_all_produk()
 
     def insert_data(self, data):
-        self.db.add_produk(data['kode'], data['nama'], data['id_kategori'], data['id_supplier'], data['harga_beli'], data['harga_jual'], data['stok'])
+        return self.db.add_produk(data['kode'], data['nama'], data['id_kategori'], data['id_supplier'], data['harga_beli'], data['harga_jual'], data['stok'], data['stok_minimum'])
     
     def update_data_in_db(self, item_id, data):
-        self.db.update_produk(item_id, data['kode'], data['nama'], data['id_kategori'], data['id_supplier'], data['harga_beli'], data['harga_jual'], data['stok'])
+        return self.db.update_produk(item_id, data['kode'], data['nama'], data['id_kategori'], data['id_supplier'], data['harga_beli'], data['harga_jual'], data['stok'], data['stok_minimum'])
 
     def delete_data_from_db(self, item_id):
-        self.db.delete_produk(item_id)
+        return self.db.delete_produk(item_id)
 
     def fill_form_from_selection(self, values):
         self.clear_form()
@@ -479,23 +538,173 @@ class ProdukForm(BaseMasterForm):
         self.entries['harga_beli'].insert(0, values[5])   # ⬅ TAMBAHAN
         self.entries['harga_jual'].insert(0, values[6])   # ⬅ INDEX BERGESER
         self.entries['stok'].insert(0, values[7])
+        self.entries['stok_minimum'].insert(0, values[8])
+
+# --- Model keranjang transaksi ---
+class Cart:
+    """Keranjang transaksi (penjualan/pembelian/retur) dengan satu baris per id_produk.
+
+    Tambah/ubah/hapus item O(1) lewat dict, total dihitung berjalan, dan setiap
+    item punya iid Treeview tetap (str(id_produk)).
+    """
+    def __init__(self):
+        self._items = {}    # id_produk -> {'id_produk', 'nama', 'qty', 'harga'} (urut saat ditambah)
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, id_produk):
+        return id_produk in self._items
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    @staticmethod
+    def iid(id_produk):
+        """iid baris Treeview untuk produk"""
+        return str(id_produk)
+
+    @staticmethod
+    def id_dari_iid(iid):
+        """id_produk dari iid baris Treeview"""
+        return int(iid)
+
+    def get(self, id_produk):
+        return self._items.get(id_produk)
+
+    def qty(self, id_produk):
+        item = self._items.get(id_produk)
+        return item['qty'] if item else 0
+
+    def add(self, id_produk, nama, qty, harga):
+        """Menambah item atau menambah qty item yang sudah ada; mengembalikan item"""
+        item = self._items.get(id_produk)
+        if item is None:
+            item = self._items[id_produk] = {'id_produk': id_produk, 'nama': nama, 'qty': 0, 'harga': harga}
+        self.total -= item['qty'] * item['harga']
+        item['qty'] += qty
+        item['harga'] = harga
+        self.total += item['qty'] * item['harga']
+        return item
+
+    def set_qty(self, id_produk, qty):
+        """Mengubah qty item (qty <= 0 menghapus item); mengembalikan item atau None"""
+        if qty <= 0:
+            self.remove(id_produk)
+            return None
+        item = self._items[id_produk]
+        self.total += (qty - item['qty']) * item['harga']
+        item['qty'] = qty
+        return item
+
+    def remove(self, id_produk):
+        """Menghapus item, mengembalikan item yang dihapus atau None"""
+        item = self._items.pop(id_produk, None)
+        if item is not None:
+            self.total -= item['qty'] * item['harga']
+        if not self._items:
+            self.total = 0.0  # buang sisa pembulatan float
+        return item
+
+    def clear(self):
+        self._items.clear()
+        self.total = 0.0
+
+    def items(self):
+        """Daftar item untuk Database.checkout*()"""
+        return list(self._items.values())
+
+
+def simpan_baris_keranjang(tree, item):
+    """Menambah/memperbarui baris keranjang (kolom id_produk, nama, qty, harga, subtotal)"""
+    iid = Cart.iid(item['id_produk'])
+    values = (item['id_produk'], item['nama'], item['qty'], item['harga'], item['qty'] * item['harga'])
+    if tree.exists(iid):
+        tree.item(iid, values=values)
+    else:
+        tree.insert('', 'end', iid=iid, values=values)
+
+
+class PendengarStok:
+    """Meneruskan kabar perubahan stok dari Database (Database.pantau_stok) ke thread Tk.
+
+    Kabar bisa datang dari thread mana pun; id yang berubah dikumpulkan lalu
+    callback(ids) dipanggil lewat widget.after() setiap `interval` ms jika ada
+    perubahan (ids=None berarti muat ulang semua). Berhenti sendiri saat widget ditutup.
+    """
+    def __init__(self, widget, db, callback, interval=250):
+        self.widget = widget
+        self.db = db
+        self.callback = callback
+        self.interval = interval
+        self._ids = set()
+        self._semua = False
+        self._lock = threading.Lock()
+        db.pantau_stok(self.terima)
+        self.widget.after(self.interval, self._cek)
+
+    def terima(self, ids):
+        with self._lock:
+            if ids is None:
+                self._semua = True
+            else:
+                self._ids |= ids
+
+    def _cek(self):
+        try:
+            if not self.widget.winfo_exists():
+                raise tk.TclError
+        except tk.TclError:
+            self.berhenti()
+            return
+        with self._lock:
+            ids, semua = self._ids, self._semua
+            self._ids, self._semua = set(), False
+        if semua or ids:
+            try:
+                self.callback(None if semua else ids)
+            except Exception as e:
+                print(f"Error memperbarui stok: {e}")
+        self.widget.after(self.interval, self._cek)
+
+    def berhenti(self):
+        self.db.lepas_pantau_stok(self.terima)
+
+
+# Reservasi stok yang gagal (mis. database terkunci) dicoba lagi dengan jeda yang
+# berlipat, paling lama RESERVASI_JEDA_MAKS_MS, sebanyak RESERVASI_PERCOBAAN kali
+RESERVASI_JEDA_MS = 250
+RESERVASI_JEDA_MAKS_MS = 4000
+RESERVASI_PERCOBAAN = 5
+
+# Batas detik checkout menunggu database yang sedang dipakai writer lain sebelum
+# penjualannya dicatat ke antrian offline (hanya jika form punya antrian)
+CHECKOUT_TUNGGU = 0.5
+
 
 class PenjualanForm(tk.Toplevel):
-    def __init__(self, parent, db, current_user):
+    def __init__(self, parent, db, current_user, antrian=None):
         super().__init__(parent)
         self.db = db
         self.current_user = current_user
+        # AntrianCheckout (antrian.py): jika ada, penjualan disimpan lewat antrian offline
+        self.antrian = antrian
+        self._after_antrian = None
 
         self.title("Transaksi Penjualan")
         self.geometry("900x600")
-        
-        # Mapping pelanggan: "ID - Nama" -> ID
-        self.pelanggan_map = {f"{p[0]} - {p[1]}": p[0] for p in self.db.get_all_pelanggan()}
- 
-        self.transaksi_items = []
-        self.produk_map = {}
+
+        self.keranjang = Cart()
         self.produk_data = []
         self.selected_product_id = None
+        self._versi_katalog = None   # versi katalog yang sudah tampil di form
+        self._daftar_cb = None       # DaftarProduk yang namanya sedang terisi di combobox
+        # Penanda keranjang ini di tabel reservasi_stok (dibagi semua terminal)
+        self.token_keranjang = uuid.uuid4().hex
+        self._pesanan_jalan = {}      # id produk -> (token, qty) reservasi yang sedang dikirim
+        self._percobaan_pesanan = {}  # id produk -> jumlah percobaan ulang reservasi
+        self._token_antrian = set()   # token keranjang yang penjualannya masuk antrian offline
         
         style = ttk.Style(self)
         style.theme_use("default")   # paksa theme netral
@@ -513,9 +722,30 @@ class PenjualanForm(tk.Toplevel):
             foreground=[("selected", "black")]
         )
 
-        self.create_widgets()
-        self.refresh_produk_map()
+        try:
+            # Mapping pelanggan: "ID - Nama" -> ID
+            self.pelanggan_map = {f"{p[0]} - {p[1]}": p[0] for p in self.db.get_all_pelanggan()}
+            self.create_widgets()
+            self.refresh_produk_map()  # memuat katalog produk pertama kali
+        except ERROR_DATA as e:
+            gagal_muat(self, e)
+            return
         self.create_stok_window()
+
+        # Stok yang diubah form/terminal lain di proses ini langsung tampil
+        PendengarStok(self, db, lambda ids: (self.refresh_produk_map(), self.perbarui_status_antrian()))
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+        self.perbarui_status_antrian()
+
+    def destroy(self):
+        # Stok yang dipesan keranjang ini dikembalikan untuk terminal lain, di thread worker:
+        # database sibuk atau server toko yang tidak terjangkau tidak boleh menahan jendela.
+        # Jika gagal, reservasinya tetap kedaluwarsa setelah RESERVASI_TTL.
+        try:
+            self.db.submit(self.db.lepas_reservasi, self.token_keranjang)
+        except Exception as e:  # mis. executor sudah ditutup saat aplikasi keluar
+            print(f"Error melepas reservasi: {e}")
+        super().destroy()
         
     def create_stok_window(self):
         """Membuat jendela kecil untuk menampilkan stok"""
@@ -541,33 +771,74 @@ class PenjualanForm(tk.Toplevel):
         
         ttk.Button(stok_frame, text="Tutup", command=self.stok_window.withdraw).pack(pady=10)
 
-    def refresh_produk_map(self):
-        all_produk = self.db.get_all_produk()
-        self.produk_data = all_produk  # Simpan data lengkap untuk referensi
-
-        # Key = nama produk
-        self.produk_map = {
-            row[2]: {       # row[2] = nama_produk
-                'id': row[0],
-                'nama': row[2],
-                'harga': row[6],  # harga_jual
-                'stok': row[7]
-            }
-            for row in all_produk
-        }
+    def refresh_produk_map(self, paksa=()):
+        """Sinkron dengan katalog bersama dan memperbarui tampilan produk yang berubah.
+
+        Data produk tidak disalin ke form; form membaca langsung dari db.katalog.
+        paksa: id produk tambahan yang barisnya harus digambar ulang.
+        """
+        katalog = self.db.katalog
+        self._versi_katalog, berubah, penuh = katalog.perubahan_sejak(self._versi_katalog)
+        berubah |= set(paksa)
+        self.produk_data = katalog.daftar()  # DaftarProduk urut nama, bukan salinan
+
+        if not berubah and not penuh:
+            return
+
+        if hasattr(self, 'produk_cb'):
+            self.isi_combobox()
 
-        # Combobox menampilkan nama produk saja
-        self.produk_cb['values'] = [row[2] for row in all_produk] if hasattr(self, 'produk_cb') else []
-        
         # Update treeview stok jika sudah dibuat
         if hasattr(self, 'stok_tree'):
-            self.update_stok_treeview()
+            self.update_stok_treeview(None if penuh else berubah)
+
+    def isi_combobox(self):
+        """Mengisi combobox dengan semua nama produk, hanya jika daftar nama berubah.
+
+        Perubahan stok tidak mengganti DaftarProduk katalog, jadi penjualan di
+        terminal lain tidak mengirim ulang seluruh nama ke Tcl. Hasil pencarian
+        yang sedang tampil (teks combobox tidak kosong) tidak ditimpa.
+        """
+        if self.produk_cb.get():
+            return
+        daftar = self.db.katalog.daftar()
+        if daftar is not self._daftar_cb:
+            self.produk_cb['values'] = daftar.nama()
+            self._daftar_cb = daftar
+
+    def info_produk(self, nama):
+        """Produk untuk form transaksi berdasarkan nama, atau None jika tidak ada.
+
+        'stok' adalah stok tampilan: stok di katalog dikurangi isi keranjang.
+        """
+        row = self.db.katalog.cari_nama(nama)
+        return self.info_baris(row) if row is not None else None
+
+    def info_baris(self, row):
+        """Seperti info_produk(), tetapi dari baris katalog (nama produk tidak unik)"""
+        return {
+            'id': row.id,
+            'nama': row.nama_produk,
+            'harga': row.harga_jual,
+            'stok': row.stok - self.keranjang.qty(row.id),
+            'stok_minimum': row.stok_minimum
+        }
+
+    def update_stok_treeview(self, berubah=None):
+        """Update treeview stok; jika berubah diisi, hanya baris produk tersebut yang diperbarui"""
+        if berubah is not None:
+            katalog = self.db.katalog
+            ada = [katalog.get(id_produk) for id_produk in berubah]
+            # Produk baru/dihapus mengubah urutan, jadi bangun ulang seluruh daftar
+            if all(row is not None and self.stok_tree.exists(str(row.id)) for row in ada):
+                for row in ada:
+                    tags = ('stok_rendah',) if row.stok <= row.stok_minimum else ()
+                    self.stok_tree.item(str(row.id), values=(row.kode_produk, row.nama_produk,
+                                                             row.nama_kategori, row.stok), tags=tags)
+                return
 
-    def update_stok_treeview(self):
-        """Update treeview untuk menampilkan stok produk"""
         # Hapus data lama
-        for item in self.stok_tree.get_children():
-            self.stok_tree.delete(item)
+        self.stok_tree.delete(*self.stok_tree.get_children())
         
         # Tambah data baru
         for row in self.produk_data:
@@ -577,10 +848,10 @@ class PenjualanForm(tk.Toplevel):
             kategori = row[3]
             stok = row[7]
             
-            # Tentukan warna teks berdasarkan stok
-            tags = ('stok_rendah',) if stok <= 5 else ()
+            # Tentukan warna teks berdasarkan titik pemesanan ulang produk
+            tags = ('stok_rendah',) if stok <= row[8] else ()
             
-            self.stok_tree.insert('', 'end', values=(kode, nama, kategori, stok), tags=tags)
+            self.stok_tree.insert('', 'end', iid=str(produk_id), values=(kode, nama, kategori, stok), tags=tags)
 
     def create_widgets(self):
         # Frame utama dengan 2 kolom
@@ -614,13 +885,28 @@ class PenjualanForm(tk.Toplevel):
         self.pelanggan_cb.grid(row=1, column=1, padx=5, pady=5, columnspan=3, sticky="ew")
         self.pelanggan_cb.set("1 - Umum" if "1 - Umum" in self.pelanggan_map else list(self.pelanggan_map.keys())[0] if self.pelanggan_map else "")
 
+        # Scan barcode: kode langsung masuk keranjang tanpa dialog
+        scan_frame = ttk.LabelFrame(left_frame, text="Scan Barcode")
+        scan_frame.pack(pady=(10, 0), padx=10, fill="x")
+
+        ttk.Label(scan_frame, text="Kode:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.scan_entry = ttk.Entry(scan_frame, width=30)
+        self.scan_entry.grid(row=0, column=1, padx=5, pady=5)
+        self.scan_entry.bind("<Return>", self.on_scan)
+        self.scan_entry.bind("<KP_Enter>", self.on_scan)
+        self.scan_entry.focus_set()
+
+        self.scan_status_label = ttk.Label(scan_frame, text="Siap scan", foreground="blue")
+        self.scan_status_label.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+
         # Input Item
         item_frame = ttk.LabelFrame(left_frame, text="Tambah Item")
         item_frame.pack(pady=10, padx=10, fill="x")
 
         # Baris 1: Produk dan tombol lihat stok
         ttk.Label(item_frame, text="Produk:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        self.produk_cb = ttk.Combobox(item_frame, values=[], width=30)
+        # Daftar lengkap dikembalikan saat dropdown dibuka dengan teks kosong
+        self.produk_cb = ttk.Combobox(item_frame, values=[], width=30, postcommand=self.isi_combobox)
         self.produk_cb.grid(row=0, column=1, padx=5, pady=5)
         self.produk_cb.bind("<<ComboboxSelected>>", self.on_produk_select)
         self.produk_cb.bind("<KeyRelease>", self.on_produk_search)
@@ -687,6 +973,10 @@ class PenjualanForm(tk.Toplevel):
         self.total_label = ttk.Label(bottom_frame, text="Total: Rp 0", 
                                     font=("Arial", 14, "bold"), foreground="green")
         self.total_label.pack(side="left", padx=10)
+
+        # Jumlah penjualan di antrian offline yang belum masuk database
+        self.antrian_label = ttk.Label(bottom_frame, text="", foreground="gray")
+        self.antrian_label.pack(side="left", padx=10)
         
         action_frame = ttk.Frame(bottom_frame)
         action_frame.pack(side="right")
@@ -731,17 +1021,19 @@ class PenjualanForm(tk.Toplevel):
         self.update_stok_treeview()
         
     def on_produk_search(self, event):
-        """Filter produk berdasarkan input pencarian"""
-        search_term = self.produk_cb.get().lower()
-        filtered_products = [p[2] for p in self.produk_data if search_term in p[2].lower()]
-        self.produk_cb['values'] = filtered_products
+        """Filter produk berdasarkan input pencarian (nama atau kode) lewat indeks katalog"""
+        if not self.produk_cb.get():
+            self.isi_combobox()
+            return
+        hasil = self.db.katalog.cari(self.produk_cb.get())
+        self.produk_cb['values'] = [p[2] for p in hasil]
+        self._daftar_cb = None  # combobox berisi hasil pencarian, bukan daftar lengkap
     
     def on_produk_select(self, event):
-        selected_nama = self.produk_cb.get()
-        if not selected_nama or selected_nama not in self.produk_map:
+        produk = self.info_produk(self.produk_cb.get())
+        if produk is None:
             return
 
-        produk = self.produk_map[selected_nama]
         self.selected_product_id = produk['id']
         
         harga = produk['harga']
@@ -753,12 +1045,7 @@ class PenjualanForm(tk.Toplevel):
         self.stok_info_label.config(text=f"Stok tersedia: {stok}")
         
         # Update warna info stok
-        if stok <= 5:
-            self.stok_info_label.config(foreground="red")
-        elif stok <= 10:
-            self.stok_info_label.config(foreground="orange")
-        else:
-            self.stok_info_label.config(foreground="blue")
+        self.stok_info_label.config(foreground=self.warna_stok(stok, produk['stok_minimum']))
         
         # Hitung subtotal awal
         self.calculate_subtotal()
@@ -774,12 +1061,17 @@ class PenjualanForm(tk.Toplevel):
             self.harga_value_label.config(text=f"Rp {produk_info['harga']:,.2f}")
             
             # Tentukan warna berdasarkan stok
-            if produk_info['stok'] <= 5:
-                self.stok_value_label.config(foreground="red")
-            elif produk_info['stok'] <= 10:
-                self.stok_value_label.config(foreground="orange")
-            else:
-                self.stok_value_label.config(foreground="blue")
+            self.stok_value_label.config(
+                foreground=self.warna_stok(produk_info['stok'], produk_info['stok_minimum']))
+
+    @staticmethod
+    def warna_stok(stok, stok_minimum):
+        """Warna info stok: merah <= stok minimum produk, oranye <= 2x stok minimum"""
+        if stok <= stok_minimum:
+            return "red"
+        if stok <= 2 * stok_minimum:
+            return "orange"
+        return "blue"
     
     def show_stok_info(self):
         """Tampilkan jendela info stok"""
@@ -802,125 +1094,193 @@ class PenjualanForm(tk.Toplevel):
     def add_to_cart(self):
         produk_nama = self.produk_cb.get()
         qty_str = self.qty_entry.get()
-        harga_str = self.harga_entry.get()
         
         if not all([produk_nama, qty_str]):
             messagebox.showwarning("Peringatan", "Lengkapi data item!")
             return
 
-        if produk_nama not in self.produk_map:
+        produk = self.info_produk(produk_nama)
+        if produk is None:
             messagebox.showwarning("Peringatan", "Produk tidak valid!")
             return
 
         try:
             qty = int(qty_str)
-            produk = self.produk_map[produk_nama]
-            id_produk = produk['id']
-            harga = produk['harga']
-            stok = produk['stok']
+            stok = produk['stok']  # stok tampilan, sudah dikurangi isi keranjang
 
             # VALIDASI STOK: Periksa apakah stok mencukupi
             if qty <= 0:
                 messagebox.showwarning("Peringatan", "Jumlah harus lebih dari 0!")
                 return
             
+            if produk['id'] in self.keranjang:
+                # Tanyakan apakah ingin menambah jumlah item yang sudah ada
+                if not messagebox.askyesno(
+                    "Produk Sudah Ada",
+                    f"Produk '{produk_nama}' sudah ada di keranjang.\n"
+                    f"Apakah ingin menambah jumlahnya?"
+                ):
+                    return
+
             if qty > stok:
                 messagebox.showwarning(
                     "Stok Tidak Cukup", 
                     f"Stok produk '{produk_nama}' tidak mencukupi!\n"
                     f"Stok tersedia: {stok}\n"
+                    f"Jumlah di keranjang: {self.keranjang.qty(produk['id'])}\n"
                     f"Jumlah diminta: {qty}"
                 )
                 return
 
-            # Cek apakah produk sudah ada di keranjang
-            item_found = None
-            for item in self.transaksi_items:
-                if item['id_produk'] == id_produk:
-                    item_found = item
-                    break
-            
-            if item_found:
-                # Tanyakan apakah ingin menggabungkan atau membuat baru
-                response = messagebox.askyesno(
-                    "Produk Sudah Ada",
-                    f"Produk '{produk_nama}' sudah ada di keranjang.\n"
-                    f"Apakah ingin menambah jumlahnya?"
-                )
-                if response:
-                    # Validasi stok untuk penambahan
-                    new_total_qty = item_found['qty'] + qty
-                    if new_total_qty > stok:
-                        messagebox.showwarning(
-                            "Stok Tidak Cukup",
-                            f"Stok tidak mencukupi untuk penambahan!\n"
-                            f"Stok tersedia: {stok}\n"
-                            f"Jumlah di keranjang: {item_found['qty']}\n"
-                            f"Jumlah tambahan: {qty}\n"
-                            f"Total menjadi: {new_total_qty}"
-                        )
-                        return
-                    
-                    # Update jumlah di keranjang
-                    item_found['qty'] = new_total_qty
-                    
-                    # Update treeview
-                    for child in self.tree.get_children():
-                        values = self.tree.item(child)['values']
-                        if values[1] == produk_nama:
-                            new_subtotal = new_total_qty * harga
-                            self.tree.item(child, values=(
-                                values[0], values[1], new_total_qty, 
-                                f"Rp {harga:,.2f}", f"Rp {new_subtotal:,.2f}"
-                            ))
-                            break
-                    
-                    self.update_total()
-                    self.clear_item_form()
-                    return
-                # Jika tidak ingin menggabungkan, lanjutkan menambah item baru
-
-            # Jika produk belum ada atau tidak ingin digabungkan
-            subtotal = qty * harga
-            
-            # Nomor urut
-            item_no = len(self.transaksi_items) + 1
-            
-            # Tambah ke treeview
-            self.tree.insert('', 'end', values=(
-                item_no, 
-                produk_nama, 
-                qty, 
-                f"Rp {harga:,.2f}", 
-                f"Rp {subtotal:,.2f}"
-            ))
-            
-            # Tambah ke list transaksi
-            self.transaksi_items.append({
-                'id_produk': id_produk,
-                'qty': qty,
-                'harga': harga
-            })
-
-            self.update_total()
-            
-            # Kurangi stok di tampilan (hanya tampilan)
-            produk['stok'] -= qty
-            self.stok_info_label.config(text=f"Stok tersedia: {produk['stok']}")
-            
-            # Update harga entry jika kosong
-            if not harga_str:
-                self.harga_entry.delete(0, tk.END)
-                self.harga_entry.insert(0, str(harga))
-
-            self.produk_cb.set('')
-            self.qty_entry.delete(0, tk.END)
-            self.qty_entry.insert(0, "1")
-            self.harga_entry.delete(0, tk.END)
+            self.tambah_ke_keranjang(produk, qty)
+            # Pesan stok di database tanpa menunggu; kasir lain mungkin sudah memesan/menjual
+            # stok yang sama, keranjang disesuaikan saat hasilnya datang
+            self.pesan_stok(produk['id'])
+            self.clear_item_form()
 
         except ValueError:
             messagebox.showerror("Error", "Qty harus berupa angka!")
     
+    def on_scan(self, event=None):
+        """Menambah produk hasil scan barcode ke keranjang (qty 1, digabung jika sudah ada).
+
+        Tidak memakai messagebox supaya input scanner yang cepat tidak tertahan dialog;
+        hasil scan ditampilkan di label status.
+        """
+        kode = self.scan_entry.get().strip()
+        self.scan_entry.delete(0, tk.END)
+        if not kode:
+            return "break"
+
+        row = self.db.katalog.cari_kode(kode)
+        if row is not None and self.db.katalog.get(row.id) is None:
+            self.refresh_produk_map()  # produk baru yang belum ada di katalog
+        # Keranjang diisi dari baris hasil scan (berdasarkan id), bukan dicari ulang
+        # lewat nama: dua produk bisa bernama sama
+        produk = self.info_baris(row) if row is not None else None
+        if produk is None:
+            self.bell()
+            self.scan_status_label.config(text=f"Kode {kode} tidak ditemukan", foreground="red")
+            return "break"
+
+        if produk['stok'] < 1:
+            self.bell()
+            self.scan_status_label.config(text=f"Stok {produk['nama']} habis", foreground="red")
+            return "break"
+
+        qty = self.tambah_ke_keranjang(produk, 1)
+        self.pesan_stok(produk['id'])
+        self.scan_status_label.config(text=f"{produk['nama']} x{qty}", foreground="green")
+        return "break"
+
+    def pesan_stok(self, id_produk):
+        """Menyamakan reservasi stok produk di database dengan isi keranjang, di thread worker.
+
+        Reservasi butuh transaksi tulis yang bisa menunggu writer lain (laporan,
+        import, terminal lain), jadi tidak dijalankan di thread Tk. Token dan qty
+        dibaca di thread Tk saat dikirim. Per produk hanya satu reservasi yang
+        berjalan; perubahan keranjang selama itu dikirim setelah reservasi tersebut
+        selesai (pesanan_selesai). qty 0 melepas reservasinya.
+        """
+        if id_produk in self._pesanan_jalan:
+            return
+        token = self.token_keranjang
+        qty = self.keranjang.qty(id_produk)
+        self._pesanan_jalan[id_produk] = (token, qty)
+
+        def pesan():
+            if self.db.reservasi_stok(token, id_produk, qty):
+                return None
+            return self.db.get_stok_tersedia(id_produk, token)
+
+        self.db.submit(pesan, widget=self,
+                       callback=lambda tersedia: self.pesanan_selesai(id_produk, tersedia),
+                       errback=lambda e: self.pesanan_gagal(id_produk, e))
+
+    def pesanan_selesai(self, id_produk, tersedia):
+        """Hasil pesan_stok() di thread Tk; tersedia None berarti reservasi berhasil.
+
+        Jika ditolak, qty keranjang dikurangi ke stok yang masih tersedia. Reservasi
+        dikirim lagi hanya jika isi keranjang berbeda dari qty yang tadi dikirim.
+        """
+        token, qty = self._pesanan_jalan.pop(id_produk)
+        if token != self.token_keranjang:
+            # Keranjang sudah disimpan/dikosongkan selama reservasi berjalan; reservasi
+            # penjualan di antrian tetap dipegang sampai penjualannya masuk database
+            if tersedia is None and qty > 0 and token not in self._token_antrian:
+                self.db.submit(self.db.lepas_reservasi, token, id_produk)
+            if id_produk in self.keranjang:
+                self.pesan_stok(id_produk)
+            return
+
+        item = self.keranjang.get(id_produk)
+        if tersedia is None:
+            self._percobaan_pesanan.pop(id_produk, None)
+        elif item is not None:
+            tersedia = max(tersedia, 0)
+            if item['qty'] > tersedia:
+                nama = item['nama']
+                iid = Cart.iid(id_produk)
+                awal = self.tree.index(iid)
+                if self.keranjang.set_qty(id_produk, tersedia) is None:
+                    self.tree.delete(iid)
+                    self.renumber_items(awal)
+                else:
+                    self.tree.item(iid, values=(awal + 1, *self.nilai_baris(item)))
+                self.update_total()
+                self.bell()
+                self.scan_status_label.config(
+                    text=f"Stok {nama} sudah dipesan/terjual di kasir lain, sisa {tersedia}",
+                    foreground="red")
+                self.refresh_produk_map(paksa=(id_produk,))
+            elif item['qty'] == qty:
+                # Ditolak padahal sekarang cukup: stok baru dilepas kasir lain di antara
+                # kedua query, jadi dicoba lagi setelah jeda
+                self.ulangi_pesanan(id_produk)
+                return
+
+        if self.keranjang.qty(id_produk) != qty:
+            self.pesan_stok(id_produk)
+
+    def pesanan_gagal(self, id_produk, error):
+        """pesan_stok() gagal (mis. database terkunci): dicoba lagi setelah jeda"""
+        self._pesanan_jalan.pop(id_produk, None)
+        print(f"Error reservasi stok: {error}")
+        self.ulangi_pesanan(id_produk)
+
+    def ulangi_pesanan(self, id_produk):
+        """Menjadwalkan pesan_stok() lagi dengan jeda berlipat, paling banyak RESERVASI_PERCOBAAN kali.
+
+        Setelah itu dibiarkan: checkout tetap hanya memakai stok yang tidak dipesan
+        keranjang lain (stok.kurangi_tersedia), jadi stok tidak bisa terjual dua kali.
+        """
+        percobaan = self._percobaan_pesanan.get(id_produk, 0) + 1
+        if percobaan > RESERVASI_PERCOBAAN:
+            self._percobaan_pesanan.pop(id_produk, None)
+            return
+        self._percobaan_pesanan[id_produk] = percobaan
+        jeda = min(RESERVASI_JEDA_MS * 2 ** (percobaan - 1), RESERVASI_JEDA_MAKS_MS)
+        self.after(jeda, lambda: self.winfo_exists() and self.pesan_stok(id_produk))
+
+    def tambah_ke_keranjang(self, produk, qty):
+        """Menambah qty produk ke keranjang, mengembalikan jumlah produk itu di keranjang"""
+        baru = produk['id'] not in self.keranjang
+        item = self.keranjang.add(produk['id'], produk['nama'], qty, produk['harga'])
+        iid = Cart.iid(produk['id'])
+        if baru:
+            self.tree.insert('', 'end', iid=iid, values=(len(self.keranjang), *self.nilai_baris(item)))
+        else:
+            self.tree.item(iid, values=(self.tree.index(iid) + 1, *self.nilai_baris(item)))
+
+        self.update_total()
+        return item['qty']
+
+    @staticmethod
+    def nilai_baris(item):
+        """Kolom treeview keranjang selain nomor urut"""
+        return (item['nama'], item['qty'], f"Rp {item['harga']:,.2f}",
+                f"Rp {item['qty'] * item['harga']:,.2f}")
+
     def remove_selected_item(self):
         """Menghapus item terpilih dari keranjang"""
         selected_items = self.tree.selection()
@@ -928,47 +1288,33 @@ class PenjualanForm(tk.Toplevel):
             messagebox.showwarning("Peringatan", "Pilih item yang akan dihapus!")
             return
         
-        for item in selected_items:
-            values = self.tree.item(item)['values']
-            produk_nama = values[1]
-            qty = int(values[2])
+        awal = min(self.tree.index(iid) for iid in selected_items)
+        for iid in selected_items:
+            item = self.keranjang.remove(Cart.id_dari_iid(iid))
+            self.tree.delete(iid)
+            if item is None:
+                continue
+            self.pesan_stok(item['id_produk'])  # qty 0: reservasinya dilepas
             
-            # Hapus dari treeview
-            self.tree.delete(item)
-            
-            # Hapus dari list transaksi
-            # PERBAIKAN: Syntax list comprehension yang benar
-            self.transaksi_items = [
-                i for i in self.transaksi_items 
-                if not (
-                    produk_nama in self.produk_map and 
-                    i['id_produk'] == self.produk_map[produk_nama]['id']
-                )
-            ]
-            
-            # Kembalikan stok di tampilan
-            if produk_nama in self.produk_map:
-                self.produk_map[produk_nama]['stok'] += qty
-                if self.produk_cb.get() == produk_nama:
-                    self.stok_info_label.config(
-                        text=f"Stok tersedia: {self.produk_map[produk_nama]['stok']}"
-                    )
-        
-        # Update nomor urut
-        self.renumber_items()
+            # Stok tampilan produk yang sedang dipilih ikut kembali
+            if self.produk_cb.get() == item['nama']:
+                row = self.db.katalog.get(item['id_produk'])
+                if row is not None:
+                    produk = self.info_baris(row)
+                    self.stok_info_label.config(text=f"Stok tersedia: {produk['stok']}")
+        
+        # Update nomor urut (hanya baris setelah item yang dihapus)
+        self.renumber_items(awal)
         self.update_total()
     
-    def renumber_items(self):
-        """Mengatur ulang nomor urut item"""
+    def renumber_items(self, mulai=0):
+        """Mengatur ulang nomor urut item mulai dari posisi tertentu"""
         children = self.tree.get_children()
-        for idx, child in enumerate(children, 1):
-            values = list(self.tree.item(child)['values'])
-            values[0] = idx
-            self.tree.item(child, values=values)
+        for idx in range(mulai, len(children)):
+            self.tree.set(children[idx], 'no', idx + 1)
     
     def update_total(self):
-        total = sum([item['qty'] * item['harga'] for item in self.transaksi_items])
-        self.total_label.config(text=f"Total: Rp {total:,.2f}")
+        self.total_label.config(text=f"Total: Rp {self.keranjang.total:,.2f}")
     
     def clear_item_form(self):
         """Mengosongkan form input item"""
@@ -982,25 +1328,26 @@ class PenjualanForm(tk.Toplevel):
     
     def clear_cart(self):
         """Mengosongkan seluruh keranjang"""
-        if not self.transaksi_items:
+        if not self.keranjang:
             return
         
         if messagebox.askyesno("Konfirmasi", "Apakah yakin ingin mengosongkan keranjang?"):
             # Hapus semua item dari treeview
-            for item in self.tree.get_children():
-                self.tree.delete(item)
+            self.tree.delete(*self.tree.get_children())
             
-            # Reset list transaksi
-            self.transaksi_items = []
+            # Reset keranjang
+            id_keranjang = [item['id_produk'] for item in self.keranjang]
+            self.keranjang.clear()
+            self.db.submit(self.db.lepas_reservasi, self.token_keranjang)
             
             # Reset total
             self.update_total()
             
-            # Refresh stok display
-            self.refresh_produk_map()
+            # Refresh stok display (kembalikan stok tampilan produk di keranjang)
+            self.refresh_produk_map(paksa=id_keranjang)
     
     def save_transaction(self):
-        if not self.transaksi_items:
+        if not self.keranjang:
             messagebox.showwarning("Peringatan", "Keranjang belanja kosong!")
             return
         
@@ -1014,7 +1361,7 @@ class PenjualanForm(tk.Toplevel):
             messagebox.showwarning("Peringatan", "Pelanggan tidak valid!")
             return
         
-        total = sum([item['qty'] * item['harga'] for item in self.transaksi_items])
+        total = self.keranjang.total
         id_karyawan = self.current_user["id"]
 
         # Konfirmasi sebelum simpan
@@ -1023,19 +1370,44 @@ class PenjualanForm(tk.Toplevel):
             return
         
         try:
-            id_penjualan = self.db.add_transaksi_penjualan(id_pelanggan, id_karyawan, total)
-            for item in self.transaksi_items:
-                self.db.add_detail_penjualan(id_penjualan, item['id_produk'], item['qty'], item['harga'])
-            
-            # Tampilkan struk
-            self.show_receipt(id_penjualan, total)
-            
-            messagebox.showinfo("Sukses", f"Transaksi berhasil disimpan dengan ID: {id_penjualan}")
+            items = self.keranjang.items()
+            kunci = None
+            try:
+                # Header, detail, dan stok disimpan dalam satu transaksi; dengan antrian,
+                # database yang sibuk lebih lama dari CHECKOUT_TUNGGU tidak ditunggu
+                tunggu = CHECKOUT_TUNGGU if self.antrian is not None else None
+                id_penjualan = self.db.checkout(id_pelanggan, id_karyawan, items,
+                                                token=self.token_keranjang, tunggu=tunggu)
+            except Exception as e:
+                if self.antrian is None or not database_sibuk(e):
+                    raise
+                # Database terkunci/tidak terjangkau: dicatat di antrian lokal dan dikirim di
+                # latar belakang. Stok keranjang ini masih dipesan atas token-nya sampai
+                # penjualan masuk (atau reservasinya kedaluwarsa, lihat checkout_antrian).
+                kunci = self.antrian.simpan(id_pelanggan, id_karyawan, items, token=self.token_keranjang)
+                self._token_antrian.add(self.token_keranjang)
+                id_penjualan = None
+
+            if kunci is None and not id_penjualan:
+                messagebox.showerror("Error", "Transaksi dibatalkan: stok salah satu produk tidak mencukupi "
+                                              "atau database sedang sibuk.")
+                self.refresh_produk_map()
+                return
+
+            # Keranjang berikutnya memakai token reservasi baru
+            self.token_keranjang = uuid.uuid4().hex
+            if kunci is not None:
+                self.show_receipt(kunci[:8].upper(), total)
+                self.perbarui_status_antrian()
+            else:
+                # Tampilkan struk
+                self.show_receipt(id_penjualan, total)
+
+                messagebox.showinfo("Sukses", f"Transaksi berhasil disimpan dengan ID: {id_penjualan}")
             
             # Reset form setelah sukses
-            self.transaksi_items = []
-            for item in self.tree.get_children():
-                self.tree.delete(item)
+            self.keranjang.clear()
+            self.tree.delete(*self.tree.get_children())
             
             self.update_total()
             self.refresh_produk_map()
@@ -1043,6 +1415,23 @@ class PenjualanForm(tk.Toplevel):
         except Exception as e:
             messagebox.showerror("Error", f"Gagal menyimpan transaksi: {e}")
     
+    def perbarui_status_antrian(self):
+        """Menampilkan jumlah penjualan antrian yang menunggu/gagal, dicek ulang selama masih ada"""
+        if self.antrian is None:
+            return
+        if self._after_antrian is not None:
+            self.after_cancel(self._after_antrian)
+            self._after_antrian = None
+        menunggu = self.antrian.jumlah_menunggu()
+        gagal = self.antrian.jumlah_gagal()
+        teks = []
+        if menunggu:
+            teks.append(f"{menunggu} transaksi menunggu sinkron")
+            self._after_antrian = self.after(1000, self.perbarui_status_antrian)
+        if gagal:
+            teks.append(f"{gagal} transaksi gagal sinkron")
+        self.antrian_label.config(text=", ".join(teks), foreground="red" if gagal else "gray")
+
     def show_receipt(self, transaction_id, total):
         """Menampilkan struk transaksi"""
         receipt_window = tk.Toplevel(self)
@@ -1084,14 +1473,8 @@ class PenjualanForm(tk.Toplevel):
         ttk.Label(receipt_frame, text="ITEM", 
                  font=("Courier", 10, "bold")).pack(anchor="w")
         
-        for item in self.transaksi_items:
-            produk_nama = ""
-            for produk_id, info in self.produk_map.items():
-                if info['id'] == item['id_produk']:
-                    produk_nama = info['nama']
-                    break
-            
-            item_text = f"{produk_nama[:20]:20} {item['qty']:3} x Rp {item['harga']:,.0f}"
+        for item in self.keranjang:
+            item_text = f"{item['nama'][:20]:20} {item['qty']:3} x Rp {item['harga']:,.0f}"
             ttk.Label(receipt_frame, text=item_text, 
                      font=("Courier", 9)).pack(anchor="w")
         
@@ -1128,20 +1511,12 @@ class PembelianForm(tk.Toplevel):
         self.title("Transaksi Pembelian")
         self.geometry("700x500")
         
-        self.supplier_map = {f"{s[0]} - {s[1]}": s[0] for s in self.db.get_all_supplier()}
-        self.produk_map = {
-            f"{p[0]} - {p[2]}": {
-                'id': p[0],
-                'nama': p[2],
-                'harga': p[5],   # harga_beli
-                'stok': p[7]
-            }
-            for p in self.db.get_all_produk()
-        }
-
-        
-        self.transaksi_items = []
-        self.create_widgets()
+        self.keranjang = Cart()
+        try:
+            self.supplier_map = {f"{s[0]} - {s[1]}": s[0] for s in self.db.get_all_supplier()}
+            self.create_widgets()  # combobox produk memuat katalog
+        except ERROR_DATA as e:
+            gagal_muat(self, e)
 
     def create_widgets(self):
         header_frame = ttk.LabelFrame(self, text="Detail Transaksi")
@@ -1156,9 +1531,11 @@ class PembelianForm(tk.Toplevel):
         item_frame = ttk.LabelFrame(self, text="Tambah Item")
         item_frame.pack(pady=10, padx=10, fill="x")
         ttk.Label(item_frame, text="Produk:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        self.produk_cb = ttk.Combobox(item_frame, values=list(self.produk_map.keys()), width=40)
+        self.produk_cb = ttk.Combobox(item_frame, width=40,
+                                      values=[f"{p.id} - {p.nama_produk}" for p in self.db.katalog.daftar_terbaru()])
         self.produk_cb.grid(row=0, column=1, padx=5, pady=5)
         self.produk_cb.bind("<<ComboboxSelected>>", self.on_produk_select)
+        self.produk_cb.bind("<KeyRelease>", self.on_produk_search)
         ttk.Label(item_frame, text="Qty:").grid(row=0, column=2, padx=5, pady=5, sticky="w")
         self.qty_entry = ttk.Entry(item_frame, width=10)
         self.qty_entry.grid(row=0, column=3, padx=5, pady=5)
@@ -1188,11 +1565,26 @@ class PembelianForm(tk.Toplevel):
         ttk.Button(action_frame, text="Simpan Transaksi", command=self.save_transaction).pack(side="left", padx=5)
         ttk.Button(action_frame, text="Batal", command=self.destroy).pack(side="left", padx=5)
 
+    def produk_terpilih(self, teks):
+        """Baris produk katalog dari pilihan combobox "ID - Nama", atau None jika tidak valid"""
+        id_str, _, nama = teks.partition(" - ")
+        try:
+            row = self.db.katalog.get(int(id_str))
+        except ValueError:
+            return None
+        return row if row is not None and row.nama_produk == nama else None
+
+    def on_produk_search(self, event):
+        """Filter produk berdasarkan input pencarian (nama atau kode) lewat indeks katalog"""
+        hasil = self.db.katalog.cari(self.produk_cb.get())
+        self.produk_cb['values'] = [f"{p.id} - {p.nama_produk}" for p in hasil]
+
     def on_produk_select(self, event):
-        selected_produk = self.produk_cb.get()
-        harga = self.produk_map[selected_produk]['harga']
+        produk = self.produk_terpilih(self.produk_cb.get())
+        if produk is None:
+            return
         self.harga_entry.delete(0, tk.END)
-        self.harga_entry.insert(0, str(harga))
+        self.harga_entry.insert(0, str(produk.harga_beli))
 
     def add_to_cart(self):
         produk_str = self.produk_cb.get()
@@ -1202,8 +1594,8 @@ class PembelianForm(tk.Toplevel):
             messagebox.showwarning("Peringatan", "Lengkapi data item!")
             return
 
-        produk = self.produk_map.get(produk_str)
-        if not produk:
+        produk = self.produk_terpilih(produk_str)
+        if produk is None:
             messagebox.showwarning("Peringatan", "Produk tidak valid!")
             return
 
@@ -1212,15 +1604,9 @@ class PembelianForm(tk.Toplevel):
             if qty <= 0:
                 raise ValueError
 
-
-
-            id_produk = produk['id']
-            harga = produk['harga']
-            subtotal = qty * harga
-            nama_produk = produk['nama']
-
-            self.tree.insert('', 'end', values=(id_produk,nama_produk, qty, harga, subtotal))
-            self.transaksi_items.append({'id_produk': id_produk, 'qty': qty, 'harga': harga})
+            # Produk yang sama digabung dalam satu baris
+            item = self.keranjang.add(produk.id, produk.nama_produk, qty, produk.harga_beli)
+            simpan_baris_keranjang(self.tree, item)
 
             self.update_total()
             self.produk_cb.set('')
@@ -1231,15 +1617,13 @@ class PembelianForm(tk.Toplevel):
             messagebox.showerror("Error", "Qty harus berupa angka positif!")
 
     def update_total(self):
-        total = sum([item['qty'] * item['harga'] for item in self.transaksi_items])
-        self.total_label.config(text=f"Total: {total:.2f}")
+        self.total_label.config(text=f"Total: {self.keranjang.total:.2f}")
 
     def save_transaction(self):
-        if not self.transaksi_items: messagebox.showwarning("Peringatan", "Keranjang belanja kosong!"); return
+        if not self.keranjang: messagebox.showwarning("Peringatan", "Keranjang belanja kosong!"); return
         id_supplier_str = self.supplier_cb.get()
         if not id_supplier_str: messagebox.showwarning("Peringatan", "Pilih supplier!"); return
         id_supplier = self.supplier_map[id_supplier_str]
-        total = sum([item['qty'] * item['harga'] for item in self.transaksi_items])
         if not self.current_user:
             messagebox.showerror("Error", "User belum login!")
             return
@@ -1247,9 +1631,10 @@ class PembelianForm(tk.Toplevel):
         id_karyawan = self.current_user["id"]
 
         try:
-            id_pembelian = self.db.add_transaksi_pembelian(id_supplier, id_karyawan, total)
-            for item in self.transaksi_items:
-                self.db.add_detail_pembelian(id_pembelian, item['id_produk'], item['qty'], item['harga'])
+            id_pembelian = self.db.checkout_pembelian(id_supplier, id_karyawan, self.keranjang.items())
+            if not id_pembelian:
+                messagebox.showerror("Error", "Gagal menyimpan transaksi pembelian!")
+                return
             messagebox.showinfo("Sukses", f"Transaksi Pembelian berhasil disimpan dengan ID: {id_pembelian}")
             self.destroy()
         except Exception as e:
@@ -1264,28 +1649,25 @@ class ReturPenjualanForm(tk.Toplevel):
         self.title("Retur Penjualan")
         self.geometry("700x500")
 
-        # Mapping pelanggan
-        self.pelanggan_map = {f"{p[0]} - {p[1]}": p[0] for p in self.db.get_all_pelanggan()}
-
         # Data transaksi retur
-        self.retur_items = []
-        self.produk_map = {}
+        self.keranjang = Cart()
+        self._versi_katalog = None
 
-        self.create_widgets()
-        self.refresh_produk_map()
+        try:
+            # Mapping pelanggan
+            self.pelanggan_map = {f"{p[0]} - {p[1]}": p[0] for p in self.db.get_all_pelanggan()}
+            self.create_widgets()
+            self.refresh_produk_map()
+        except ERROR_DATA as e:
+            gagal_muat(self, e)
 
     def refresh_produk_map(self):
-        all_produk = self.db.get_all_produk()
-        self.produk_map = {
-            row[2]: {  # row[2] = nama_produk
-                'id': row[0],
-                'nama': row[2],
-                'harga': row[6],  # harga_jual
-                'stok': row[7]
-            }
-            for row in all_produk
-        }
-        self.produk_cb['values'] = [row[2] for row in all_produk]
+        """Sinkron dengan katalog bersama; data produk dibaca langsung dari db.katalog"""
+        katalog = self.db.katalog
+        self._versi_katalog, berubah, penuh = katalog.perubahan_sejak(self._versi_katalog)
+        if not berubah and not penuh:
+            return
+        self.produk_cb['values'] = katalog.daftar().nama()
 
     def create_widgets(self):
         # Header Retur
@@ -1308,6 +1690,7 @@ class ReturPenjualanForm(tk.Toplevel):
         self.produk_cb = ttk.Combobox(item_frame, values=[], width=40)
         self.produk_cb.grid(row=0, column=1, padx=5, pady=5)
         self.produk_cb.bind("<<ComboboxSelected>>", self.on_produk_select)
+        self.produk_cb.bind("<KeyRelease>", self.on_produk_search)
 
         ttk.Label(item_frame, text="Qty:").grid(row=0, column=2, padx=5, pady=5, sticky="w")
         self.qty_entry = ttk.Entry(item_frame, width=10)
@@ -1343,13 +1726,17 @@ class ReturPenjualanForm(tk.Toplevel):
         ttk.Button(action_frame, text="Simpan Retur", command=self.save_transaction).pack(side="left", padx=5)
         ttk.Button(action_frame, text="Batal", command=self.destroy).pack(side="left", padx=5)
 
+    def on_produk_search(self, event):
+        """Filter produk berdasarkan input pencarian (nama atau kode) lewat indeks katalog"""
+        hasil = self.db.katalog.cari(self.produk_cb.get())
+        self.produk_cb['values'] = [p[2] for p in hasil]
+
     def on_produk_select(self, event):
-        selected_nama = self.produk_cb.get()
-        if not selected_nama or selected_nama not in self.produk_map:
+        produk = self.db.katalog.cari_nama(self.produk_cb.get())
+        if produk is None:
             return
-        harga = self.produk_map[selected_nama]['harga']
         self.harga_entry.delete(0, tk.END)
-        self.harga_entry.insert(0, str(harga))
+        self.harga_entry.insert(0, str(produk.harga_jual))
 
     def add_to_cart(self):
         produk_nama = self.produk_cb.get()
@@ -1357,22 +1744,17 @@ class ReturPenjualanForm(tk.Toplevel):
         if not all([produk_nama, qty_str]):
             messagebox.showwarning("Peringatan", "Lengkapi data item!")
             return
-        if produk_nama not in self.produk_map:
+        produk = self.db.katalog.cari_nama(produk_nama)
+        if produk is None:
             messagebox.showwarning("Peringatan", "Produk tidak valid!")
             return
         try:
             qty = int(qty_str)
-            produk = self.produk_map[produk_nama]
-            id_produk = produk['id']
-            harga = produk['harga']
-
-            subtotal = qty * harga
-            self.tree.insert('', 'end', values=(id_produk, produk_nama, qty, harga, subtotal))
-            self.retur_items.append({
-                'id_produk': id_produk,
-                'qty': qty,
-                'harga': harga
-            })
+            if qty <= 0:
+                raise ValueError
+            # Produk yang sama digabung dalam satu baris
+            item = self.keranjang.add(produk.id, produk.nama_produk, qty, produk.harga_jual)
+            simpan_baris_keranjang(self.tree, item)
 
             self.update_total()
 
@@ -1380,14 +1762,13 @@ class ReturPenjualanForm(tk.Toplevel):
             self.qty_entry.delete(0, tk.END)
             self.harga_entry.delete(0, tk.END)
         except ValueError:
-            messagebox.showerror("Error", "Qty harus berupa angka!")
+            messagebox.showerror("Error", "Qty harus berupa angka positif!")
 
     def update_total(self):
-        total = sum([item['qty'] * item['harga'] for item in self.retur_items])
-        self.total_label.config(text=f"Total Retur: {total:.2f}")
+        self.total_label.config(text=f"Total Retur: {self.keranjang.total:.2f}")
 
     def save_transaction(self):
-        if not self.retur_items:
+        if not self.keranjang:
             messagebox.showwarning("Peringatan", "Keranjang retur kosong!")
             return
 
@@ -1396,21 +1777,280 @@ class ReturPenjualanForm(tk.Toplevel):
             messagebox.showwarning("Peringatan", "Pilih pelanggan!")
             return
         id_pelanggan = self.pelanggan_map[id_pelanggan_str]
-        total = sum([item['qty'] * item['harga'] for item in self.retur_items])
         id_karyawan = self.current_user["id"]
 
         try:
-            # Simpan header retur
-            id_retur = self.db.add_transaksi_retur_penjualan(None, id_pelanggan, id_karyawan, total)
-            for item in self.retur_items:
-                self.db.add_detail_retur_penjualan(id_retur, item['id_produk'], item['qty'], item['harga'])
+            # Simpan header, detail, dan stok retur dalam satu transaksi
+            id_retur = self.db.checkout_retur(None, id_pelanggan, id_karyawan, self.keranjang.items())
+            if not id_retur:
+                messagebox.showerror("Error", "Gagal menyimpan retur!")
+                return
             messagebox.showinfo("Sukses", f"Retur berhasil disimpan dengan ID: {id_retur}")
             self.refresh_produk_map()
             self.destroy()
         except Exception as e:
             messagebox.showerror("Error", f"Gagal menyimpan retur: {e}")
 
-# forms.py - Tambahkan class LaporanForm
+# --- Import massal data master ---
+class ImportForm(tk.Toplevel):
+    """Form import data master dari file CSV/JSONL (berjalan di thread worker)"""
+    def __init__(self, parent, db):
+        super().__init__(parent)
+        self.db = db
+        self.title("Import Data Master")
+        self.geometry("600x400")
+        self._progres = None
+        self.create_widgets()
+
+    def create_widgets(self):
+        input_frame = ttk.LabelFrame(self, text="File Import")
+        input_frame.pack(pady=10, padx=10, fill="x")
+
+        ttk.Label(input_frame, text="Jenis Data:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.jenis_cb = ttk.Combobox(input_frame, values=JENIS_IMPORT, state="readonly", width=20)
+        self.jenis_cb.set(JENIS_IMPORT[0])
+        self.jenis_cb.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+
+        ttk.Label(input_frame, text="File (CSV/JSONL):").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.file_entry = ttk.Entry(input_frame, width=50)
+        self.file_entry.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Button(input_frame, text="Pilih...", command=self.pilih_file).grid(row=1, column=2, padx=5, pady=5)
+
+        self.import_button = ttk.Button(input_frame, text="Mulai Import", command=self.mulai_import)
+        self.import_button.grid(row=2, column=0, columnspan=3, pady=10)
+
+        self.status_label = ttk.Label(self, text="Pilih file untuk diimport", foreground="blue")
+        self.status_label.pack(pady=5)
+
+        tolak_frame = ttk.LabelFrame(self, text="Baris Ditolak")
+        tolak_frame.pack(pady=10, padx=10, fill="both", expand=True)
+        self.tolak_text = tk.Text(tolak_frame, height=10, font=("Courier", 9))
+        self.tolak_text.pack(fill="both", expand=True)
+
+    def pilih_file(self):
+        path = filedialog.askopenfilename(
+            parent=self,
+            filetypes=[("CSV / JSONL", "*.csv *.jsonl *.ndjson"), ("Semua file", "*.*")]
+        )
+        if path:
+            self.file_entry.delete(0, tk.END)
+            self.file_entry.insert(0, path)
+
+    def mulai_import(self):
+        path = self.file_entry.get()
+        if not path:
+            messagebox.showwarning("Peringatan", "Pilih file yang akan diimport!", parent=self)
+            return
+
+        importer = Importer(self.db, self.jenis_cb.get())
+        self.import_button.config(state="disabled")
+        self.tolak_text.delete("1.0", tk.END)
+        self.status_label.config(text="Mengimport...", foreground="blue")
+        self.db.submit(importer.jalankan, path, progress=self.set_progres,
+                       widget=self, callback=self.import_selesai, errback=self.import_gagal)
+        self.after(200, self.tampilkan_progres)
+
+    def set_progres(self, hasil):
+        # Dipanggil dari thread worker, hanya menyimpan teks untuk dibaca mainloop
+        self._progres = f"{hasil.diproses:,} baris ({hasil.baris_per_detik:,.0f} baris/detik)"
+
+    def tampilkan_progres(self):
+        if str(self.import_button['state']) != "disabled":
+            return
+        if self._progres:
+            self.status_label.config(text=f"Mengimport... {self._progres}")
+        self.after(200, self.tampilkan_progres)
+
+    def import_selesai(self, hasil):
+        self.import_button.config(state="normal")
+        warna = "red" if hasil.ditolak else "green"
+        self.status_label.config(text=str(hasil), foreground=warna)
+        for nomor, alasan in hasil.ditolak[:1000]:
+            self.tolak_text.insert(tk.END, f"Baris {nomor}: {alasan}\n")
+        if len(hasil.ditolak) > 1000:
+            self.tolak_text.insert(tk.END, f"... dan {len(hasil.ditolak) - 1000:,} baris lain\n")
+
+    def import_gagal(self, error):
+        self.import_button.config(state="normal")
+        self.status_label.config(text="Import gagal", foreground="red")
+        messagebox.showerror("Error", f"Gagal import data: {error}", parent=self)
+
+# --- Export laporan ---
+def export_laporan_dialog(parent, db, judul, header, buat_rows, status_label):
+    """Meminta nama file lalu meng-export laporan di thread worker.
+
+    buat_rows() harus mengembalikan generator baris; generator itu dijalankan di
+    thread worker sehingga query per halaman memakai koneksi reader. Progres
+    ditampilkan di status_label.
+    """
+    filetypes = [("CSV", "*.csv")]
+    if xlsx_tersedia():
+        filetypes.insert(0, ("Excel", "*.xlsx"))
+    path = filedialog.asksaveasfilename(
+        parent=parent, title=f"Export {judul}", filetypes=filetypes,
+        defaultextension=filetypes[0][1][1:],
+        initialfile=f"{judul.lower().replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
+    )
+    if not path:
+        return
+
+    progres = {'baris': 0, 'selesai': False}
+
+    def set_progres(jumlah):
+        progres['baris'] = jumlah  # dipanggil dari thread worker
+
+    def tampilkan_progres():
+        if progres['selesai'] or not status_label.winfo_exists():
+            return
+        status_label.config(text=f"Export: {progres['baris']:,} baris...", foreground="blue")
+        parent.after(200, tampilkan_progres)
+
+    def selesai(jumlah):
+        progres['selesai'] = True
+        status_label.config(text=f"Export selesai: {jumlah:,} baris ke {path}", foreground="green")
+
+    def gagal(error):
+        progres['selesai'] = True
+        status_label.config(text="Export gagal", foreground="red")
+        messagebox.showerror("Error", f"Gagal export laporan: {error}", parent=parent)
+
+    db.submit(lambda: export_laporan(path, header, buat_rows(), set_progres, judul=judul),
+              widget=parent, callback=selesai, errback=gagal)
+    tampilkan_progres()
+
+# --- Treeview virtual untuk data besar ---
+class VirtualTreeview(ttk.Frame):
+    """Treeview yang hanya menyimpan beberapa halaman data sekaligus.
+
+    fungsi_halaman(after, page) dijalankan di thread worker dan mengembalikan daftar
+    baris; kunci_baris(row) menghasilkan nilai `after` untuk halaman berikutnya.
+    Halaman baru dimuat saat scroll mendekati ujung, halaman terjauh dibuang.
+    """
+    def __init__(self, parent, db, columns, kunci_baris, fungsi_halaman=None,
+                 ukuran_halaman=500, maks_halaman=3, **kwargs):
+        super().__init__(parent)
+        self.db = db
+        self.kunci_baris = kunci_baris
+        self.fungsi_halaman = fungsi_halaman
+        self.ukuran_halaman = ukuran_halaman
+        self.maks_halaman = maks_halaman
+        self._generasi = 0
+
+        self.scrollbar_y = ttk.Scrollbar(self)
+        self.scrollbar_y.pack(side="right", fill="y")
+
+        self.scrollbar_x = ttk.Scrollbar(self, orient="horizontal")
+        self.scrollbar_x.pack(side="bottom", fill="x")
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings',
+                                 yscrollcommand=self.on_scroll,
+                                 xscrollcommand=self.scrollbar_x.set, **kwargs)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar_y.config(command=self.tree.yview)
+        self.scrollbar_x.config(command=self.tree.xview)
+
+        self.reset()
+
+    def reset(self):
+        """Mengosongkan treeview dan status halaman"""
+        self.tree.delete(*self.tree.get_children())
+        self._kunci = [None]        # _kunci[i] = nilai after untuk memuat halaman i
+        self._iid_halaman = {}      # nomor halaman -> daftar iid di treeview
+        self._awal = 0              # halaman pertama yang sedang tampil
+        self._akhir = -1            # halaman terakhir yang sedang tampil
+        self._habis = False         # True jika halaman terakhir data sudah dimuat
+        self._memuat = False
+        self._jumlah = 0            # jumlah item di treeview
+        self._generasi += 1         # membatalkan hasil halaman dari filter lama
+
+    def muat_ulang(self, fungsi_halaman=None):
+        """Memuat ulang dari halaman pertama (misalnya setelah filter berubah)"""
+        if fungsi_halaman is not None:
+            self.fungsi_halaman = fungsi_halaman
+        self.reset()
+        self.muat_halaman(0)
+
+    def muat_halaman(self, halaman):
+        """Mengambil satu halaman di thread worker"""
+        if self.fungsi_halaman is None:
+            return
+        self._memuat = True
+        generasi = self._generasi
+        self.db.submit(self.fungsi_halaman, self._kunci[halaman], self.ukuran_halaman,
+                       widget=self,
+                       callback=lambda rows: self.halaman_dimuat(generasi, halaman, rows),
+                       errback=lambda e: self.halaman_gagal(generasi, e))
+
+    def halaman_gagal(self, generasi, error):
+        if generasi == self._generasi:
+            self._memuat = False
+        print(f"Gagal memuat halaman: {error}")
+
+    def halaman_dimuat(self, generasi, halaman, rows):
+        """Menempatkan halaman yang sudah diambil ke treeview (di thread Tk)"""
+        if generasi != self._generasi:
+            return  # hasil untuk filter lama
+        self._memuat = False
+
+        if rows and len(self._kunci) == halaman + 1:
+            self._kunci.append(self.kunci_baris(rows[-1]))
+
+        posisi = self.tree.yview()[0] * self._jumlah  # indeks item teratas yang terlihat
+
+        if halaman > self._akhir:
+            # Tambah di bawah
+            if len(rows) < self.ukuran_halaman:
+                self._habis = True
+            self._iid_halaman[halaman] = [self.tree.insert('', 'end', values=row) for row in rows]
+            self._akhir = halaman
+            self._jumlah += len(rows)
+            if self._akhir - self._awal + 1 > self.maks_halaman:
+                dibuang = self.buang_halaman(self._awal)
+                self._awal += 1
+                posisi -= dibuang
+        else:
+            # Tambah di atas
+            iids = []
+            for indeks, row in enumerate(rows):
+                iids.append(self.tree.insert('', indeks, values=row))
+            self._iid_halaman[halaman] = iids
+            self._awal = halaman
+            self._jumlah += len(rows)
+            posisi += len(rows)
+            if self._akhir - self._awal + 1 > self.maks_halaman:
+                self.buang_halaman(self._akhir)
+                self._akhir -= 1
+                self._habis = False
+
+        if self._jumlah:
+            self.tree.yview_moveto(max(posisi, 0) / self._jumlah)
+
+    def buang_halaman(self, halaman):
+        """Menghapus item satu halaman dari treeview, mengembalikan jumlah item yang dihapus"""
+        iids = self._iid_halaman.pop(halaman, [])
+        if iids:
+            self.tree.delete(*iids)
+        self._jumlah -= len(iids)
+        return len(iids)
+
+    def on_scroll(self, first, last):
+        """Dipanggil treeview saat posisi scroll berubah"""
+        self.scrollbar_y.set(first, last)
+        if self._memuat or self._akhir < 0:
+            return
+        first, last = float(first), float(last)
+        if last >= 0.95 and not self._habis:
+            self.muat_halaman(self._akhir + 1)
+        elif first <= 0.05 and self._awal > 0:
+            self.muat_halaman(self._awal - 1)
+
+
+# Halaman laporan yang disimpan untuk dipakai ulang (scroll bolak-balik, cetak);
+# halaman yang paling lama tidak dipakai dibuang lebih dulu
+MAKS_CACHE_HALAMAN = 6
+# Preview cetak hanya menampilkan sebanyak ini; data lengkap lewat Export
+MAKS_BARIS_CETAK = 5000
+
 
 class LaporanPenjualanForm(tk.Toplevel):
     def __init__(self, parent, db):
@@ -1451,16 +2091,12 @@ class LaporanPenjualanForm(tk.Toplevel):
         tree_frame = ttk.Frame(self)
         tree_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         
-        # Treeview dengan scrollbar
-        scrollbar_y = ttk.Scrollbar(tree_frame)
-        scrollbar_y.pack(side="right", fill="y")
-        
-        scrollbar_x = ttk.Scrollbar(tree_frame, orient="horizontal")
-        scrollbar_x.pack(side="bottom", fill="x")
-        
+        # Treeview virtual: hanya beberapa halaman yang dimuat ke widget
         columns = ('id', 'tanggal', 'waktu', 'pelanggan', 'karyawan', 'total')
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings',
-                                yscrollcommand=scrollbar_y.set, xscrollcommand=scrollbar_x.set)
+        self.tabel = VirtualTreeview(tree_frame, self.db, columns,
+                                     kunci_baris=lambda row: (row[1], row[2], row[0]))
+        self.tabel.pack(fill="both", expand=True)
+        self.tree = self.tabel.tree
         
         # Konfigurasi kolom
         self.tree.heading('id', text='ID')
@@ -1477,10 +2113,6 @@ class LaporanPenjualanForm(tk.Toplevel):
         self.tree.column('karyawan', width=100)
         self.tree.column('total', width=120, anchor='e')
         
-        self.tree.pack(side="left", fill="both", expand=True)
-        scrollbar_y.config(command=self.tree.yview)
-        scrollbar_x.config(command=self.tree.xview)
-        
         # Frame untuk total
         total_frame = ttk.Frame(self)
         total_frame.pack(fill="x", padx=10, pady=5)
@@ -1493,6 +2125,9 @@ class LaporanPenjualanForm(tk.Toplevel):
         
         self.rata_rata_label = ttk.Label(total_frame, text="Rata-rata per Transaksi: Rp 0", font=("Arial", 10, "bold"))
         self.rata_rata_label.pack(side="left", padx=20)
+
+        self.export_label = ttk.Label(self, text="")
+        self.export_label.pack(fill="x", padx=10, pady=(0, 5))
         
     def load_data(self):
         """Memuat data laporan penjualan"""
@@ -1506,31 +2141,49 @@ class LaporanPenjualanForm(tk.Toplevel):
         if not tanggal_akhir:
             tanggal_akhir = None
         
-        # Hapus data lama
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Ambil data dari database
-        data = self.db.get_laporan_penjualan(tanggal_awal, tanggal_akhir)
-        
-        # Hitung total
-        total_transaksi = len(data)
-        total_penjualan = 0
-        
-        # Tambah data ke treeview
-        for row in data:
-            self.tree.insert('', 'end', values=row)
-            total_penjualan += row[5] if row[5] else 0
-        
+        self.total_transaksi_label.config(text="Total Transaksi: memuat...")
+
+        # Filter baru: kosongkan cache halaman dan ringkasan
+        self._filter = (tanggal_awal, tanggal_akhir)
+        self._cache_halaman = OrderedDict()
+        self._cache_lock = threading.Lock()  # ambil_halaman dipanggil dari thread worker
+        self._ringkasan = None
+
+        # Baris laporan dimuat per halaman (keyset) sesuai posisi scroll
+        self.tabel.muat_ulang(
+            lambda after, page: self.ambil_halaman(tanggal_awal, tanggal_akhir, after, page)
+        )
+
+        # Jumlah, total, dan rata-rata dihitung SQL di thread worker
+        self.db.submit(self.db.get_laporan_penjualan_summary, tanggal_awal, tanggal_akhir,
+                       widget=self, callback=self.tampilkan_total,
+                       errback=lambda e: messagebox.showerror("Error", f"Gagal memuat laporan: {e}"))
+
+    def ambil_halaman(self, tanggal_awal, tanggal_akhir, after, page):
+        """Mengambil satu halaman laporan (di thread worker), memakai cache LRU jika ada"""
+        kunci = (tanggal_awal, tanggal_akhir, after, page)
+        cache, lock = self._cache_halaman, self._cache_lock
+        with lock:
+            rows = cache.get(kunci)
+            if rows is not None:
+                cache.move_to_end(kunci)
+                return rows
+        rows = self.db.get_laporan_penjualan_page(tanggal_awal, tanggal_akhir, after, page)
+        with lock:
+            cache[kunci] = rows
+            while len(cache) > MAKS_CACHE_HALAMAN:
+                cache.popitem(last=False)
+        return rows
+
+    def tampilkan_total(self, hasil):
+        """Menampilkan label total (dipanggil di thread Tk)"""
+        self._ringkasan = hasil
+        total_transaksi, total_penjualan, rata_rata = hasil
+
         # Update label total
         self.total_transaksi_label.config(text=f"Total Transaksi: {total_transaksi}")
         self.total_penjualan_label.config(text=f"Total Penjualan: Rp {total_penjualan:,.2f}")
-        
-        if total_transaksi > 0:
-            rata_rata = total_penjualan / total_transaksi
-            self.rata_rata_label.config(text=f"Rata-rata per Transaksi: Rp {rata_rata:,.2f}")
-        else:
-            self.rata_rata_label.config(text="Rata-rata per Transaksi: Rp 0")
+        self.rata_rata_label.config(text=f"Rata-rata per Transaksi: Rp {rata_rata:,.2f}")
     
     def reset_filter(self):
         """Reset filter ke default"""
@@ -1545,9 +2198,8 @@ class LaporanPenjualanForm(tk.Toplevel):
         """Cetak laporan (simulasi)"""
         from tkinter import Toplevel, Text, Scrollbar
         
-        # Ambil data terfilter
-        tanggal_awal = self.tanggal_awal_entry.get()
-        tanggal_akhir = self.tanggal_akhir_entry.get()
+        # Periode yang sedang tampil di layar
+        tanggal_awal, tanggal_akhir = self._filter
         
         # Buat window preview cetak
         print_window = Toplevel(self)
@@ -1565,40 +2217,65 @@ class LaporanPenjualanForm(tk.Toplevel):
 {'='*60}
 {'LAPORAN PENJUALAN'.center(60)}
 {'='*60}
-Periode: {tanggal_awal} s/d {tanggal_akhir}
+Periode: {tanggal_awal or '-'} s/d {tanggal_akhir or '-'}
 Tanggal Cetak: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 {'='*60}
 {'NO'.center(5)} {'TANGGAL'.center(12)} {'PELANGGAN'.center(20)} {'KASIR'.center(15)} {'TOTAL'.center(15)}
 {'='*60}
 """
         text.insert("1.0", header)
-        
-        # Data laporan
-        data = self.db.get_laporan_penjualan(tanggal_awal, tanggal_akhir)
-        total_penjualan = 0
-        
-        for idx, row in enumerate(data, 1):
-            no = str(idx).center(5)
-            tanggal = row[1].center(12)
-            pelanggan = row[3][:18].ljust(20)
-            kasir = row[4][:13].ljust(15)
-            total = f"Rp {row[5]:,.2f}".rjust(15)
-            
-            text.insert("end", f"{no} {tanggal} {pelanggan} {kasir} {total}\n")
-            total_penjualan += row[5] if row[5] else 0
-        
-        # Footer laporan
-        footer = f"""
+        status = ttk.Label(print_window, text="Memuat data...", foreground="blue")
+        
+        # Baris diambil per halaman di thread worker (halaman yang sudah tampil
+        # diambil dari cache) dan ditambahkan ke preview satu halaman sekali jalan
+        page = self.tabel.ukuran_halaman
+        ringkasan = self._ringkasan  # sudah dihitung untuk layar jika ada
+        nomor = [0]
+
+        def muat(after):
+            self.db.submit(self.ambil_halaman, tanggal_awal, tanggal_akhir, after, page,
+                           widget=print_window, callback=tampilkan,
+                           errback=lambda e: status.config(text=f"Gagal memuat: {e}", foreground="red"))
+
+        def tampilkan(rows):
+            baris = []
+            for row in rows[:MAKS_BARIS_CETAK - nomor[0]]:
+                nomor[0] += 1
+                no = str(nomor[0]).center(5)
+                tanggal = row[1].center(12)
+                pelanggan = row[3][:18].ljust(20)
+                kasir = row[4][:13].ljust(15)
+                total = f"Rp {row[5]:,.2f}".rjust(15)
+                baris.append(f"{no} {tanggal} {pelanggan} {kasir} {total}\n")
+            text.insert("end", "".join(baris))
+            status.config(text=f"Memuat data... {nomor[0]:,} baris")
+
+            if len(rows) == page and nomor[0] < MAKS_BARIS_CETAK:
+                muat((rows[-1][1], rows[-1][2], rows[-1][0]))
+            elif ringkasan is not None:
+                selesai(ringkasan)
+            else:
+                self.db.submit(self.db.get_laporan_penjualan_summary, tanggal_awal, tanggal_akhir,
+                               widget=print_window, callback=selesai)
+
+        def selesai(ringkasan):
+            total_transaksi, total_penjualan, _ = ringkasan
+            catatan = ""
+            if total_transaksi > nomor[0]:
+                catatan = f"... preview dibatasi {MAKS_BARIS_CETAK:,} baris, gunakan Export untuk data lengkap\n"
+
+            # Footer laporan (ringkasan dihitung SQL untuk seluruh periode)
+            footer = f"""{catatan}
 {'='*60}
-{'Total Transaksi:'.ljust(40)} {len(data):>20}
+{'Total Transaksi:'.ljust(40)} {total_transaksi:>20}
 {'Total Penjualan:'.ljust(40)} {'Rp ' + f'{total_penjualan:,.2f}'.rjust(18)}
 {'='*60}
 {'TERIMA KASIH'.center(60)}
 {'='*60}
 """
-        text.insert("end", footer)
-        
-        text.config(state="disabled")
+            text.insert("end", footer)
+            text.config(state="disabled")
+            status.config(text=f"{nomor[0]:,} baris", foreground="green")
         
         # Scrollbar
         scrollbar = ttk.Scrollbar(frame, orient="vertical", command=text.yview)
@@ -1610,14 +2287,21 @@ Tanggal Cetak: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         # Tombol
         button_frame = ttk.Frame(print_window)
         button_frame.pack(pady=10)
+        status.pack(before=button_frame, fill="x", padx=10)
         
         ttk.Button(button_frame, text="Cetak", command=lambda: messagebox.showinfo("Info", "Mengirim ke printer...")).pack(side="left", padx=5)
         ttk.Button(button_frame, text="Tutup", command=print_window.destroy).pack(side="left", padx=5)
+
+        muat(None)
     
     def export_excel(self):
-        """Export ke Excel (simulasi)"""
-        messagebox.showinfo("Info", "Fitur export Excel akan diimplementasikan pada versi selanjutnya.\n"
-                                  "Gunakan fitur cetak untuk saat ini.")
+        """Export laporan (filter yang sedang tampil) ke XLSX/CSV tanpa memuat semua baris ke memori"""
+        tanggal_awal, tanggal_akhir = self._filter
+        export_laporan_dialog(
+            self, self.db, "Laporan Penjualan", KOLOM_LAPORAN_PENJUALAN,
+            lambda: self.db.iter_laporan_penjualan(tanggal_awal, tanggal_akhir, page=2000),
+            self.export_label
+        )
 
 # Alias untuk backward compatibility
 LaporanForm = LaporanPenjualanForm
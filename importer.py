@@ -0,0 +1,222 @@
+# importer.py
+"""Import massal data master (produk, pelanggan, supplier) dari file CSV atau JSONL.
+
+File dibaca baris per baris dan disimpan per batch (executemany dalam satu
+transaksi), jadi file besar tidak perlu dimuat seluruhnya ke memori.
+
+Kolom yang dikenali:
+    produk    : kode_produk, nama_produk, nama_kategori, nama_supplier, harga_beli, harga_jual, stok
+    pelanggan : nama_pelanggan, alamat, telepon
+    supplier  : nama_supplier, alamat, telepon
+(nama kolom pendek "kode", "nama", "kategori", "supplier" juga diterima)
+
+Produk di-upsert berdasarkan kode_produk; pelanggan dan supplier selalu ditambahkan.
+
+Contoh:
+    python importer.py produk produk.csv --db toko.db
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+from database import Database, PROFIL_KONEKSI
+
+JENIS_IMPORT = ("produk", "pelanggan", "supplier")
+
+QUERY_IMPORT = {
+    "produk": """
+        INSERT INTO produk (kode_produk, nama_produk, id_kategori, id_supplier,
+                            harga_beli, harga_jual, stok)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (kode_produk) DO UPDATE SET
+            nama_produk = excluded.nama_produk,
+            id_kategori = excluded.id_kategori,
+            id_supplier = excluded.id_supplier,
+            harga_beli = excluded.harga_beli,
+            harga_jual = excluded.harga_jual,
+            stok = excluded.stok
+    """,
+    "pelanggan": "INSERT INTO pelanggan (nama_pelanggan, alamat, telepon) VALUES (?, ?, ?)",
+    "supplier": "INSERT INTO supplier (nama_supplier, alamat, telepon) VALUES (?, ?, ?)",
+}
+
+
+def baca_file(path):
+    """Generator (nomor_baris, dict) dari file CSV atau JSONL"""
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            for nomor, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield nomor, json.loads(line)
+                    except ValueError as e:
+                        yield nomor, ValueError(f"JSON tidak valid: {e}")
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            # Nomor baris 1 = header
+            for nomor, row in enumerate(csv.DictReader(f), 2):
+                yield nomor, row
+
+
+def ambil(row, *nama_kolom):
+    """Nilai kolom pertama yang ada di row (string kosong jika tidak ada)"""
+    for nama in nama_kolom:
+        nilai = row.get(nama)
+        if nilai is not None:
+            return str(nilai).strip()
+    return ""
+
+
+class HasilImport:
+    """Ringkasan hasil import"""
+    def __init__(self):
+        self.diproses = 0
+        self.berhasil = 0
+        self.ditolak = []       # (nomor_baris, alasan)
+        self.durasi = 0.0
+
+    @property
+    def baris_per_detik(self):
+        return self.diproses / self.durasi if self.durasi else 0.0
+
+    def __str__(self):
+        return (f"{self.diproses:,} baris diproses, {self.berhasil:,} berhasil, "
+                f"{len(self.ditolak):,} ditolak dalam {self.durasi:.1f} detik "
+                f"({self.baris_per_detik:,.0f} baris/detik)")
+
+
+class Importer:
+    """Mengimpor file CSV/JSONL ke satu tabel master dalam batch besar"""
+    def __init__(self, db, jenis, ukuran_batch=5000):
+        if jenis not in JENIS_IMPORT:
+            raise ValueError(f"Jenis import tidak dikenal: {jenis}")
+        self.db = db
+        self.jenis = jenis
+        self.ukuran_batch = ukuran_batch
+        self._kategori = {}
+        self._supplier = {}
+        if jenis == "produk":
+            # Lookup nama -> id di memori, diisi sekali di awal
+            self._kategori = {k[1]: k[0] for k in db.get_all_kategori()}
+            for s in db.get_all_supplier():
+                self._supplier.setdefault(s[1], s[0])
+
+    def id_kategori(self, nama):
+        """id kategori dari nama; kategori baru dibuat otomatis"""
+        if not nama:
+            return None
+        if nama not in self._kategori:
+            row = self.db.add_kategori(nama)
+            if not row:
+                raise ValueError(f"kategori '{nama}' tidak dapat dibuat")
+            self._kategori[nama] = row[0]
+        return self._kategori[nama]
+
+    def id_supplier(self, nama):
+        """id supplier dari nama; supplier baru dibuat otomatis"""
+        if not nama:
+            return None
+        if nama not in self._supplier:
+            row = self.db.add_supplier(nama)
+            if not row:
+                raise ValueError(f"supplier '{nama}' tidak dapat dibuat")
+            self._supplier[nama] = row[0]
+        return self._supplier[nama]
+
+    def ubah_baris(self, row):
+        """Mengubah satu baris file menjadi parameter query; ValueError jika tidak valid"""
+        if self.jenis == "produk":
+            kode = ambil(row, "kode_produk", "kode")
+            nama = ambil(row, "nama_produk", "nama")
+            if not kode or not nama:
+                raise ValueError("kode_produk dan nama_produk harus diisi")
+            try:
+                harga_beli = float(ambil(row, "harga_beli") or 0)
+                harga_jual = float(ambil(row, "harga_jual") or 0)
+                stok = int(float(ambil(row, "stok") or 0))
+            except ValueError:
+                raise ValueError("harga dan stok harus berupa angka")
+            return (kode, nama,
+                    self.id_kategori(ambil(row, "nama_kategori", "kategori")),
+                    self.id_supplier(ambil(row, "nama_supplier", "supplier")),
+                    harga_beli, harga_jual, stok)
+
+        nama = ambil(row, f"nama_{self.jenis}", "nama")
+        if not nama:
+            raise ValueError(f"nama_{self.jenis} harus diisi")
+        return (nama, ambil(row, "alamat"), ambil(row, "telepon"))
+
+    def jalankan(self, path, progress=None):
+        """Mengimpor file, progress(hasil) dipanggil setiap satu batch selesai"""
+        hasil = HasilImport()
+        mulai = time.perf_counter()
+        batch, nomor_batch = [], []
+
+        def simpan():
+            ditolak = self.db.execute_batch(QUERY_IMPORT[self.jenis], batch)
+            hasil.berhasil += len(batch) - len(ditolak)
+            hasil.ditolak.extend((nomor_batch[i], pesan) for i, pesan in ditolak)
+            batch.clear()
+            nomor_batch.clear()
+            hasil.durasi = time.perf_counter() - mulai
+            if progress:
+                progress(hasil)
+
+        for nomor, row in baca_file(path):
+            hasil.diproses += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                batch.append(self.ubah_baris(row))
+                nomor_batch.append(nomor)
+            except ValueError as e:
+                hasil.ditolak.append((nomor, str(e)))
+            if len(batch) >= self.ukuran_batch:
+                simpan()
+        if batch:
+            simpan()
+        if self.jenis == "produk" and hasil.berhasil:
+            self.db.kabarkan_stok(None)
+
+        hasil.durasi = time.perf_counter() - mulai
+        return hasil
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import massal data master toko dari CSV/JSONL")
+    parser.add_argument("jenis", choices=JENIS_IMPORT)
+    parser.add_argument("file")
+    parser.add_argument("--db", default="toko.db")
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--profil", default="bulk-import", choices=list(PROFIL_KONEKSI))
+    parser.add_argument("--tolak", help="Simpan baris yang ditolak ke file CSV ini")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        parser.error(f"File tidak ditemukan: {args.file}")
+
+    db = Database(args.db, profil=args.profil)
+    try:
+        importer = Importer(db, args.jenis, ukuran_batch=args.batch)
+        hasil = importer.jalankan(args.file, progress=lambda h: print(
+            f"\r{h.diproses:,} baris ({h.baris_per_detik:,.0f} baris/detik)", end="", flush=True))
+        print()
+    finally:
+        db.close()
+
+    print(hasil)
+    for nomor, alasan in hasil.ditolak[:20]:
+        print(f"  baris {nomor}: {alasan}")
+    if len(hasil.ditolak) > 20:
+        print(f"  ... dan {len(hasil.ditolak) - 20:,} baris lain")
+    if args.tolak and hasil.ditolak:
+        with open(args.tolak, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["baris", "alasan"])
+            writer.writerows(hasil.ditolak)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# klien.py
+"""Klien server toko (server.py) dengan nama method yang sama seperti Database.
+
+DatabaseKlien bisa menggantikan Database di App dan form Tk (atur variabel
+lingkungan TOKO_SERVER=http://host:port, dan TOKO_TOKEN jika server memakai
+token). Setiap thread memakai koneksi HTTP/1.1 sendiri yang dipakai ulang
+(keep-alive); beberapa panggilan bisa dikirim dalam satu request lewat batch().
+
+Kabar perubahan stok dari terminal lain ikut di setiap balasan server dan
+diteruskan ke pendengar pantau_stok() seperti pada Database.
+"""
+import http.client
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from database import Database, ProductCatalog
+from server import METODE_BACA, METODE_SERVER, PORT_DEFAULT, buka
+
+
+class ServerError(Exception):
+    """Method gagal dijalankan di server toko"""
+
+
+class DatabaseKlien:
+    def __init__(self, url, timeout=30, jumlah_worker=2, token=None):
+        bagian = urlsplit(url if "://" in url else f"http://{url}")
+        self.host = bagian.hostname
+        self.port = bagian.port or PORT_DEFAULT
+        self.timeout = timeout
+        self._header = {"Content-Type": "application/json"}
+        token = token if token is not None else os.environ.get("TOKO_TOKEN")
+        if token:
+            self._header["X-Token-Toko"] = token
+        self.db_name = url
+        self._lokal = threading.local()
+        self._lock = threading.Lock()
+        self._koneksi_semua = []
+        self._seq = None            # nomor kabar stok terakhir dari server
+        self._pendengar_stok = []
+        self.executor = ThreadPoolExecutor(max_workers=jumlah_worker, thread_name_prefix="db-klien")
+
+        # Cache katalog produk bersama, diisi lewat server
+        self.katalog = ProductCatalog(self)
+
+    # Bagian Database yang tidak menyentuh SQLite dipakai apa adanya
+    submit = Database.submit
+    _pantau_future = Database._pantau_future
+    pantau_stok = Database.pantau_stok
+    lepas_pantau_stok = Database.lepas_pantau_stok
+    kabarkan_stok = Database.kabarkan_stok
+    iter_laporan_penjualan = Database.iter_laporan_penjualan
+    iter_laporan_stok = Database.iter_laporan_stok
+
+    def _koneksi(self):
+        """Koneksi HTTP milik thread ini (dibuka sekali, lalu dipakai ulang)"""
+        conn = getattr(self._lokal, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._lokal.conn = conn
+            with self._lock:
+                self._koneksi_semua.append(conn)
+        return conn
+
+    def _kirim(self, panggilan):
+        """Mengirim satu request berisi daftar panggilan, mengembalikan hasil mentahnya"""
+        body = json.dumps({"panggilan": panggilan, "sejak": self._seq}).encode("utf-8")
+        # Hanya request baca yang aman diulang jika koneksi keep-alive terputus
+        ulang = all(p["metode"] in METODE_BACA for p in panggilan)
+        while True:
+            conn = self._koneksi()
+            try:
+                conn.request("POST", "/rpc", body, self._header)
+                respon = conn.getresponse()
+                data = respon.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._lokal.conn = None
+                if not ulang:
+                    raise
+                ulang = False
+
+        isi = json.loads(data)
+        if respon.status != 200:
+            raise ServerError(isi.get("error", respon.reason))
+        self._terima_kabar(isi["seq"], isi["kabar"])
+        return isi["hasil"]
+
+    def _terima_kabar(self, seq, kabar):
+        with self._lock:
+            lama = self._seq
+            if lama is not None and seq <= lama:
+                return  # balasan yang lebih lama dari yang sudah diterima thread lain
+            self._seq = seq
+        if lama is not None and (kabar is None or kabar):
+            self.kabarkan_stok(kabar)
+
+    @staticmethod
+    def _nilai(metode, hasil):
+        if "error" in hasil:
+            raise ServerError(f"{metode}: {hasil['error']}")
+        return buka(hasil["nilai"])
+
+    def panggil(self, metode, *args, **kwargs):
+        """Memanggil satu method Database di server"""
+        hasil = self._kirim([{"metode": metode, "args": args, "kwargs": kwargs}])[0]
+        return self._nilai(metode, hasil)
+
+    def batch(self, panggilan):
+        """Menjalankan beberapa panggilan (metode, args, kwargs) dalam satu request.
+
+        Panggilan dijalankan berurutan di server; mengembalikan list hasil
+        sesuai urutan. ServerError dilempar untuk panggilan pertama yang gagal.
+        """
+        kirim = [{"metode": metode, "args": list(args), "kwargs": kwargs}
+                 for metode, args, kwargs in panggilan]
+        return [self._nilai(p["metode"], h) for p, h in zip(kirim, self._kirim(kirim))]
+
+    def __getattr__(self, nama):
+        if nama not in METODE_SERVER:
+            raise AttributeError(f"'{nama}' tidak tersedia lewat server toko")
+        def fungsi(*args, **kwargs):
+            return self.panggil(nama, *args, **kwargs)
+        fungsi.__name__ = nama
+        return fungsi
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for conn in self._koneksi_semua:
+                conn.close()
+            self._koneksi_semua = []
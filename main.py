@@ -1,12 +1,35 @@
 # main.py
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox, font
 from datetime import datetime
+from antrian import AntrianCheckout
 from database import Database
+from klien import DatabaseKlien
 from forms import (
     PelangganForm, ProdukForm, KategoriForm, SupplierForm, KaryawanForm,
-    PenjualanForm, PembelianForm, ReturPenjualanForm
+    PenjualanForm, PembelianForm, ReturPenjualanForm, ImportForm, LaporanPenjualanForm,
+    export_laporan_dialog, PendengarStok, ERROR_DATA
 )
+from exporter import KOLOM_LAPORAN_STOK
+
+# Backup: folder tujuan dan jumlah backup terbaru yang disimpan
+BACKUP_FOLDER = "backup"
+BACKUP_SIMPAN = 10
+
+# File antrian checkout offline milik terminal ini (lihat antrian.py)
+ANTRIAN_FILE = "antrian_kasir.db"
+
+# Kartu statistik dashboard: (kunci snapshot, judul, icon), dan interval refresh otomatis
+KARTU_DASHBOARD = [
+    ("total_pelanggan", "Total Pelanggan", "👥"),
+    ("total_produk", "Total Produk", "📦"),
+    ("total_stok", "Total Stok", "📊"),
+    ("penjualan_hari_ini", "Penjualan Hari Ini", "💰"),
+]
+DASHBOARD_REFRESH_MS = 15000
+# Interval pemeriksaan status antrian checkout (file lokal, murah dibaca)
+STATUS_ANTRIAN_MS = 2000
 
 class LoginWindow(tk.Toplevel):
     """Window untuk login"""
@@ -173,7 +196,12 @@ class LoginWindow(tk.Toplevel):
         print(f"Login attempt: {username}")
         
         # Gunakan method baru yang return dictionary
-        user_data = self.db.verify_login_dict(username, password)
+        try:
+            user_data = self.db.verify_login_dict(username, password)
+        except ERROR_DATA as e:
+            messagebox.showerror("Error", f"Gagal memeriksa login: {e}")
+            self.login_btn.config(state="normal", text="Login")
+            return
         
         if user_data:
             print(f"Login successful: {user_data}")
@@ -213,8 +241,17 @@ class App(tk.Tk):
         self.geometry("900x600")
         self.minsize(800, 500)
         
-        # Inisialisasi database
-        self.db = Database(db_name="toko.db")
+        # Inisialisasi database (profil koneksi bisa diatur lewat TOKO_PROFIL_DB);
+        # TOKO_SERVER=http://host:port memakai server toko (server.py) bersama terminal lain
+        if os.environ.get("TOKO_SERVER"):
+            self.db = DatabaseKlien(os.environ["TOKO_SERVER"])
+        else:
+            self.db = Database(db_name="toko.db",
+                               profil=os.environ.get("TOKO_PROFIL_DB", "pos-terminal"))
+
+        # Penjualan yang tidak bisa langsung masuk (database terkunci, server tidak terjangkau)
+        # dicatat ke antrian lokal lalu dikirim ke database di latar belakang
+        self.antrian = AntrianCheckout(self.db, ANTRIAN_FILE)
         
         # User belum login
         self.current_user = None
@@ -299,7 +336,8 @@ class App(tk.Tk):
         transaksi_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Transaksi", menu=transaksi_menu)
         transaksi_menu.add_command(label="Penjualan", 
-                                  command=lambda: PenjualanForm(self, self.db, self.current_user))
+                                  command=lambda: PenjualanForm(self, self.db, self.current_user,
+                                                                antrian=self.antrian))
         transaksi_menu.add_command(label="Pembelian", 
                                   command=lambda: PembelianForm(self, self.db, self.current_user))
         transaksi_menu.add_command(label="Retur Penjualan", 
@@ -308,15 +346,19 @@ class App(tk.Tk):
         # Menu Laporan
         laporan_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Laporan", menu=laporan_menu)
-        laporan_menu.add_command(label="Laporan Penjualan", command=self.show_laporan_sederhana)
+        laporan_menu.add_command(label="Laporan Penjualan", command=self.show_laporan_penjualan)
         laporan_menu.add_command(label="Laporan Stok", command=self.show_laporan_stok)
         laporan_menu.add_command(label="Produk Terlaris", command=self.show_produk_terlaris)
         
         # Menu Tools
         tools_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Tools", menu=tools_menu)
-        tools_menu.add_command(label="Backup Database", command=self.backup_database)
-        tools_menu.add_command(label="Restore Database", command=self.restore_database)
+        # Import, backup, dan restore butuh akses langsung ke file database (tidak ada di mode server)
+        if isinstance(self.db, Database):
+            tools_menu.add_command(label="Import Data Master", command=lambda: ImportForm(self, self.db))
+            tools_menu.add_command(label="Backup Database", command=self.backup_database)
+            tools_menu.add_command(label="Restore Database", command=self.restore_database)
+        tools_menu.add_command(label="Hitung Ulang Ringkasan Penjualan", command=self.rebuild_ringkasan)
         
         # Menu Bantuan
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -324,61 +366,10 @@ class App(tk.Tk):
         help_menu.add_command(label="Tentang", command=self.show_about)
         help_menu.add_command(label="Panduan Penggunaan", command=self.show_help)
 
-    def show_laporan_sederhana(self):
-        """Menampilkan laporan penjualan sederhana"""
-        from tkinter import Toplevel
-        import tkinter.ttk as ttk
-        
-        laporan_window = Toplevel(self)
-        laporan_window.title("Laporan Penjualan")
-        laporan_window.geometry("800x500")
-        
-        # Treeview
-        frame = ttk.Frame(laporan_window, padding=10)
-        frame.pack(fill="both", expand=True)
-        
-        columns = ('id', 'tanggal', 'pelanggan', 'karyawan', 'total')
-        tree = ttk.Treeview(frame, columns=columns, show='headings')
-        
-        tree.heading('id', text='ID')
-        tree.heading('tanggal', text='Tanggal')
-        tree.heading('pelanggan', text='Pelanggan')
-        tree.heading('karyawan', text='Kasir')
-        tree.heading('total', text='Total')
-        
-        tree.column('id', width=50, anchor='center')
-        tree.column('tanggal', width=100)
-        tree.column('pelanggan', width=150)
-        tree.column('karyawan', width=100)
-        tree.column('total', width=120, anchor='e')
-        
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        
-        tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        
-        # Load data
-        try:
-            data = self.db.get_laporan_penjualan()
-            for row in data:
-                formatted_row = list(row)
-
-                # total_harga ada di index ke-5
-                if len(formatted_row) > 5:
-                    total = formatted_row[5]
-                    try:
-                        total = float(total)
-                    except:
-                        total = 0
-                    formatted_row[5] = f"Rp {total:,.2f}"
-
-                tree.insert('', 'end', values=formatted_row)
+    def show_laporan_penjualan(self):
+        """Menampilkan laporan penjualan (treeview virtual, data dimuat per halaman)"""
+        LaporanPenjualanForm(self, self.db)
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Gagal memuat data: {e}")
-            
     def create_main_layout(self):
         """Membuat layout dashboard utama"""
         try:
@@ -426,13 +417,12 @@ class App(tk.Tk):
             quick_menu_frame = ttk.LabelFrame(left_frame, text="Menu Cepat", padding=10)
             quick_menu_frame.pack(fill="x")
             
-            # PERBAIKAN: Ganti LaporanForm dengan show_laporan_sederhana
             ttk.Button(quick_menu_frame, text="📦 Transaksi Penjualan", 
-                      command=lambda: PenjualanForm(self, self.db, self.current_user),
+                      command=lambda: PenjualanForm(self, self.db, self.current_user, antrian=self.antrian),
                       style="Quick.TButton").pack(fill="x", pady=5)
             
             ttk.Button(quick_menu_frame, text="📊 Laporan Penjualan", 
-                      command=self.show_laporan_sederhana,  # PERBAIKAN DI SINI
+                      command=self.show_laporan_penjualan,
                       style="Quick.TButton").pack(fill="x", pady=5)
             
             ttk.Button(quick_menu_frame, text="📋 Master Produk", 
@@ -462,50 +452,26 @@ class App(tk.Tk):
             stats_frame = ttk.Frame(right_frame)
             stats_frame.pack(fill="x", pady=10)
             
-            # Card 1: Total Pelanggan
+            # Semua angka kartu diambil dengan satu query (lihat get_dashboard_snapshot);
+            # jika gagal kartu menampilkan "Error" dan refresh otomatis mencoba lagi
             try:
-                total_pelanggan = self.db.get_total_pelanggan()
-                card1 = self.create_stat_card(stats_frame, "Total Pelanggan", 
-                                             total_pelanggan, "👥", 0)
-                card1.pack(side="left", padx=5, fill="both", expand=True)
-            except:
-                card1 = self.create_stat_card(stats_frame, "Total Pelanggan", 
-                                             "Error", "👥", 0)
-                card1.pack(side="left", padx=5, fill="both", expand=True)
-            
-            # Card 2: Total Produk
-            try:
-                total_produk = self.db.get_total_produk()
-                card2 = self.create_stat_card(stats_frame, "Total Produk", 
-                                             total_produk, "📦", 1)
-                card2.pack(side="left", padx=5, fill="both", expand=True)
-            except:
-                card2 = self.create_stat_card(stats_frame, "Total Produk", 
-                                             "Error", "📦", 1)
-                card2.pack(side="left", padx=5, fill="both", expand=True)
-            
-            # Card 3: Total Stok
-            try:
-                total_stok = self.db.get_total_stok() or 0
-                card3 = self.create_stat_card(stats_frame, "Total Stok", 
-                                             total_stok, "📊", 2)
-                card3.pack(side="left", padx=5, fill="both", expand=True)
-            except:
-                card3 = self.create_stat_card(stats_frame, "Total Stok", 
-                                             "Error", "📊", 2)
-                card3.pack(side="left", padx=5, fill="both", expand=True)
-            
-            # Card 4: Penjualan Hari Ini
-            try:
-                penjualan_hari_ini = self.db.get_total_penjualan_hari_ini() or 0
-                card4 = self.create_stat_card(stats_frame, "Penjualan Hari Ini", 
-                                             f"Rp {penjualan_hari_ini:,.0f}", "💰", 3)
-                card4.pack(side="left", padx=5, fill="both", expand=True)
-            except:
-                card4 = self.create_stat_card(stats_frame, "Penjualan Hari Ini", 
-                                             "Rp 0", "💰", 3)
-                card4.pack(side="left", padx=5, fill="both", expand=True)
+                snapshot = self.db.get_dashboard_snapshot() or {}
+            except ERROR_DATA as e:
+                messagebox.showwarning("Peringatan", f"Gagal memuat statistik dashboard: {e}")
+                snapshot = {}
+            self._snapshot_dashboard = snapshot
+            self.kartu_dashboard = {}
+            for i, (kunci, judul, icon) in enumerate(KARTU_DASHBOARD):
+                card = self.create_stat_card(stats_frame, judul,
+                                             self.format_kartu(kunci, snapshot), icon, i)
+                card.pack(side="left", padx=5, fill="both", expand=True)
+                self.kartu_dashboard[kunci] = card.value_label
             
+            # Penjualan antrian yang belum masuk/ditolak dan penjualan yang perlu dicek
+            self.status_antrian_label = ttk.Label(right_frame, text="", font=("Arial", 10, "bold"))
+            self.status_antrian_label.pack(fill="x")
+            self.perbarui_status_antrian()
+
             # --- Produk Stok Rendah ---
             stok_frame = ttk.LabelFrame(right_frame, text="⚠️ Produk Stok Rendah", padding=10)
             stok_frame.pack(fill="both", expand=True, pady=10)
@@ -530,8 +496,9 @@ class App(tk.Tk):
             self.stok_tree.pack(side="left", fill="both", expand=True)
             scrollbar.pack(side="right", fill="y")
             
-            # Load data stok rendah
+            # Load data stok rendah, selanjutnya hanya baris yang stoknya berubah diperbarui
             self.load_stok_rendah()
+            PendengarStok(self.stok_tree, self.db, self.perbarui_stok_rendah)
             
             # --- Recent Activity ---
             activity_frame = ttk.LabelFrame(right_frame, text="📝 Aktifitas Terakhir", padding=10)
@@ -551,6 +518,8 @@ class App(tk.Tk):
             style.configure("Quick.TButton", font=("Arial", 10))
             style.configure("Card.TLabel", font=("Arial", 12))
             style.configure("CardValue.TLabel", font=("Arial", 18, "bold"))
+
+            self.jadwalkan_refresh_dashboard()
             
         except Exception as e:
             messagebox.showerror("Error", f"Gagal membuat layout: {e}")
@@ -580,44 +549,144 @@ class App(tk.Tk):
         
         title_label = ttk.Label(content_frame, text=title, font=("Arial", 10))
         title_label.pack()
+
+        # Disimpan agar nilainya bisa diperbarui tanpa membuat ulang card
+        card.value_label = value_label
         
         return card
+
+    @staticmethod
+    def format_kartu(kunci, snapshot):
+        """Teks nilai kartu dashboard dari snapshot"""
+        if kunci not in snapshot:
+            return "Error"
+        if kunci == "penjualan_hari_ini":
+            return f"Rp {snapshot[kunci] or 0:,.0f}"
+        return snapshot[kunci] or 0
+
+    def perbarui_status_antrian(self):
+        """Menampilkan jumlah penjualan antrian menunggu/gagal dan penjualan perlu dicek"""
+        if getattr(self, '_status_after', None):
+            self.after_cancel(self._status_after)  # hanya satu jadwal (mis. setelah login ulang)
+        self._status_after = None
+        label = getattr(self, 'status_antrian_label', None)
+        if not self.current_user or label is None or not label.winfo_exists():
+            return
+        menunggu = self.antrian.jumlah_menunggu()
+        gagal = self.antrian.jumlah_gagal()
+        perlu_cek = (self._snapshot_dashboard or {}).get('jumlah_perlu_cek') or 0
+        teks = []
+        if menunggu:
+            teks.append(f"{menunggu} transaksi menunggu sinkron")
+        if gagal:
+            teks.append(f"{gagal} transaksi ditolak database")
+        if perlu_cek:
+            teks.append(f"{perlu_cek} penjualan perlu dicek (stok minus)")
+        label.config(text="⚠️ " + ", ".join(teks) if teks else "",
+                     foreground="red" if gagal or perlu_cek else "gray")
+        self._status_after = self.after(STATUS_ANTRIAN_MS, self.perbarui_status_antrian)
+
+    def jadwalkan_refresh_dashboard(self):
+        """Menjadwalkan refresh otomatis kartu dashboard berikutnya"""
+        self._dashboard_after = self.after(DASHBOARD_REFRESH_MS, self.refresh_kartu_dashboard)
+
+    def refresh_kartu_dashboard(self, jadwalkan=True):
+        """Memperbarui nilai kartu dashboard (query di thread worker, widget tidak dibuat ulang)"""
+        if jadwalkan:
+            self._dashboard_after = None
+        if not self.current_user or not getattr(self, 'kartu_dashboard', None):
+            return
+
+        def tampilkan(snapshot):
+            label_ada = all(label.winfo_exists() for label in self.kartu_dashboard.values())
+            if not self.current_user or not label_ada:
+                return
+            if snapshot:
+                for kunci, label in self.kartu_dashboard.items():
+                    label.config(text=str(self.format_kartu(kunci, snapshot)))
+                # Perubahan dari proses ini sudah diterapkan lewat PendengarStok; daftar
+                # dimuat ulang hanya jika jumlahnya tidak cocok (mis. diubah terminal lain)
+                self._snapshot_dashboard = snapshot
+                if snapshot['jumlah_stok_rendah'] != len(self.baris_stok_rendah()):
+                    self.load_stok_rendah()
+            if jadwalkan:
+                self.jadwalkan_refresh_dashboard()
+
+        def gagal(error):
+            print(f"Error refresh dashboard: {error}")
+            if jadwalkan and self.current_user:
+                self.jadwalkan_refresh_dashboard()
+
+        self.db.submit(self.db.get_dashboard_snapshot, widget=self, callback=tampilkan, errback=gagal)
     
     def load_stok_rendah(self):
-        """Memuat data produk dengan stok rendah"""
+        """Memuat data produk dengan stok rendah (stok <= stok minimum produk)"""
         try:
             # Hapus data lama
-            for item in self.stok_tree.get_children():
-                self.stok_tree.delete(item)
-            
-            produk_stok_rendah = self.db.get_produk_dengan_stok_rendah(batas=10)
-            
-            if produk_stok_rendah:
-                for produk in produk_stok_rendah:
-
-                    # AMANKAN harga
-                    harga = produk[5] if len(produk) > 5 else 0
-                    try:
-                        harga = float(harga)
-                    except:
-                        harga = 0
+            self.stok_tree.delete(*self.stok_tree.get_children())
 
-                    self.stok_tree.insert('', 'end', values=(
-                        produk[1] if len(produk) > 1 else "",  # kode
-                        produk[2] if len(produk) > 2 else "",  # nama
-                        produk[3] if len(produk) > 3 else 0,   # stok
-                        f"Rp {harga:,.0f}"
-                    ))
-            else:
-                self.stok_tree.insert('', 'end', values=("", "Tidak ada produk stok rendah", "", ""))
+            for produk in self.db.get_produk_dengan_stok_rendah():
+                self.stok_tree.insert('', 'end', iid=str(produk[0]), values=self.nilai_stok_rendah(produk))
+            self.tandai_stok_rendah_kosong()
 
         except Exception as e:
             self.stok_tree.insert('', 'end', values=("", "Error memuat data", "", ""))
 
+    @staticmethod
+    def nilai_stok_rendah(produk):
+        """Nilai kolom treeview stok rendah dari baris get_produk_dengan_stok_rendah"""
+        # AMANKAN harga
+        try:
+            harga = float(produk.harga_jual or 0)
+        except (TypeError, ValueError):
+            harga = 0
+        return (produk.kode_produk, produk.nama_produk, produk.stok, f"Rp {harga:,.0f}")
+
+    def baris_stok_rendah(self):
+        """iid baris produk di treeview stok rendah (tanpa baris penanda kosong)"""
+        return [iid for iid in self.stok_tree.get_children() if iid != "kosong"]
+
+    def tandai_stok_rendah_kosong(self):
+        """Menampilkan baris penanda jika tidak ada produk stok rendah"""
+        ada = bool(self.baris_stok_rendah())
+        if ada and self.stok_tree.exists("kosong"):
+            self.stok_tree.delete("kosong")
+        elif not ada and not self.stok_tree.exists("kosong"):
+            self.stok_tree.insert('', 'end', iid="kosong", values=("", "Tidak ada produk stok rendah", "", ""))
+
+    def perbarui_stok_rendah(self, ids):
+        """Memperbarui treeview stok rendah hanya untuk produk yang stoknya berubah"""
+        if ids is None:
+            self.load_stok_rendah()
+            return
+        rendah = {row[0]: row for row in self.db.get_produk_dengan_stok_rendah(ids=ids)}
+        for id_produk in ids:
+            iid = str(id_produk)
+            row = rendah.get(id_produk)
+            if row is None:
+                # Stok sudah di atas stok minimum (atau produk dihapus)
+                if self.stok_tree.exists(iid):
+                    self.stok_tree.delete(iid)
+                continue
+
+            # Daftar tetap urut stok terkecil
+            posisi = 0
+            for lain in self.baris_stok_rendah():
+                if lain != iid:
+                    if int(self.stok_tree.item(lain, 'values')[2]) > row.stok:
+                        break
+                    posisi += 1
+            if self.stok_tree.exists(iid):
+                self.stok_tree.item(iid, values=self.nilai_stok_rendah(row))
+                self.stok_tree.move(iid, '', posisi)
+            else:
+                self.stok_tree.insert('', posisi, iid=iid, values=self.nilai_stok_rendah(row))
+        self.tandai_stok_rendah_kosong()
+
     
     def refresh_dashboard(self):
         """Refresh data dashboard"""
-        # Untuk sekarang, cukup reload stok rendah
+        self.refresh_kartu_dashboard(jadwalkan=False)
         self.load_stok_rendah()
         messagebox.showinfo("Refresh", "Dashboard telah di-refresh!")
     
@@ -653,18 +722,32 @@ class App(tk.Tk):
         tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # Load data
-        try:
-            data = self.db.get_laporan_stok()
+        # Total
+        total_frame = ttk.Frame(laporan_window)
+        total_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Label(total_frame, text="Memuat data...",
+                 font=("Arial", 10)).pack(side="left", padx=10)
+
+        # Export streaming (CSV/XLSX) di thread worker
+        export_frame = ttk.Frame(laporan_window)
+        export_frame.pack(fill="x", padx=10, pady=(0, 10))
+        export_label = ttk.Label(export_frame, text="")
+        ttk.Button(export_frame, text="Export",
+                   command=lambda: export_laporan_dialog(
+                       laporan_window, self.db, "Laporan Stok", KOLOM_LAPORAN_STOK,
+                       self.db.iter_laporan_stok, export_label
+                   )).pack(side="left", padx=5)
+        export_label.pack(side="left", padx=10)
+
+        # Load data (query berjalan di thread worker, hasil ditampilkan lewat after())
+        def tampilkan(data):
+            for widget in total_frame.winfo_children():
+                widget.destroy()
+
             if data:
                 for row in data:
                     tree.insert('', 'end', values=row)
-            
-            # Total
-            total_frame = ttk.Frame(laporan_window)
-            total_frame.pack(fill="x", padx=10, pady=5)
-            
-            if data:
+
                 total_stok = sum(row[6] for row in data if len(row) > 6 and row[6])
                 total_nilai = sum(row[7] for row in data if len(row) > 7 and row[7])
                 
@@ -674,8 +757,9 @@ class App(tk.Tk):
                          font=("Arial", 10)).pack(side="left", padx=10)
                 ttk.Label(total_frame, text=f"Total Nilai Stok: Rp {total_nilai:,.0f}", 
                          font=("Arial", 10, "bold")).pack(side="left", padx=10)
-        except Exception as e:
-            messagebox.showerror("Error", f"Gagal memuat laporan stok: {e}")
+
+        self.db.submit(self.db.get_laporan_stok, widget=laporan_window, callback=tampilkan,
+                       errback=lambda e: messagebox.showerror("Error", f"Gagal memuat laporan stok: {e}"))
     
     def show_produk_terlaris(self):
         """Menampilkan produk terlaris"""
@@ -684,7 +768,30 @@ class App(tk.Tk):
         
         laporan_window = Toplevel(self)
         laporan_window.title("Laporan Produk Terlaris")
-        laporan_window.geometry("600x400")
+        laporan_window.geometry("650x450")
+
+        # Filter periode: hari ini, 7/30 hari terakhir, semua, atau rentang tanggal sendiri
+        filter_frame = ttk.Frame(laporan_window, padding=(10, 10, 10, 0))
+        filter_frame.pack(fill="x")
+
+        pilihan_periode = {
+            "Semua": "semua",
+            "Hari Ini": "hari_ini",
+            "7 Hari Terakhir": "7_hari",
+            "30 Hari Terakhir": "30_hari",
+            "Rentang Tanggal": None,
+        }
+        ttk.Label(filter_frame, text="Periode:").pack(side="left")
+        periode_cb = ttk.Combobox(filter_frame, values=list(pilihan_periode), width=17, state="readonly")
+        periode_cb.set("Semua")
+        periode_cb.pack(side="left", padx=5)
+        tanggal_awal_entry = ttk.Entry(filter_frame, width=11)
+        tanggal_awal_entry.insert(0, datetime.now().strftime("%Y-%m-01"))
+        tanggal_awal_entry.pack(side="left", padx=(10, 2))
+        ttk.Label(filter_frame, text="s/d").pack(side="left")
+        tanggal_akhir_entry = ttk.Entry(filter_frame, width=11)
+        tanggal_akhir_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        tanggal_akhir_entry.pack(side="left", padx=2)
         
         # Treeview
         frame = ttk.Frame(laporan_window, padding=10)
@@ -708,9 +815,9 @@ class App(tk.Tk):
         tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # Load data
-        try:
-            data = self.db.get_produk_terlaris(limit=20)
+        # Load data (query berjalan di thread worker, hasil ditampilkan lewat after())
+        def tampilkan(data):
+            tree.delete(*tree.get_children())
             if data:
                 for row in data:
                     # amankan nilai pendapatan
@@ -726,34 +833,197 @@ class App(tk.Tk):
                         f"Rp {pendapatan:,.0f}"                  # pendapatan
                     ))
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Gagal memuat produk terlaris: {e}")
+        def muat(event=None):
+            periode = pilihan_periode[periode_cb.get()]
+            rentang = {}
+            if periode is None:
+                rentang = {'tanggal_awal': tanggal_awal_entry.get().strip(),
+                           'tanggal_akhir': tanggal_akhir_entry.get().strip()}
+                if not all(rentang.values()):
+                    messagebox.showwarning("Peringatan", "Isi tanggal awal dan akhir", parent=laporan_window)
+                    return
+            self.db.submit(self.db.get_produk_terlaris, limit=20, periode=periode or "semua", **rentang,
+                           widget=laporan_window, callback=tampilkan,
+                           errback=lambda e: messagebox.showerror("Error", f"Gagal memuat produk terlaris: {e}"))
+
+        periode_cb.bind("<<ComboboxSelected>>", muat)
+        ttk.Button(filter_frame, text="Tampilkan", command=muat).pack(side="left", padx=10)
+        muat()
     
     def backup_database(self):
-        """Backup database"""
-        from datetime import datetime
-        import os
-        
-        try:
-            if not os.path.exists("backup"):
-                os.makedirs("backup")
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"backup/toko_backup_{timestamp}.db"
-            
-            if self.db.backup_database(backup_file):
-                messagebox.showinfo("Backup Berhasil", 
-                                  f"Database berhasil di-backup ke:\n{backup_file}")
+        """Backup database online (SQLite backup API) di thread worker dengan progress"""
+        from tkinter import Toplevel
+        import time
+
+        backup_window = Toplevel(self)
+        backup_window.title("Backup Database")
+        backup_window.geometry("420x200")
+        backup_window.resizable(False, False)
+
+        frame = ttk.Frame(backup_window, padding=15)
+        frame.pack(fill="both", expand=True)
+
+        kompres_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(frame, text="Kompres backup (gzip)", variable=kompres_var).pack(anchor="w")
+        ttk.Label(frame, text=f"Menyimpan {BACKUP_SIMPAN} backup terbaru di folder '{BACKUP_FOLDER}'",
+                  font=("Arial", 9)).pack(anchor="w", pady=(0, 10))
+
+        progress_bar = ttk.Progressbar(frame, length=380, mode="determinate")
+        progress_bar.pack(pady=5)
+        status_label = ttk.Label(frame, text="Siap")
+        status_label.pack(pady=5)
+
+        progres = {'sisa': 0, 'total': 0, 'selesai': False}
+
+        def set_progres(sisa, total):
+            # Dipanggil dari thread worker setiap satu langkah backup
+            progres['sisa'], progres['total'] = sisa, total
+
+        def tampilkan_progres():
+            if progres['selesai'] or not backup_window.winfo_exists():
+                return
+            if progres['total']:
+                persen = 100 * (progres['total'] - progres['sisa']) / progres['total']
+                progress_bar['value'] = persen
+                status_label.config(text=f"Menyalin... {persen:.0f}% ({progres['total']:,} page)")
+            backup_window.after(100, tampilkan_progres)
+
+        def selesai(hasil):
+            progres['selesai'] = True
+            path, durasi = hasil
+            mulai_button.config(state="normal")
+            if path:
+                progress_bar['value'] = 100
+                status_label.config(text=f"Selesai dalam {durasi:.1f} detik")
+                messagebox.showinfo("Backup Berhasil",
+                                    f"Database berhasil di-backup ke:\n{path}", parent=backup_window)
             else:
-                messagebox.showerror("Backup Gagal", "Gagal melakukan backup database")
-        except Exception as e:
-            messagebox.showerror("Error", f"Gagal backup: {e}")
+                status_label.config(text="Backup gagal")
+                messagebox.showerror("Backup Gagal", "Gagal melakukan backup database", parent=backup_window)
+
+        def gagal(error):
+            progres['selesai'] = True
+            mulai_button.config(state="normal")
+            status_label.config(text="Backup gagal")
+            messagebox.showerror("Error", f"Gagal backup: {error}", parent=backup_window)
+
+        def jalankan(backup_file, kompres):
+            mulai = time.perf_counter()
+            path = self.db.backup_database(backup_file, progress=set_progres,
+                                           kompres=kompres, simpan=BACKUP_SIMPAN)
+            return path, time.perf_counter() - mulai
+
+        def mulai_backup():
+            os.makedirs(BACKUP_FOLDER, exist_ok=True)
+            nama_db = os.path.splitext(os.path.basename(self.db.db_name))[0]
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            backup_file = os.path.join(BACKUP_FOLDER, f"{nama_db}_backup_{timestamp}.db")
+
+            progres.update(sisa=0, total=0, selesai=False)
+            mulai_button.config(state="disabled")
+            status_label.config(text="Memulai backup...")
+            self.db.submit(jalankan, backup_file, kompres_var.get(),
+                           widget=backup_window, callback=selesai, errback=gagal)
+            tampilkan_progres()
+
+        mulai_button = ttk.Button(frame, text="Mulai Backup", command=mulai_backup)
+        mulai_button.pack(pady=5)
     
     def restore_database(self):
-        """Restore database (simulasi)"""
-        messagebox.showinfo("Info", 
-                          "Fitur restore database akan diimplementasikan pada versi selanjutnya.\n"
-                          "Untuk saat ini, backup otomatis tersimpan di folder 'backup'.")
+        """Restore database dari file backup (diverifikasi dulu sebelum menggantikan database aktif)"""
+        from tkinter import Toplevel, filedialog
+
+        backup_file = filedialog.askopenfilename(
+            parent=self, title="Pilih File Backup",
+            initialdir=BACKUP_FOLDER if os.path.isdir(BACKUP_FOLDER) else ".",
+            filetypes=[("Backup database", "*.db *.db.gz"), ("Semua file", "*.*")]
+        )
+        if not backup_file:
+            return
+        if not messagebox.askyesno("Konfirmasi Restore",
+                                   "Database aktif akan diganti dengan isi backup:\n"
+                                   f"{backup_file}\n\nTransaksi setelah backup dibuat akan hilang. Lanjutkan?"):
+            return
+
+        restore_window = Toplevel(self)
+        restore_window.title("Restore Database")
+        restore_window.geometry("420x120")
+        restore_window.resizable(False, False)
+        restore_window.grab_set()
+
+        frame = ttk.Frame(restore_window, padding=15)
+        frame.pack(fill="both", expand=True)
+        progress_bar = ttk.Progressbar(frame, length=380, mode="determinate")
+        progress_bar.pack(pady=5)
+        status_label = ttk.Label(frame, text="Menyiapkan restore...")
+        status_label.pack(pady=5)
+
+        progres = {'sisa': 0, 'total': 0, 'selesai': False}
+
+        def set_progres(sisa, total):
+            progres['sisa'], progres['total'] = sisa, total
+
+        def tampilkan_progres():
+            if progres['selesai'] or not restore_window.winfo_exists():
+                return
+            if progres['total']:
+                persen = 100 * (progres['total'] - progres['sisa']) / progres['total']
+                progress_bar['value'] = persen
+                status_label.config(text=f"Menyalin backup... {persen:.0f}%")
+            restore_window.after(100, tampilkan_progres)
+
+        def tukar(hasil):
+            # Penukaran database dijalankan di thread Tk: pool reader dikosongkan dulu
+            # (tidak bisa dilakukan dari dalam worker pool itu sendiri)
+            if hasil is None:
+                selesai(None)
+                return
+            status_label.config(text="Menunggu query berjalan selesai...")
+            restore_window.update_idletasks()
+            selesai(self.db.tukar_restore(*hasil))
+
+        def selesai(waktu):
+            progres['selesai'] = True
+            restore_window.destroy()
+            if not waktu:
+                messagebox.showerror("Restore Gagal",
+                                     "Restore dibatalkan: file backup tidak valid atau gagal diverifikasi.\n"
+                                     "Database aktif tidak diubah.")
+                return
+            rincian = "\n".join(f"{tahap.capitalize():10}: {detik:.2f} detik" for tahap, detik in waktu.items())
+            messagebox.showinfo("Restore Berhasil",
+                                f"Database berhasil di-restore dari:\n{backup_file}\n\n{rincian}\n\n"
+                                "Tutup dan buka kembali form yang sedang terbuka.")
+            self.load_stok_rendah()
+
+        def gagal(error):
+            progres['selesai'] = True
+            restore_window.destroy()
+            messagebox.showerror("Error", f"Gagal restore: {error}")
+
+        self.db.submit(self.db.siapkan_restore, backup_file, progress=set_progres,
+                       widget=restore_window, callback=tukar, errback=gagal)
+        tampilkan_progres()
+
+    def rebuild_ringkasan(self):
+        """Menghitung ulang tabel ringkasan penjualan harian dari data transaksi"""
+        if not messagebox.askyesno("Konfirmasi",
+                                   "Hitung ulang ringkasan penjualan dari seluruh transaksi?"):
+            return
+
+        def hitung_ulang():
+            return self.db.rebuild_penjualan_harian(), self.db.rebuild_penjualan_produk()
+
+        def selesai(hasil):
+            harian, produk = hasil
+            if harian is None or produk is None:
+                messagebox.showerror("Error", "Gagal menghitung ulang ringkasan penjualan")
+                return
+            messagebox.showinfo("Sukses", f"Ringkasan penjualan dihitung ulang\n"
+                                          f"Harian: {harian:,} baris\nPer produk: {produk:,} baris")
+
+        self.db.submit(hitung_ulang, widget=self, callback=selesai,
+                       errback=lambda e: messagebox.showerror("Error", f"Gagal: {e}"))
     
     def show_about(self):
         """Menampilkan about dialog"""
@@ -797,8 +1067,11 @@ PANDUAN PENGGUNAAN:
    - Produk Terlaris: Analisis penjualan produk
 
 4. Tools:
-   - Backup: Backup database secara manual
-   - Restore: Restore dari backup (coming soon)
+   - Backup: Backup database secara manual (opsional dikompres .gz)
+   - Restore: Ganti database aktif dengan file backup (.db/.db.gz). Backup
+     dicek dulu sebelum dipakai; database lama disimpan sebagai .bak.
+     Tutup dan buka kembali form yang sedang terbuka setelah restore.
+   - Import, Backup, dan Restore hanya tersedia jika database lokal (bukan mode server)
 
 Catatan:
 • Stok otomatis berkurang saat penjualan
@@ -831,6 +1104,9 @@ Catatan:
         """Logout dari sistem"""
         if messagebox.askyesno("Konfirmasi", "Apakah Anda yakin ingin logout?"):
             self.current_user = None
+            if getattr(self, '_dashboard_after', None):
+                self.after_cancel(self._dashboard_after)
+                self._dashboard_after = None
             # Hapus semua widget
             for widget in self.winfo_children():
                 try:
@@ -844,6 +1120,7 @@ Catatan:
         """Keluar dari aplikasi"""
         if messagebox.askyesno("Konfirmasi", "Apakah Anda yakin ingin keluar dari aplikasi?"):
             try:
+                self.antrian.close()  # sisa antrian dicoba dikirim dulu
                 self.db.close()
             except:
                 pass
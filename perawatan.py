@@ -0,0 +1,44 @@
+# perawatan.py
+"""Perintah perawatan database toko dari command line.
+
+Contoh:
+    python perawatan.py --db toko.db ringkasan
+    python perawatan.py --db toko.db migrasi
+"""
+import argparse
+import time
+
+from database import Database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perawatan database toko")
+    parser.add_argument("--db", default="toko.db")
+    sub = parser.add_subparsers(dest="perintah", required=True)
+    sub.add_parser("ringkasan", help="Hitung ulang ringkasan penjualan harian dan per produk")
+    sub.add_parser("migrasi", help="Terapkan migrasi skema dan tampilkan versinya")
+
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    try:
+        if args.perintah == "ringkasan":
+            for tabel, rebuild in (("penjualan_harian", db.rebuild_penjualan_harian),
+                                   ("penjualan_produk", db.rebuild_penjualan_produk)):
+                mulai = time.perf_counter()
+                jumlah = rebuild()
+                if jumlah is None:
+                    raise SystemExit(1)
+                print(f"{tabel}: {jumlah:,} baris dalam {time.perf_counter() - mulai:.2f} detik")
+        elif args.perintah == "migrasi":
+            # Migrasi sudah dijalankan saat Database dibuka
+            for versi in db.migrasi_diterapkan:
+                print(f"Migrasi database ke versi {versi} selesai")
+            versi = db.conn.execute("PRAGMA user_version").fetchone()[0]
+            print(f"Versi skema: {versi}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+# query.py
+"""Registry query bernama untuk jalur panas database toko.
+
+Setiap query punya teks SQL tetap, jadi sqlite3 cukup mem-parse-nya sekali per
+koneksi (cache statement, lihat UKURAN_CACHE_STATEMENT), dan tipe baris
+namedtuple: tetap bisa diindeks seperti tuple (row[7]) tetapi juga lewat nama
+kolom (row.stok) tanpa __dict__ per baris.
+
+Query dijalankan lewat Database.ambil / Database.ambil_satu; kegagalan menjadi
+QueryError, bukan list kosong.
+"""
+from collections import namedtuple
+
+
+class QueryError(Exception):
+    """Query dari registry gagal dijalankan"""
+    def __init__(self, nama, sebab):
+        super().__init__(f"Query '{nama}' gagal: {sebab}")
+        self.nama = nama
+        self.sebab = sebab
+
+
+# --- Tipe baris ---
+Pelanggan = namedtuple("Pelanggan", "id nama_pelanggan alamat telepon")
+Kategori = namedtuple("Kategori", "id nama_kategori")
+Supplier = namedtuple("Supplier", "id nama_supplier alamat telepon")
+Karyawan = namedtuple("Karyawan", "id nama_karyawan alamat telepon")
+Pengguna = namedtuple("Pengguna", "id username password id_karyawan level nama_karyawan")
+Login = namedtuple("Login", "id username id_karyawan level nama")
+DetailPenjualan = namedtuple("DetailPenjualan", "id id_produk nama_produk jumlah harga_satuan subtotal")
+Produk = namedtuple("Produk", "id kode_produk nama_produk nama_kategori nama_supplier "
+                              "harga_beli harga_jual stok stok_minimum")
+StokRendah = namedtuple("StokRendah", "id kode_produk nama_produk stok nama_kategori harga_jual stok_minimum")
+LaporanPenjualan = namedtuple("LaporanPenjualan", "id tanggal_penjualan waktu_penjualan "
+                                                  "nama_pelanggan nama_karyawan total_harga")
+LaporanPembelian = namedtuple("LaporanPembelian", "id tanggal_pembelian waktu_pembelian "
+                                                  "nama_supplier nama_karyawan total_harga")
+LaporanStok = namedtuple("LaporanStok", "kode_produk nama_produk nama_kategori nama_supplier "
+                                        "harga_beli harga_jual stok nilai_stok id")
+RingkasanPenjualan = namedtuple("RingkasanPenjualan", "jumlah_transaksi total_penjualan rata_rata")
+ProdukTerlaris = namedtuple("ProdukTerlaris", "nama_produk total_terjual total_pendapatan")
+Dashboard = namedtuple("Dashboard", "total_pelanggan total_produk total_stok "
+                                    "penjualan_hari_ini jumlah_stok_rendah jumlah_perlu_cek")
+
+
+class Query:
+    """Satu statement bernama beserta pembuat baris bertipenya"""
+    __slots__ = ("nama", "sql", "tipe", "pabrik")
+
+    def __init__(self, nama, sql, tipe=None):
+        self.nama = nama
+        self.sql = sql
+        self.tipe = tipe
+        # row_factory sqlite3: baris mentah langsung dijadikan namedtuple
+        self.pabrik = None if tipe is None else (lambda _cursor, row: tuple.__new__(tipe, row))
+
+
+# Batas bawah/atas untuk filter opsional, agar teks query tetap sama dengan atau tanpa filter
+TANGGAL_MIN = ""
+TANGGAL_MAKS = "9999-12-31"
+KUNCI_PENJUALAN_MAKS = (TANGGAL_MAKS, "~", 2 ** 63 - 1)
+KUNCI_STOK_MIN = ("", -1)
+
+_PRODUK = """
+    SELECT p.id, p.kode_produk, p.nama_produk,
+           k.nama_kategori, s.nama_supplier,
+           p.harga_beli, p.harga_jual, p.stok, p.stok_minimum
+    FROM produk p
+    LEFT JOIN kategori k ON p.id_kategori = k.id
+    LEFT JOIN supplier s ON p.id_supplier = s.id
+"""
+
+_STOK_RENDAH = """
+    SELECT p.id, p.kode_produk, p.nama_produk, p.stok,
+           k.nama_kategori, p.harga_jual, p.stok_minimum
+    FROM produk p
+    LEFT JOIN kategori k ON p.id_kategori = k.id
+"""
+
+# Jumlah stok produk yang sedang dipesan keranjang lain (reservasi aktif selain milik token)
+_DIPESAN = """(SELECT COALESCE(SUM(r.qty), 0) FROM reservasi_stok r
+               WHERE r.id_produk = produk.id AND r.token <> ? AND r.kedaluwarsa > ?)"""
+
+# Ringkasan penjualan_harian per tanggal, opsional dikelompokkan per karyawan/pelanggan
+_HARIAN = """
+    SELECT tanggal{kolom},
+           SUM(jumlah_transaksi), SUM(total_penjualan),
+           SUM(jumlah_retur), SUM(total_retur)
+    FROM penjualan_harian
+    WHERE tanggal BETWEEN ? AND ?
+    GROUP BY tanggal{kolom}
+    HAVING SUM(jumlah_transaksi) <> 0 OR SUM(jumlah_retur) <> 0
+    ORDER BY tanggal{kolom}
+"""
+
+QUERY = {q.nama: q for q in [
+    # Data master
+    Query("pelanggan.semua", "SELECT id, nama_pelanggan, alamat, telepon FROM pelanggan ORDER BY nama_pelanggan",
+          Pelanggan),
+    Query("pelanggan.by_id", "SELECT id, nama_pelanggan, alamat, telepon FROM pelanggan WHERE id = ?", Pelanggan),
+    Query("kategori.semua", "SELECT id, nama_kategori FROM kategori ORDER BY nama_kategori", Kategori),
+    Query("kategori.by_id", "SELECT id, nama_kategori FROM kategori WHERE id = ?", Kategori),
+    Query("supplier.semua", "SELECT id, nama_supplier, alamat, telepon FROM supplier ORDER BY nama_supplier",
+          Supplier),
+    Query("supplier.by_id", "SELECT id, nama_supplier, alamat, telepon FROM supplier WHERE id = ?", Supplier),
+    Query("karyawan.semua", "SELECT id, nama_karyawan, alamat, telepon FROM karyawan ORDER BY nama_karyawan",
+          Karyawan),
+    Query("karyawan.by_id", "SELECT id, nama_karyawan, alamat, telepon FROM karyawan WHERE id = ?", Karyawan),
+    Query("pengguna.by_username", """
+        SELECT p.id, p.username, p.password, p.id_karyawan, p.level, k.nama_karyawan
+        FROM pengguna p JOIN karyawan k ON p.id_karyawan = k.id
+        WHERE p.username = ?
+    """, Pengguna),
+    Query("pengguna.login", """
+        SELECT p.id, p.username, p.password, p.id_karyawan, p.level, k.nama_karyawan
+        FROM pengguna p LEFT JOIN karyawan k ON p.id_karyawan = k.id
+        WHERE p.username = ? AND p.password = ?
+    """, Pengguna),
+    Query("pengguna.login_info", """
+        SELECT p.id, p.username, p.id_karyawan, p.level, COALESCE(k.nama_karyawan, p.username)
+        FROM pengguna p LEFT JOIN karyawan k ON p.id_karyawan = k.id
+        WHERE p.username = ? AND p.password = ?
+    """, Login),
+    Query("total.pelanggan", "SELECT COUNT(*) FROM pelanggan"),
+    Query("total.produk", "SELECT COUNT(*) FROM produk"),
+    Query("total.stok", "SELECT SUM(stok) FROM produk"),
+    Query("total.penjualan_hari", "SELECT SUM(total_penjualan) FROM penjualan_harian WHERE tanggal = ?"),
+
+    # Produk dan katalog
+    Query("produk.semua", _PRODUK + " ORDER BY p.nama_produk", Produk),
+    Query("produk.by_id", _PRODUK + " WHERE p.id = ?", Produk),
+    # Daftar id dikirim sebagai satu array JSON, jadi teks query sama berapa pun jumlahnya
+    Query("produk.by_ids", _PRODUK + " WHERE p.id IN (SELECT value FROM json_each(?))", Produk),
+    Query("produk.by_kode", _PRODUK + " WHERE p.kode_produk = ?", Produk),
+    Query("produk.stok", "SELECT stok FROM produk WHERE id = ?"),
+    Query("katalog.versi", "SELECT versi FROM versi_data WHERE id = 1"),
+    Query("katalog.berubah", "SELECT id_produk FROM perubahan_produk WHERE versi > ?"),
+
+    # Stok
+    Query("stok.rendah", _STOK_RENDAH + " WHERE p.stok <= p.stok_minimum ORDER BY p.stok ASC", StokRendah),
+    Query("stok.rendah_batas", _STOK_RENDAH + " WHERE p.stok <= ? ORDER BY p.stok ASC", StokRendah),
+    Query("stok.rendah_ids", _STOK_RENDAH + """ WHERE p.stok <= p.stok_minimum
+          AND p.id IN (SELECT value FROM json_each(?)) ORDER BY p.stok ASC""", StokRendah),
+    Query("stok.kurangi", "UPDATE produk SET stok = stok - ? WHERE id = ? AND stok >= ?"),
+    Query("stok.tambah", "UPDATE produk SET stok = stok + ? WHERE id = ?"),
+    Query("stok.kurangi_paksa", "UPDATE produk SET stok = stok - ? WHERE id = ?"),
+    Query("stok.kurangi_tersedia", f"UPDATE produk SET stok = stok - ? WHERE id = ? AND stok - {_DIPESAN} >= ?"),
+    Query("stok.tersedia", f"SELECT stok - {_DIPESAN} FROM produk WHERE id = ?"),
+
+    # Reservasi stok keranjang
+    Query("reservasi.simpan", f"""INSERT INTO reservasi_stok (token, id_produk, qty, kedaluwarsa)
+          SELECT ?, id, ?, ? FROM produk WHERE id = ? AND stok - {_DIPESAN} >= ?
+          ON CONFLICT (token, id_produk) DO UPDATE SET
+              qty = excluded.qty, kedaluwarsa = excluded.kedaluwarsa"""),
+    Query("reservasi.perpanjang", "UPDATE reservasi_stok SET kedaluwarsa = ? WHERE token = ?"),
+    Query("reservasi.lepas", "DELETE FROM reservasi_stok WHERE token = ?"),
+    Query("reservasi.lepas_produk", "DELETE FROM reservasi_stok WHERE token = ? AND id_produk = ?"),
+    Query("reservasi.bersihkan", "DELETE FROM reservasi_stok WHERE kedaluwarsa <= ?"),
+
+    # Checkout
+    Query("penjualan.tambah", """INSERT INTO penjualan (id_pelanggan, id_karyawan, tanggal_penjualan,
+          waktu_penjualan, total_harga) VALUES (?, ?, ?, ?, ?)"""),
+    Query("penjualan.tambah_kunci", """INSERT INTO penjualan (id_pelanggan, id_karyawan, tanggal_penjualan,
+          waktu_penjualan, total_harga, kunci) VALUES (?, ?, ?, ?, ?, ?)"""),
+    Query("penjualan.by_kunci", "SELECT id FROM penjualan WHERE kunci = ?"),
+    Query("penjualan.tandai_cek", "UPDATE penjualan SET perlu_cek = 1 WHERE id = ?"),
+    Query("penjualan.selesai_cek", "UPDATE penjualan SET perlu_cek = 0 WHERE id = ?"),
+    Query("penjualan.detail", """
+        SELECT dp.id, p.id, p.nama_produk, dp.jumlah, dp.harga_satuan, dp.subtotal
+        FROM detail_penjualan dp
+        JOIN produk p ON dp.id_produk = p.id
+        WHERE dp.id_penjualan = ?
+    """, DetailPenjualan),
+    Query("penjualan.detail_tambah", """INSERT INTO detail_penjualan (id_penjualan, id_produk, jumlah,
+          harga_satuan, subtotal) VALUES (?, ?, ?, ?, ?)"""),
+    Query("pembelian.tambah", """INSERT INTO pembelian (id_supplier, id_karyawan, tanggal_pembelian,
+          waktu_pembelian, total_harga) VALUES (?, ?, ?, ?, ?)"""),
+    Query("pembelian.detail_tambah", """INSERT INTO detail_pembelian (id_pembelian, id_produk, jumlah,
+          harga_satuan, subtotal) VALUES (?, ?, ?, ?, ?)"""),
+    Query("retur.tambah", """INSERT INTO retur_penjualan (id_penjualan, id_pelanggan, id_karyawan,
+          tanggal_retur, waktu_retur, total_retur, alasan_retur) VALUES (?, ?, ?, ?, ?, ?, ?)"""),
+    Query("retur.detail_tambah", """INSERT INTO detail_retur_penjualan (id_retur, id_produk, qty,
+          harga, subtotal) VALUES (?, ?, ?, ?, ?)"""),
+
+    # Laporan
+    Query("penjualan.perlu_cek", """
+        SELECT p.id, p.tanggal_penjualan, p.waktu_penjualan,
+               pel.nama_pelanggan, kar.nama_karyawan, p.total_harga
+        FROM penjualan p
+        LEFT JOIN pelanggan pel ON p.id_pelanggan = pel.id
+        LEFT JOIN karyawan kar ON p.id_karyawan = kar.id
+        WHERE p.perlu_cek = 1
+        ORDER BY p.id DESC
+    """, LaporanPenjualan),
+    Query("laporan.penjualan", """
+        SELECT p.id, p.tanggal_penjualan, p.waktu_penjualan,
+               pel.nama_pelanggan, kar.nama_karyawan, p.total_harga
+        FROM penjualan p
+        JOIN pelanggan pel ON p.id_pelanggan = pel.id
+        JOIN karyawan kar ON p.id_karyawan = kar.id
+        WHERE p.tanggal_penjualan BETWEEN ? AND ?
+        ORDER BY p.tanggal_penjualan DESC, p.waktu_penjualan DESC
+    """, LaporanPenjualan),
+    Query("laporan.penjualan_halaman", """
+        SELECT p.id, p.tanggal_penjualan, p.waktu_penjualan,
+               pel.nama_pelanggan, kar.nama_karyawan, p.total_harga
+        FROM penjualan p
+        JOIN pelanggan pel ON p.id_pelanggan = pel.id
+        JOIN karyawan kar ON p.id_karyawan = kar.id
+        WHERE p.tanggal_penjualan BETWEEN ? AND ?
+          AND (p.tanggal_penjualan, p.waktu_penjualan, p.id) < (?, ?, ?)
+        ORDER BY p.tanggal_penjualan DESC, p.waktu_penjualan DESC, p.id DESC
+        LIMIT ?
+    """, LaporanPenjualan),
+    Query("laporan.penjualan_ringkasan", """
+        SELECT COALESCE(SUM(jumlah_transaksi), 0), COALESCE(SUM(total_penjualan), 0),
+               COALESCE(SUM(total_penjualan) / NULLIF(SUM(jumlah_transaksi), 0), 0)
+        FROM penjualan_harian
+        WHERE tanggal BETWEEN ? AND ?
+    """, RingkasanPenjualan),
+    Query("laporan.pembelian", """
+        SELECT pb.id, pb.tanggal_pembelian, pb.waktu_pembelian,
+               s.nama_supplier, k.nama_karyawan, pb.total_harga
+        FROM pembelian pb
+        JOIN supplier s ON pb.id_supplier = s.id
+        JOIN karyawan k ON pb.id_karyawan = k.id
+        WHERE pb.tanggal_pembelian BETWEEN ? AND ?
+        ORDER BY pb.tanggal_pembelian DESC, pb.waktu_pembelian DESC
+    """, LaporanPembelian),
+    Query("laporan.stok", """
+        SELECT p.kode_produk, p.nama_produk, k.nama_kategori,
+               s.nama_supplier, p.harga_beli, p.harga_jual, p.stok,
+               (p.stok * p.harga_jual) as nilai_stok, p.id
+        FROM produk p
+        LEFT JOIN kategori k ON p.id_kategori = k.id
+        LEFT JOIN supplier s ON p.id_supplier = s.id
+        ORDER BY p.nama_produk, p.id
+    """, LaporanStok),
+    Query("laporan.stok_halaman", """
+        SELECT p.kode_produk, p.nama_produk, k.nama_kategori,
+               s.nama_supplier, p.harga_beli, p.harga_jual, p.stok,
+               (p.stok * p.harga_jual) as nilai_stok, p.id
+        FROM produk p
+        LEFT JOIN kategori k ON p.id_kategori = k.id
+        LEFT JOIN supplier s ON p.id_supplier = s.id
+        WHERE (p.nama_produk, p.id) > (?, ?)
+        ORDER BY p.nama_produk, p.id
+        LIMIT ?
+    """, LaporanStok),
+    Query("harian.per_tanggal", _HARIAN.format(kolom="")),
+    Query("harian.per_karyawan", _HARIAN.format(kolom=", id_karyawan")),
+    Query("harian.per_pelanggan", _HARIAN.format(kolom=", id_pelanggan")),
+    Query("ringkasan.harian", """
+        SELECT
+            COALESCE(SUM(jumlah_transaksi), 0) as jumlah_transaksi,
+            SUM(total_penjualan) as total_penjualan,
+            SUM(total_penjualan) / NULLIF(SUM(jumlah_transaksi), 0) as rata_rata_transaksi
+        FROM penjualan_harian
+        WHERE tanggal = ?
+    """, RingkasanPenjualan),
+    Query("terlaris.semua", """
+        SELECT p.nama_produk, pp.total_terjual, pp.total_pendapatan
+        FROM penjualan_produk pp
+        JOIN produk p ON pp.id_produk = p.id
+        WHERE pp.total_terjual > 0
+        ORDER BY pp.total_terjual DESC
+        LIMIT ?
+    """, ProdukTerlaris),
+    Query("terlaris.periode", """
+        SELECT
+            p.nama_produk,
+            SUM(h.terjual) as total_terjual,
+            SUM(h.pendapatan) as total_pendapatan
+        FROM penjualan_produk_harian h
+        JOIN produk p ON h.id_produk = p.id
+        WHERE h.tanggal BETWEEN ? AND ?
+        GROUP BY h.id_produk
+        HAVING total_terjual > 0
+        ORDER BY total_terjual DESC
+        LIMIT ?
+    """, ProdukTerlaris),
+    Query("dashboard.snapshot", """
+        SELECT
+            (SELECT COUNT(*) FROM pelanggan),
+            (SELECT COUNT(*) FROM produk),
+            (SELECT COALESCE(SUM(stok), 0) FROM produk),
+            (SELECT COALESCE(SUM(total_penjualan), 0) FROM penjualan_harian WHERE tanggal = ?),
+            (SELECT COUNT(*) FROM produk WHERE stok <= stok_minimum),
+            (SELECT COUNT(*) FROM penjualan WHERE perlu_cek = 1)
+    """, Dashboard),
+]}
+
+# Ukuran cache statement per koneksi: semua query registry tetap ter-cache,
+# ditambah ruang sebesar bawaan sqlite3 (128) untuk query ad hoc lainnya
+UKURAN_CACHE_STATEMENT = len(QUERY) + 128
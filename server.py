@@ -0,0 +1,275 @@
+# server.py
+"""Mode server multi-terminal: satu proses memegang Database, kasir terhubung lewat HTTP/JSON.
+
+Server adalah satu-satunya penulis file database (satu koneksi writer) dan
+menjalankan method baca di pool thread reader milik Database. Terminal kasir
+memakai DatabaseKlien (klien.py) yang nama method-nya sama dengan Database,
+jadi form Tk tidak perlu diubah.
+
+Protokol: POST /rpc dengan isi JSON
+    {"panggilan": [{"metode": "checkout", "args": [...], "kwargs": {...}}, ...],
+     "sejak": <nomor kabar stok terakhir yang sudah diterima klien>}
+Beberapa panggilan bisa dikirim dalam satu request (batch) dan koneksi HTTP/1.1
+dipakai ulang (keep-alive). Balasannya:
+    {"hasil": [{"nilai": ...} atau {"error": "..."}, ...],
+     "seq": <nomor kabar stok terbaru>,
+     "kabar": [id produk yang stoknya berubah sejak "sejak"] atau null (semua)}
+
+Baris namedtuple (query.py) dikirim sebagai {"__tipe__": "Produk", "nilai": [...]}
+supaya klien bisa membentuknya kembali.
+
+Server tidak punya login sendiri: secara bawaan hanya mendengarkan 127.0.0.1.
+Untuk dibuka ke jaringan toko, token bersama wajib diisi (--token atau
+TOKO_TOKEN); setiap request harus membawa header X-Token-Toko yang sama.
+
+Contoh:
+    TOKO_TOKEN=rahasia python server.py --db toko.db --host 0.0.0.0 --port 8765
+    TOKO_TOKEN=rahasia TOKO_SERVER=http://192.168.1.10:8765 python main.py
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import query
+from database import Database, PROFIL_KONEKSI
+
+PORT_DEFAULT = 8765
+
+# Jumlah kabar perubahan stok yang diingat; klien yang tertinggal lebih jauh
+# menerima kabar=null (muat ulang semua)
+UKURAN_KABAR = 1000
+
+# Method Database yang boleh dipanggil lewat server. Query SQL bebas (execute_*),
+# backup/restore file, data login mentah (verify_login mengembalikan password),
+# dan pembuatan pengguna sengaja tidak dibuka.
+METODE_BACA = frozenset([
+    "get_all_pelanggan", "get_pelanggan_by_id", "get_all_produk", "get_produk_by_id",
+    "get_produk_by_ids", "get_produk_by_kode", "get_versi_data", "get_produk_berubah",
+    "get_all_kategori", "get_kategori_by_id", "get_all_supplier", "get_supplier_by_id",
+    "get_all_karyawan", "get_karyawan_by_id", "get_detail_penjualan_by_id",
+    "get_produk_stok", "check_stok_cukup", "get_stok_tersedia", "get_produk_dengan_stok_rendah",
+    "get_laporan_penjualan", "get_laporan_penjualan_page", "get_laporan_penjualan_summary",
+    "get_laporan_pembelian", "get_laporan_stok", "get_laporan_stok_page",
+    "get_ringkasan_penjualan_harian", "get_penjualan_harian", "get_produk_terlaris",
+    "get_total_pelanggan", "get_total_produk", "get_total_stok", "get_total_penjualan_hari_ini",
+    "get_dashboard_snapshot", "get_penjualan_perlu_cek", "verify_login_dict",
+])
+METODE_TULIS = frozenset([
+    "checkout", "checkout_pembelian", "checkout_retur", "checkout_antrian", "selesai_cek_penjualan",
+    "update_stok_produk", "reservasi_stok", "lepas_reservasi",
+    "add_pelanggan", "update_pelanggan", "delete_pelanggan",
+    "add_produk", "update_produk", "delete_produk",
+    "add_kategori", "update_kategori", "delete_kategori",
+    "add_supplier", "update_supplier", "delete_supplier",
+    "add_karyawan", "update_karyawan", "delete_karyawan",
+    "rebuild_penjualan_harian", "rebuild_penjualan_produk",
+])
+METODE_SERVER = METODE_BACA | METODE_TULIS
+
+# Tipe baris namedtuple dari query.py, berdasarkan nama
+TIPE_BARIS = {nama: tipe for nama, tipe in vars(query).items()
+              if isinstance(tipe, type) and issubclass(tipe, tuple) and hasattr(tipe, "_fields")}
+
+
+def kemas(nilai):
+    """Mengubah hasil method Database menjadi nilai yang bisa di-JSON-kan"""
+    if isinstance(nilai, tuple):
+        if type(nilai).__name__ in TIPE_BARIS:
+            return {"__tipe__": type(nilai).__name__, "nilai": [kemas(x) for x in nilai]}
+        return [kemas(x) for x in nilai]
+    if isinstance(nilai, (list, set, frozenset)):
+        return [kemas(x) for x in nilai]
+    if isinstance(nilai, dict):
+        return {k: kemas(v) for k, v in nilai.items()}
+    return nilai
+
+
+def buka(nilai):
+    """Kebalikan kemas(): baris bertipe dibentuk kembali menjadi namedtuple"""
+    if isinstance(nilai, dict):
+        tipe = TIPE_BARIS.get(nilai.get("__tipe__"))
+        if tipe is not None:
+            return tipe._make(buka(x) for x in nilai["nilai"])
+        return {k: buka(v) for k, v in nilai.items()}
+    if isinstance(nilai, list):
+        return [buka(x) for x in nilai]
+    return nilai
+
+
+def alamat_lokal(host):
+    """True jika host hanya bisa dihubungi dari komputer ini (loopback)"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class PenanganRPC(BaseHTTPRequestHandler):
+    """Handler HTTP/1.1 (keep-alive) untuk satu koneksi terminal"""
+    protocol_version = "HTTP/1.1"
+    # Header dan isi balasan ditulis terpisah; tanpa TCP_NODELAY tiap balasan
+    # bisa tertahan delayed ACK klien (~40 ms)
+    disable_nagle_algorithm = True
+    server_toko = None  # diisi ServerToko
+
+    def token_valid(self):
+        """Memeriksa header X-Token-Toko; membalas 401 dan mengembalikan False jika salah"""
+        token = self.server_toko.token
+        if token is None or hmac.compare_digest(self.headers.get("X-Token-Toko", ""), token):
+            return True
+        self.close_connection = True  # isi request tidak dibaca, koneksi tidak bisa dipakai ulang
+        self.kirim(401, {"error": "Token server toko salah atau tidak ada"})
+        return False
+
+    def do_POST(self):
+        if not self.token_valid():
+            return
+        if self.path != "/rpc":
+            self.kirim(404, {"error": f"Path tidak dikenal: {self.path}"})
+            return
+        try:
+            panjang = int(self.headers.get("Content-Length", 0))
+            permintaan = json.loads(self.rfile.read(panjang))
+            panggilan = permintaan["panggilan"]
+        except (ValueError, KeyError, TypeError) as e:
+            self.kirim(400, {"error": f"Request tidak valid: {e}"})
+            return
+        hasil = self.server_toko.jalankan(panggilan)
+        # Kabar diambil setelah panggilan dijalankan, jadi perubahan stok milik
+        # request ini sendiri ikut terkirim
+        seq, kabar = self.server_toko.kabar_sejak(permintaan.get("sejak"))
+        self.kirim(200, {"hasil": hasil, "seq": seq, "kabar": kabar})
+
+    def do_GET(self):
+        if not self.token_valid():
+            return
+        if self.path != "/status":
+            self.kirim(404, {"error": f"Path tidak dikenal: {self.path}"})
+            return
+        self.kirim(200, {"db": self.server_toko.db.db_name, "seq": self.server_toko.kabar_sejak(None)[0],
+                         "metode": sorted(METODE_SERVER)})
+
+    def kirim(self, status, isi):
+        data = json.dumps(isi, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # tidak mencetak setiap request
+
+
+class ServerToko:
+    """Server HTTP/JSON di depan satu Database (lihat docstring modul untuk protokolnya)"""
+    def __init__(self, db, host="127.0.0.1", port=PORT_DEFAULT, token=None):
+        if not token and not alamat_lokal(host):
+            raise ValueError(f"Server di {host} bisa diakses dari jaringan, token wajib diisi")
+        self.db = db
+        self.token = token or None
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._kabar = deque(maxlen=UKURAN_KABAR)   # (seq, set id atau None)
+        db.pantau_stok(self._catat_kabar)
+        handler = type("PenanganRPCToko", (PenanganRPC,), {"server_toko": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def alamat(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _catat_kabar(self, ids):
+        with self._lock:
+            self._seq += 1
+            self._kabar.append((self._seq, ids))
+
+    def kabar_sejak(self, sejak):
+        """(seq terbaru, id produk berubah setelah sejak); None = semua, [] = tidak ada"""
+        with self._lock:
+            seq = self._seq
+            if sejak is None or sejak >= seq:
+                return seq, []
+            if not self._kabar or self._kabar[0][0] > sejak + 1:
+                return seq, None  # klien tertinggal lebih jauh dari yang diingat
+            ids = set()
+            for nomor, berubah in self._kabar:
+                if nomor <= sejak:
+                    continue
+                if berubah is None:
+                    return seq, None
+                ids |= berubah
+            return seq, sorted(ids)
+
+    def jalankan(self, panggilan):
+        """Menjalankan daftar panggilan berurutan, mengembalikan hasil per panggilan"""
+        hasil = []
+        for p in panggilan:
+            nama = p.get("metode")
+            try:
+                if nama not in METODE_SERVER:
+                    raise ValueError(f"Metode tidak dikenal: {nama}")
+                fungsi = getattr(self.db, nama)
+                args, kwargs = p.get("args", []), p.get("kwargs", {})
+                if nama in METODE_BACA:
+                    # Dijalankan di pool reader, tidak menunggu writer
+                    nilai = self.db.submit(fungsi, *args, **kwargs).result()
+                else:
+                    nilai = fungsi(*args, **kwargs)
+                hasil.append({"nilai": kemas(nilai)})
+            except Exception as e:
+                hasil.append({"error": f"{type(e).__name__}: {e}"})
+        return hasil
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        """Menghentikan serve_forever() (dipanggil dari thread lain)"""
+        self.httpd.shutdown()
+
+    def close(self):
+        self.db.lepas_pantau_stok(self._catat_kabar)
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server database toko untuk beberapa terminal kasir")
+    parser.add_argument("--db", default="toko.db")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Alamat yang didengarkan (0.0.0.0 untuk semua jaringan, wajib --token)")
+    parser.add_argument("--token", default=os.environ.get("TOKO_TOKEN"),
+                        help="Token bersama yang harus dikirim terminal (default: TOKO_TOKEN)")
+    parser.add_argument("--port", type=int, default=PORT_DEFAULT)
+    parser.add_argument("--profil", default="pos-terminal", choices=list(PROFIL_KONEKSI))
+    parser.add_argument("--reader", type=int, default=4, help="Jumlah thread reader")
+    args = parser.parse_args()
+
+    if not args.token and not alamat_lokal(args.host):
+        parser.error("--token (atau TOKO_TOKEN) wajib jika server didengarkan di luar 127.0.0.1")
+
+    db = Database(args.db, profil=args.profil, jumlah_worker=args.reader)
+    server = ServerToko(db, args.host, args.port, token=args.token)
+    print(f"Server toko berjalan di {server.alamat} (database {args.db}), Ctrl+C untuk berhenti")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
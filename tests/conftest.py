@@ -0,0 +1,31 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Database toko baru di file sementara (pelanggan dan karyawan id 1 sudah ada)"""
+    db = Database(str(tmp_path / "toko.db"))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def produk(db):
+    """Dua produk dengan stok 10"""
+    return [db.add_produk(f"P00{i}", f"Produk Uji {i}", harga_jual=1000, stok=10) for i in (1, 2)]
+
+
+def stok(db, id_produk):
+    return db.get_produk_by_id(id_produk).stok
+
+
+def jumlah(db, tabel):
+    return db.conn.execute(f"SELECT COUNT(*) FROM {tabel}").fetchone()[0]
@@ -0,0 +1,119 @@
+# tests/test_antrian.py
+import http.client
+import sqlite3
+import uuid
+
+import pytest
+
+from antrian import AntrianCheckout, database_sibuk
+from conftest import jumlah, stok
+
+
+def transaksi(items, token=None):
+    return {
+        'kunci': uuid.uuid4().hex, 'id_pelanggan': 1, 'id_karyawan': 1,
+        'tanggal': "2026-10-17", 'waktu': "10:00:00", 'items': items, 'token': token,
+    }
+
+
+def item(produk, qty):
+    return {'id_produk': produk.id, 'qty': qty, 'harga': 1000}
+
+
+def test_checkout_antrian_diputar_ulang_tidak_dobel(db, produk):
+    a, b = produk
+    batch = [transaksi([item(a, 2)]), transaksi([item(a, 1), item(b, 3)])]
+
+    pertama = db.checkout_antrian(batch)
+    kedua = db.checkout_antrian(batch)
+
+    assert [id_penjualan for _, id_penjualan, _ in pertama] == [id_penjualan for _, id_penjualan, _ in kedua]
+    assert all(id_penjualan for _, id_penjualan, _ in pertama)
+    assert jumlah(db, "penjualan") == 2
+    assert stok(db, a.id) == 7
+    assert stok(db, b.id) == 7
+
+
+def test_checkout_antrian_stok_kurang_dicatat_minus(db, produk):
+    a, _ = produk
+    [(_, id_penjualan, alasan)] = db.checkout_antrian([transaksi([item(a, 12)])])
+
+    assert id_penjualan and alasan
+    assert stok(db, a.id) == -2
+    assert [row.id for row in db.get_penjualan_perlu_cek()] == [id_penjualan]
+
+
+def test_checkout_antrian_menghormati_reservasi_token_sendiri(db, produk):
+    a, _ = produk
+    db.reservasi_stok("kasir-1", a.id, 10)
+
+    [(_, id_penjualan, alasan)] = db.checkout_antrian([transaksi([item(a, 10)], token="kasir-1")])
+
+    assert id_penjualan and alasan is None
+    assert stok(db, a.id) == 0
+    assert db.get_penjualan_perlu_cek() == []
+    assert db.get_stok_tersedia(a.id, "kasir-2") == 0
+
+
+def test_checkout_antrian_menolak_data_tidak_valid_sendiri_sendiri(db, produk):
+    a, b = produk
+    hasil = db.checkout_antrian([
+        transaksi([item(a, 1)]),
+        transaksi([{'id_produk': 9999, 'qty': 1, 'harga': 1000}]),
+        transaksi([item(a, 1), item(b, 0)]),
+        transaksi([item(b, 2)]),
+    ])
+
+    assert [id_penjualan is not None for _, id_penjualan, _ in hasil] == [True, False, False, True]
+    assert all(alasan for _, id_penjualan, alasan in hasil if id_penjualan is None)
+    assert jumlah(db, "penjualan") == 2
+    assert stok(db, a.id) == 9
+    assert stok(db, b.id) == 8
+
+
+def test_antrian_checkout_sinkron(db, produk, tmp_path):
+    a, _ = produk
+    antrian = AntrianCheckout(db, str(tmp_path / "antrian.db"), interval=60)
+    try:
+        antrian.simpan(1, 1, [item(a, 3)])
+        antrian.simpan(1, 1, [{'id_produk': 9999, 'qty': 1, 'harga': 1000}])
+    finally:
+        antrian.close()  # mengirim sisa antrian sebelum ditutup
+
+    assert jumlah(db, "penjualan") == 1
+    assert stok(db, a.id) == 7
+
+    antrian = AntrianCheckout(db, str(tmp_path / "antrian.db"), interval=60)
+    try:
+        assert antrian.jumlah_menunggu() == 0
+        assert antrian.jumlah_gagal() == 1
+        assert antrian.sinkron() == 0
+    finally:
+        antrian.close()
+
+
+def test_checkout_database_terkunci_dilempar_jika_tunggu(db, produk):
+    a, _ = produk
+    lain = sqlite3.connect(db.db_name)
+    try:
+        lain.execute("BEGIN IMMEDIATE")
+        with pytest.raises(sqlite3.OperationalError) as info:
+            db.checkout(1, 1, [item(a, 1)], tunggu=0.1)
+        assert database_sibuk(info.value)
+        # Tanpa tunggu database terkunci menjadi gagal biasa (None) setelah busy_timeout
+        db.conn.execute("PRAGMA busy_timeout = 50")
+        assert db.checkout(1, 1, [item(a, 1)]) is None
+    finally:
+        lain.rollback()
+        lain.close()
+
+    assert db.checkout(1, 1, [item(a, 1)], tunggu=0.1)
+    assert stok(db, a.id) == 9
+
+
+def test_database_sibuk():
+    assert database_sibuk(sqlite3.OperationalError("database is locked"))
+    assert database_sibuk(ConnectionRefusedError())
+    assert database_sibuk(http.client.RemoteDisconnected())
+    assert not database_sibuk(ValueError("Stok produk 1 tidak cukup"))
+    assert not database_sibuk(sqlite3.IntegrityError("FOREIGN KEY constraint failed"))
@@ -0,0 +1,57 @@
+# tests/test_checkout.py
+import pytest
+
+from conftest import jumlah, stok
+
+
+def item(produk, qty, harga=1000):
+    return {'id_produk': produk.id, 'qty': qty, 'harga': harga}
+
+
+def test_checkout_menyimpan_header_detail_dan_stok(db, produk):
+    a, b = produk
+    id_penjualan = db.checkout(1, 1, [item(a, 3), item(b, 2, 500)])
+
+    assert id_penjualan
+    assert stok(db, a.id) == 7
+    assert stok(db, b.id) == 8
+    detail = db.get_detail_penjualan_by_id(id_penjualan)
+    assert sorted((d.id_produk, d.jumlah, d.subtotal) for d in detail) == [(a.id, 3, 3000), (b.id, 2, 1000)]
+    total = db.conn.execute("SELECT total_harga FROM penjualan WHERE id = ?", (id_penjualan,)).fetchone()[0]
+    assert total == 4000
+
+
+def test_checkout_stok_kurang_membatalkan_seluruh_keranjang(db, produk):
+    a, b = produk
+    assert db.checkout(1, 1, [item(a, 3), item(b, 11)]) is None
+
+    assert stok(db, a.id) == 10
+    assert stok(db, b.id) == 10
+    assert jumlah(db, "penjualan") == 0
+    assert jumlah(db, "detail_penjualan") == 0
+
+
+@pytest.mark.parametrize("qty", [0, -5])
+def test_checkout_menolak_qty_tidak_positif(db, produk, qty):
+    a, b = produk
+    assert db.checkout(1, 1, [item(a, 1), item(b, qty)]) is None
+
+    assert stok(db, a.id) == 10
+    assert stok(db, b.id) == 10
+    assert jumlah(db, "penjualan") == 0
+
+
+@pytest.mark.parametrize("qty", [0, -5])
+def test_checkout_pembelian_dan_retur_menolak_qty_tidak_positif(db, produk, qty):
+    a, _ = produk
+    assert db.checkout_pembelian(None, 1, [item(a, qty)]) is None
+    assert db.checkout_retur(None, 1, 1, [item(a, qty)]) is None
+
+    assert stok(db, a.id) == 10
+    assert jumlah(db, "pembelian") == 0
+    assert jumlah(db, "retur_penjualan") == 0
+
+
+def test_checkout_keranjang_kosong(db):
+    assert db.checkout(1, 1, []) is None
+    assert jumlah(db, "penjualan") == 0
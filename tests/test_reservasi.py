@@ -0,0 +1,84 @@
+# tests/test_reservasi.py
+import sqlite3
+
+import pytest
+
+from conftest import stok
+
+
+def item(produk, qty):
+    return {'id_produk': produk.id, 'qty': qty, 'harga': 1000}
+
+
+def test_reservasi_mengurangi_stok_tersedia_keranjang_lain(db, produk):
+    a, _ = produk
+    assert db.reservasi_stok("kasir-1", a.id, 7) is True
+
+    assert db.get_stok_tersedia(a.id, "kasir-2") == 3
+    assert db.get_stok_tersedia(a.id, "kasir-1") == 10
+    assert db.reservasi_stok("kasir-2", a.id, 4) is False
+    assert db.reservasi_stok("kasir-2", a.id, 3) is True
+    # Stok fisik belum berubah sebelum checkout
+    assert stok(db, a.id) == 10
+
+
+def test_reservasi_mengganti_qty_keranjang_sendiri(db, produk):
+    a, _ = produk
+    assert db.reservasi_stok("kasir-1", a.id, 7)
+    assert db.reservasi_stok("kasir-1", a.id, 2)
+
+    assert db.get_stok_tersedia(a.id, "kasir-2") == 8
+
+
+def test_reservasi_qty_nol_melepas(db, produk):
+    a, _ = produk
+    db.reservasi_stok("kasir-1", a.id, 7)
+    db.reservasi_stok("kasir-1", a.id, 0)
+
+    assert db.get_stok_tersedia(a.id, "kasir-2") == 10
+
+
+def test_reservasi_kedaluwarsa_diabaikan(db, produk):
+    a, _ = produk
+    assert db.reservasi_stok("kasir-1", a.id, 7, ttl=-1)
+
+    assert db.get_stok_tersedia(a.id, "kasir-2") == 10
+    assert db.reservasi_stok("kasir-2", a.id, 10) is True
+
+
+def test_checkout_tidak_menjual_stok_yang_dipesan_keranjang_lain(db, produk):
+    a, _ = produk
+    db.reservasi_stok("kasir-1", a.id, 7)
+
+    assert db.checkout(1, 1, [item(a, 4)], token="kasir-2") is None
+    assert stok(db, a.id) == 10
+
+    assert db.checkout(1, 1, [item(a, 7)], token="kasir-1")
+    assert stok(db, a.id) == 3
+    # Reservasi pemilik dilepas setelah checkout
+    assert db.get_stok_tersedia(a.id, "kasir-2") == 3
+
+
+def test_lepas_reservasi_seluruh_keranjang(db, produk):
+    a, b = produk
+    db.reservasi_stok("kasir-1", a.id, 5)
+    db.reservasi_stok("kasir-1", b.id, 5)
+    db.lepas_reservasi("kasir-1")
+
+    assert db.get_stok_tersedia(a.id, "kasir-2") == 10
+    assert db.get_stok_tersedia(b.id, "kasir-2") == 10
+
+
+def test_reservasi_database_terkunci_dilempar(db, produk):
+    a, _ = produk
+    lain = sqlite3.connect(db.db_name)
+    try:
+        lain.execute("BEGIN IMMEDIATE")
+        db.conn.execute("PRAGMA busy_timeout = 50")
+        with pytest.raises(sqlite3.OperationalError):
+            db.reservasi_stok("kasir-1", a.id, 1)
+    finally:
+        lain.rollback()
+        lain.close()
+
+    assert db.reservasi_stok("kasir-1", a.id, 1) is True
@@ -0,0 +1,72 @@
+# tests/test_restore.py
+import os
+import sqlite3
+
+import pytest
+
+from conftest import stok
+
+
+@pytest.mark.parametrize("kompres", [False, True])
+def test_restore_mengembalikan_data_backup(db, produk, tmp_path, kompres):
+    a, _ = produk
+    backup = db.backup_database(str(tmp_path / "backup.db"), kompres=kompres)
+    assert backup and os.path.exists(backup)
+
+    db.checkout(1, 1, [{'id_produk': a.id, 'qty': 4, 'harga': 1000}])
+    db.add_produk("P999", "Setelah Backup", harga_jual=1, stok=1)
+    assert stok(db, a.id) == 6
+
+    waktu = db.restore_database(backup)
+
+    assert waktu and 'tukar' in waktu
+    assert stok(db, a.id) == 10
+    assert db.get_produk_by_kode("P999") is None
+    assert os.path.exists(db.db_name + ".bak")
+    assert not os.path.exists(db.db_name + ".restore")
+    # Pool reader dibuat ulang dan bisa dipakai lagi setelah pertukaran
+    assert db.submit(db.get_produk_by_id, a.id).result().stok == 10
+
+
+def test_restore_file_tidak_ada(db, produk, tmp_path):
+    assert db.restore_database(str(tmp_path / "tidak_ada.db")) is None
+    assert stok(db, produk[0].id) == 10
+
+
+def test_restore_menolak_file_bukan_database(db, produk, tmp_path):
+    rusak = tmp_path / "rusak.db"
+    rusak.write_bytes(b"bukan database sqlite" * 100)
+
+    assert db.restore_database(str(rusak)) is None
+    assert stok(db, produk[0].id) == 10
+    assert not os.path.exists(db.db_name + ".restore")
+
+
+def test_restore_menolak_database_lain(db, produk, tmp_path):
+    lain = tmp_path / "lain.db"
+    conn = sqlite3.connect(lain)
+    conn.execute("CREATE TABLE catatan (isi TEXT)")
+    conn.commit()
+    conn.close()
+
+    assert db.restore_database(str(lain)) is None
+    assert stok(db, produk[0].id) == 10
+
+
+def test_restore_menolak_skema_lebih_baru(db, produk, tmp_path):
+    backup = db.backup_database(str(tmp_path / "backup.db"))
+    conn = sqlite3.connect(backup)
+    conn.execute("PRAGMA user_version = 9999")
+    conn.commit()
+    conn.close()
+
+    assert db.restore_database(backup) is None
+    assert stok(db, produk[0].id) == 10
+
+
+def test_restore_ditolak_dari_thread_reader(db, produk, tmp_path):
+    backup = db.backup_database(str(tmp_path / "backup.db"))
+
+    assert db.submit(db.restore_database, backup).result() is None
+    assert stok(db, produk[0].id) == 10
+    assert not os.path.exists(db.db_name + ".restore")